@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""
+Shared engines for the spin lattice simulators.
+
+The scripts in ``spin model/`` and ``spin model variating H/`` put the
+repository root on ``sys.path`` and import what they need from here.
+"""
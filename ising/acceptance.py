@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Precomputed Metropolis acceptance probabilities.
+
+With spins +-1 on a square lattice the energy change of a flip,
+dE = 2 * spin * (J * local_field + H), only takes ten values: two spin
+states times five neighbour sums (-4, -2, 0, 2, 4).  The exponentials are
+evaluated once per (beta, J, H) and looked up in the inner loop.
+"""
+
+# acceptance.py
+from functools import lru_cache
+
+import numpy as np
+
+
+def inverse_temperature(temp, boltzmann_const=1.0):
+    """beta = 1 / (k_B T), with T = 0 mapped to beta = inf."""
+    return 1.0 / (boltzmann_const * temp) if temp > 0 else np.inf
+
+
+def spin_index(spin):
+    """Row of the acceptance table for a spin (-1 -> 0, +1 -> 1)."""
+    return (spin + 1) // 2
+
+
+def neighbour_index(local_field):
+    """Column of the acceptance table for a neighbour sum in -4..4."""
+    return (local_field + 4) // 2
+
+
+def build_acceptance_table(beta, J, H):
+    """
+    Acceptance probabilities min(1, exp(-beta * dE)) indexed by
+    [spin_index, neighbour_index]. At beta = inf only downhill moves
+    are accepted.
+
+    Written in the numba-compatible subset so the compiled kernels can
+    jit it directly.
+    """
+    table = np.empty((2, 5))
+    for s_idx in range(2):
+        spin = 2 * s_idx - 1
+        for n_idx in range(5):
+            dE = 2 * spin * (J * (2 * n_idx - 4) + H)
+            if np.isinf(beta):
+                table[s_idx, n_idx] = 1.0 if dE < 0 else 0.0
+            elif dE <= 0:
+                table[s_idx, n_idx] = 1.0
+            else:
+                table[s_idx, n_idx] = np.exp(-beta * dE)
+    return table
+
+
+@lru_cache(maxsize=4096)
+def acceptance_table(beta, J, H):
+    """Cached, read-only ``build_acceptance_table`` for Python-level kernels."""
+    table = build_acceptance_table(beta, J, H)
+    table.flags.writeable = False
+    return table
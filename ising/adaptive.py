@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Adaptive temperature grids for the (omega, T, replica) sweeps.
+
+Instead of hand-placing a dense grid around the infinite-lattice Tc, start
+from a coarse ``T_range`` and repeatedly bisect the intervals over which
+the response (susceptibility, specific heat) or its error estimate changes
+most, relative to the largest value seen at that frequency. With a field
+and at finite N the peak is shifted and broadened; refinement follows
+wherever it actually is.
+"""
+
+# adaptive.py
+import numpy as np
+
+from ising.stats import combine_errors
+from ising.sweep import run_grid
+
+
+def interval_scores(T_range, samples, keys=("susceptibility", "specific_heat")):
+    """
+    Largest scaled change of each key (and of its ``_err``) across each
+    interval [T_i, T_i+1], maximized over frequencies. ``samples`` holds
+    (omega, T, replica) arrays on the sorted ``T_range``. Changes of a key
+    within its combined error bars do not count, so noise is not refined.
+    """
+    scores = np.zeros(len(T_range) - 1)
+    for key in keys:
+        values = samples[key].mean(axis=2)
+        errors = combine_errors(samples[f"{key}_err"])
+        for series, noise in ((values, errors[:, :-1] + errors[:, 1:]), (errors, 0.0)):
+            scale = np.abs(series).max(axis=1, keepdims=True)
+            scale[scale == 0] = 1.0
+            change = np.maximum(np.abs(np.diff(series, axis=1)) - noise, 0.0) / scale
+            scores = np.maximum(scores, change.max(axis=0))
+    return scores
+
+
+def refine(T_range, scores, tol, per_round, min_spacing):
+    """Midpoints of the (at most ``per_round``) highest-scoring intervals above ``tol``."""
+    widths = np.diff(T_range)
+    candidates = [i for i in np.argsort(scores)[::-1]
+                  if scores[i] > tol and widths[i] > 2 * min_spacing]
+    return np.sort([0.5 * (T_range[i] + T_range[i + 1]) for i in candidates[:per_round]])
+
+
+def adaptive_grid(point, omegas, T_initial, measures_per_T, max_points, tol=0.05,
+                  per_round=4, min_spacing=0.01, keys=("susceptibility", "specific_heat"),
+                  **grid_kwargs):
+    """
+    ``run_grid`` over a temperature grid refined until no interval scores
+    above ``tol`` or ``max_points`` temperatures have been simulated.
+    ``grid_kwargs`` (workers, seed, on_result, cache, point parameters)
+    are passed to every ``run_grid`` call.
+
+    Returns (T_range, samples) with samples shaped as by ``run_grid``.
+    """
+    T_range = np.unique(T_initial)
+    samples = run_grid(point, omegas, T_range, measures_per_T, **grid_kwargs)
+    while len(T_range) < max_points:
+        new_T = refine(T_range, interval_scores(T_range, samples, keys), tol,
+                       min(per_round, max_points - len(T_range)), min_spacing)
+        if len(new_T) == 0:
+            break
+        new_samples = run_grid(point, omegas, new_T, measures_per_T, **grid_kwargs)
+        T_range = np.concatenate([T_range, new_T])
+        order = np.argsort(T_range)
+        T_range = T_range[order]
+        samples = {key: np.concatenate([samples[key], new_samples[key]], axis=1)[:, order]
+                   for key in samples}
+    return T_range, samples
@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+"""
+Kernel benchmarks: spin-flip attempts per second for every update engine.
+
+Each engine is timed at every lattice size under a static and a
+sinusoidal field, in two modes:
+
+* ``sweep``: the update calls alone, one N*N-attempt sweep at a time
+  (one cluster for Wolff, whose attempts are the sites of the clusters
+  grown),
+* ``loop``: a full measurement loop (field schedule, running E and M,
+  ``ThermoAccumulator``), as the simulators run it: compiled chunks from
+  ``ising.driver`` with the statistics fed in bulk, or, for the engines
+  the simulators call sweep by sweep, a Python loop around the calls.
+
+Compiled engines are warmed up before timing; their JIT compile time is
+measured separately, from the first call in a fresh interpreter with an
+empty scratch JIT cache (a warm cache would time a load). Worker startup (a fresh process
+from launch to its first finished sweep) is timed with an empty and with a
+warm on-disk JIT cache. Results go to a JSON file, and
+``--baseline`` compares them with a stored run, exiting non-zero when an
+entry is slower than the baseline by more than ``--tolerance``.
+
+    python -m ising.benchmark --output bench.json
+    python -m ising.benchmark --sizes 20 50 --baseline bench.json
+"""
+
+# benchmark.py
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numba
+import numpy as np
+
+from ising import bitpacked, kernels
+from ising.checkerboard import checkerboard_sweep
+from ising.cluster import wolff_move, wolff_workspace
+from ising.driver import CHUNK, drive, drive_checkerboard, drive_padded, drive_replicas
+from ising.field import sinusoidal_field, sinusoidal_schedule
+from ising.halo import (SCHEDULES, TILE, calculate_total_energy_padded, interior,
+                        metropolis_step_checkerboard, metropolis_step_padded, pad)
+from ising.lattice import init_lattice
+from ising.metropolis import metropolis_update
+from ising.philox import RandomStream, new_stream, new_streams
+from ising.replicas import metropolis_step_replicas
+from ising.stats import ThermoAccumulator
+
+ENGINES = ("metropolis_update", "checkerboard_sweep", "metropolis_step",
+           "metropolis_step_replicas", "wolff_step", "bitpacked",
+           "halo_random", "halo_sequential", "halo_tiled", "halo_checkerboard")
+COMPILED = ("metropolis_step", "metropolis_step_replicas", "wolff_step", "bitpacked",
+            "halo_random", "halo_sequential", "halo_tiled", "halo_checkerboard")
+SIZES = (20, 50, 256, 1024)
+FIELDS = ("static", "sinusoidal")
+MODES = ("sweep", "loop")
+
+J = 1.0
+H_AMP = 0.1
+OMEGA = 0.05
+FIELD_OMEGAS = {"static": 0.0, "sinusoidal": OMEGA}
+T_BENCH = 2.269185
+REPLICAS = 5
+
+# Run in a fresh interpreter: prints seconds spent importing the kernels and
+# seconds to finish one sweep (load from the JIT cache or compile, then run).
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import numpy as np
+from ising.kernels import metropolis_step
+from ising.philox import new_stream
+imported = time.perf_counter()
+metropolis_step(np.ones((64, 64), dtype=np.int8), 0.5, 1.0, 0.1, new_stream(0))
+print(imported - start, time.perf_counter() - imported)
+"""
+
+# Run in a fresh interpreter with an empty JIT cache: prints the seconds the
+# first sweep of engine sys.argv[1] takes beyond a warm one.
+COMPILE_SCRIPT = """
+import sys, time
+from ising.benchmark import H_AMP, T_BENCH, make_engine
+sweep, observables = make_engine(sys.argv[1], 64)[:2]
+times = []
+for _ in range(2):
+    start = time.perf_counter()
+    sweep(T_BENCH, H_AMP)
+    observables()
+    times.append(time.perf_counter() - start)
+print(max(times[0] - times[1], 0.0))
+"""
+
+
+def _driven(kernel, spins, E, M, *options):
+    """
+    drive(T, fields) running one ``ising.driver`` call of ``kernel`` over
+    ``fields``, continuing the running totals E, M (per-replica arrays for
+    ``drive_replicas``, updated in place) from H = 0; returns the chunk's
+    (energies, magnetizations, attempts).
+    """
+    state = {"E": E, "M": M, "H": 0.0}
+    energies = np.empty(np.shape(E) + (CHUNK,))
+    magnetizations = np.empty(np.shape(E) + (CHUNK,), dtype=np.int64)
+
+    def drive(T, fields):
+        result = kernel(spins, 1 / T, J, fields, state["H"], state["E"], state["M"], energies,
+                        magnetizations, *options, 0, 1)
+        if np.ndim(E):
+            attempts = result[1]
+        else:
+            state["E"], state["M"], _, attempts = result
+        state["H"] = fields[-1]
+        return energies[..., :len(fields)], magnetizations[..., :len(fields)], attempts
+    return drive
+
+
+def make_engine(name, N):
+    """
+    (sweep(T, H), observables(), attempts per sweep, drive(T, fields)) for
+    ``name`` at size N, or None where the engine does not support N.
+    ``sweep`` returns the (dE, dM, ...) change; batched engines return
+    per-replica arrays. Attempts are
+    None where the sweep counts them itself (Wolff: the sites of the
+    cluster grown). ``drive`` is the engine's ``ising.driver`` path (see
+    ``_driven``), None for engines the simulators do not drive.
+    """
+    if name == "metropolis_update":
+        lattice = init_lattice(N)
+        rng = RandomStream(0)
+
+        def sweep(T, H):
+            dE, dM = 0.0, 0
+            for _ in range(N * N):
+                e, m = metropolis_update(lattice, T, J, H, rng=rng)
+                dE += e
+                dM += m
+            return dE, dM
+        return (sweep, lambda: (kernels.calculate_total_energy(lattice, J, 0.0), lattice.sum()),
+                N * N, None)
+    if name == "checkerboard_sweep":
+        lattice = init_lattice(N)
+        rng = RandomStream(0)
+        return (lambda T, H: checkerboard_sweep(lattice, T, J, H, rng=rng),
+                lambda: (kernels.calculate_total_energy(lattice, J, 0.0), lattice.sum()), N * N,
+                None)
+    if name in ("metropolis_step", "wolff_step"):
+        lattice = init_lattice(N)
+        stream = new_stream(0)
+        observables = lambda: (kernels.calculate_total_energy(lattice, J, 0.0), int(lattice.sum()))
+        if name == "metropolis_step":
+            sweep = lambda T, H: kernels.metropolis_step(lattice, 1 / T, J, H, stream)
+        else:
+            # One workspace for all moves, as ising.driver.drive keeps per chunk
+            workspace = wolff_workspace(N)
+            moves = itertools.count(1)
+            sweep = lambda T, H: wolff_move(lattice, 1 / T, J, H, stream, *workspace, next(moves))
+        return (sweep, observables, N * N if name == "metropolis_step" else None,
+                _driven(drive, lattice, *observables(), stream, name == "wolff_step"))
+    if name == "metropolis_step_replicas":
+        lattices = np.ones((REPLICAS, N, N), dtype=np.int8)
+        streams = new_streams(0, (), range(REPLICAS))
+        observables = lambda: (np.array([kernels.calculate_total_energy(lattice, J, 0.0)
+                                         for lattice in lattices]),
+                               lattices.sum(axis=(1, 2)).astype(np.int64))
+        return (lambda T, H: metropolis_step_replicas(lattices, 1 / T, J, H, streams),
+                observables, REPLICAS * N * N,
+                _driven(drive_replicas, pad(lattices), *observables(), streams,
+                        SCHEDULES["random"], TILE))
+    if name == "bitpacked":
+        if N % bitpacked.WORD_BITS:
+            return None
+        words = bitpacked.new_lattice(N)
+        stream = new_stream(0)
+        return (lambda T, H: bitpacked.metropolis_step(words, 1 / T, J, H, stream),
+                lambda: (bitpacked.calculate_total_energy(words, J, 0.0),
+                         int(bitpacked.unpack(words).sum())), N * N, None)
+    if name.startswith("halo_"):
+        if name == "halo_checkerboard" and N % 2:
+            return None
+        padded = pad(init_lattice(N))
+        schedule = SCHEDULES[name[len("halo_"):]]
+        stream = new_stream(0)
+        observables = lambda: (calculate_total_energy_padded(padded, J, 0.0),
+                               int(interior(padded).sum()))
+        if name == "halo_checkerboard":
+            return (lambda T, H: metropolis_step_checkerboard(padded, 1 / T, J, H, stream),
+                    observables, N * N,
+                    _driven(drive_checkerboard, padded, *observables(), stream, TILE))
+        return (lambda T, H: metropolis_step_padded(padded, 1 / T, J, H, stream, schedule),
+                observables, N * N,
+                _driven(drive_padded, padded, *observables(), stream, schedule, TILE))
+    raise ValueError(f"unknown engine {name!r}")
+
+
+def field_schedule(field):
+    """H(step) for the "static" or "sinusoidal" benchmark field."""
+    return sinusoidal_field(H_AMP, FIELD_OMEGAS[field])
+
+
+def compile_time(name):
+    """
+    Seconds spent compiling ``name`` (first call minus a warm call), or
+    None. Timed in a fresh interpreter with an empty scratch
+    ``NUMBA_CACHE_DIR``, so it is a compile, never a load from the cache.
+    """
+    if name not in COMPILED:
+        return None
+    with tempfile.TemporaryDirectory() as cache_dir:
+        return float(_launch(COMPILE_SCRIPT, _scratch_env(cache_dir), name)[1])
+
+
+def _scratch_env(cache_dir):
+    """Environment for a child interpreter that imports this checkout with JIT cache ``cache_dir``."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return dict(os.environ, NUMBA_CACHE_DIR=cache_dir,
+                PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+
+
+def _launch(script, env, *args):
+    """(wall seconds, stdout) of running ``script`` in a new interpreter."""
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", script, *args], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return time.perf_counter() - start, output
+
+
+def startup_time(runs=3):
+    """
+    Launch-to-first-sweep seconds of a new worker process, with an empty
+    ("cold") and a populated ("warm") JIT cache, split into import and
+    first-sweep time; "interpreter" is a bare ``python -c pass`` for scale.
+    Uses a scratch ``NUMBA_CACHE_DIR`` so the repository cache is untouched.
+    """
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = _scratch_env(cache_dir)
+        startup = {"interpreter": min(_launch("pass", env)[0] for _ in range(runs))}
+        launches = [_launch(STARTUP_SCRIPT, env) for _ in range(runs + 1)]
+    for name, (total, output) in (("cold", launches[0]), ("warm", min(launches[1:]))):
+        imported, first_sweep = map(float, output.split())
+        startup[name] = {"total": total, "import": imported, "first_sweep": first_sweep}
+    return startup
+
+
+def time_engine(name, N, field, mode, min_time=0.5, min_sweeps=2):
+    """One benchmark entry, or None if the engine does not support N."""
+    engine = make_engine(name, N)
+    if engine is None:
+        return None
+    sweep, observables, attempts, drive_chunk = engine
+    H = field_schedule(field)
+    sweep(T_BENCH, H(0))  # warm-up (and compilation, if not done yet)
+    observables()
+
+    sweeps = 0
+    done = 0
+    elapsed = 0.0
+    if mode == "sweep":
+        while sweeps < min_sweeps or elapsed < min_time:
+            h = H(sweeps)
+            start = time.perf_counter()
+            change = sweep(T_BENCH, h)
+            elapsed += time.perf_counter() - start
+            sweeps += 1
+            done += attempts if attempts is not None else change[3]
+    elif drive_chunk is not None:
+        # The simulators' path: compiled chunks from ising.driver, statistics fed in bulk
+        energies = drive_chunk(T_BENCH, sinusoidal_schedule(H_AMP, FIELD_OMEGAS[field], 0, 1))[0]
+        measurements = [ThermoAccumulator() for _ in np.atleast_2d(energies)]
+        n = 1
+        start = time.perf_counter()
+        while sweeps < min_sweeps or elapsed < min_time:
+            fields = sinusoidal_schedule(H_AMP, FIELD_OMEGAS[field], sweeps, sweeps + n)
+            energies, magnetizations, chunk_attempts = drive_chunk(T_BENCH, fields)
+            for accumulator, e, m in zip(measurements, np.atleast_2d(energies),
+                                         np.atleast_2d(magnetizations)):
+                accumulator.extend(e, m)
+            sweeps += n
+            done += chunk_attempts
+            elapsed = time.perf_counter() - start
+            # Chunks grow to the drivers' size, bounding the overshoot past min_time
+            n = min(2 * n, CHUNK)
+    else:
+        # Engines the simulators call sweep by sweep from Python
+        measurements = ThermoAccumulator()
+        start = time.perf_counter()
+        E, M = observables()
+        H_old = 0.0
+        while sweeps < min_sweeps or elapsed < min_time:
+            H_new = H(sweeps)
+            E -= (H_new - H_old) * M
+            H_old = H_new
+            change = sweep(T_BENCH, H_new)
+            E += change[0]
+            M += change[1]
+            for e, m in zip(np.atleast_1d(E), np.atleast_1d(M)):
+                measurements.add(e, m)
+            sweeps += 1
+            done += attempts
+            elapsed = time.perf_counter() - start
+
+    rate = done / elapsed
+    return {"engine": name, "N": N, "field": field, "mode": mode, "sweeps": sweeps,
+            "seconds": elapsed, "sweeps_per_s": sweeps / elapsed,
+            "attempts_per_s": rate, "ns_per_flip": 1e9 / rate}
+
+
+def run_benchmarks(engines=ENGINES, sizes=SIZES, fields=FIELDS, modes=MODES, min_time=0.5,
+                   startup=True):
+    """All benchmark entries plus compile and startup times and environment information."""
+    report = {
+        "environment": {"python": platform.python_version(), "numpy": np.__version__,
+                        "numba": numba.__version__, "threads": numba.get_num_threads(),
+                        "machine": platform.machine(),
+                        "processor": platform.processor(), "timestamp": time.time()},
+        "compile_seconds": {name: compile_time(name) for name in engines if name in COMPILED},
+        "startup_seconds": startup_time() if startup else None,
+        "results": [],
+    }
+    for name in engines:
+        for N in sizes:
+            for field in fields:
+                for mode in modes:
+                    entry = time_engine(name, N, field, mode, min_time)
+                    if entry is not None:
+                        report["results"].append(entry)
+                        print(f"{name:>26} N={N:<5} {field:>10} {mode:>5}: "
+                              f"{entry['attempts_per_s']:.3e} flips/s, {entry['ns_per_flip']:.2f} ns/flip")
+    return report
+
+
+def compare(report, baseline, tolerance=0.2):
+    """Entries slower than ``baseline`` by more than ``tolerance``, as (entry, ratio) pairs."""
+    reference = {(e["engine"], e["N"], e["field"], e["mode"]): e for e in baseline["results"]}
+    regressions = []
+    for entry in report["results"]:
+        old = reference.get((entry["engine"], entry["N"], entry["field"], entry["mode"]))
+        if old is not None:
+            ratio = entry["attempts_per_s"] / old["attempts_per_s"]
+            if ratio < 1 - tolerance:
+                regressions.append((entry, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=ENGINES)
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(SIZES))
+    parser.add_argument("--fields", nargs="+", default=list(FIELDS), choices=FIELDS)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds per entry")
+    parser.add_argument("--no-startup", action="store_true", help="skip the worker startup timing")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier --output file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed fractional slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.engines, args.sizes, args.fields, args.modes, args.min_time,
+                            not args.no_startup)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"Benchmark results saved to {args.output}")
+    for name, seconds in report["compile_seconds"].items():
+        print(f"JIT compile {name}: {seconds:.2f} s")
+    startup = report["startup_seconds"]
+    if startup:
+        print(f"Worker startup (interpreter alone {startup['interpreter']:.3f} s):")
+        for cache in ("cold", "warm"):
+            times = startup[cache]
+            print(f"  {cache} JIT cache: {times['total']:.3f} s to first sweep "
+                  f"(import {times['import']:.3f} s, first sweep {times['first_sweep']:.3f} s)")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for entry, ratio in regressions:
+            print(f"REGRESSION {entry['engine']} N={entry['N']} {entry['field']} {entry['mode']}: "
+                  f"{ratio:.2f}x baseline")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-spin-coded lattice: 64 spins per uint64 word, one bit per spin.
+
+Bit b of word w in row i holds the spin at column 64 * w + b (1 = up,
+0 = down), so an N x N lattice is an (N, N // 64) uint64 array and N must
+be a multiple of 64. ``metropolis_step`` does a red/black checkerboard
+sweep; within a word every lane of one colour is updated at once:
+
+* the number of antiparallel neighbours (0..4) is counted with a
+  bit-sliced adder on ``spin ^ neighbour`` words,
+* lanes whose move is downhill are accepted outright,
+* the remaining lanes compare a per-lane random number against their
+  acceptance probability (from ``ising.acceptance``) one bit-plane at a
+  time, most significant bit first, stopping once every lane is decided.
+
+The (dE, dM) change and the accepted count are reduced from the same
+masks: a flipped spin with a antiparallel neighbours changes the bond
+energy by 2 J (4 - 2a), so popcounts of the flipped lanes that are up,
+down, and set in each bit of a are all a word needs. The observables
+mirror ``ising.kernels``.
+"""
+
+# bitpacked.py
+import numpy as np
+from numba import jit
+
+from ising.acceptance import build_acceptance_table
+from ising.philox import raw_buffer, take_raw
+
+_acceptance_table = jit(nopython=True, cache=True)(build_acceptance_table)
+
+WORD_BITS = 64
+THRESHOLD_BITS = 32
+
+_ALL = np.uint64(0xFFFFFFFFFFFFFFFF)
+_EVEN_BITS = np.uint64(0x5555555555555555)
+_ODD_BITS = np.uint64(0xAAAAAAAAAAAAAAAA)
+
+
+def _check_size(N):
+    if N % WORD_BITS:
+        raise ValueError(f"bit-packed lattices need N to be a multiple of {WORD_BITS}, got {N}")
+
+
+def new_lattice(N):
+    """All-up packed N x N lattice."""
+    _check_size(N)
+    return np.full((N, N // WORD_BITS), _ALL, dtype=np.uint64)
+
+
+def pack(lattice):
+    """Pack a +-1 N x N lattice into (N, N // 64) uint64 words."""
+    N = lattice.shape[0]
+    _check_size(N)
+    bits = (np.asarray(lattice) > 0).reshape(N, N // WORD_BITS, WORD_BITS).astype(np.uint64)
+    return (bits << np.arange(WORD_BITS, dtype=np.uint64)).sum(axis=2, dtype=np.uint64)
+
+
+def unpack(words):
+    """Expand packed words back into an int8 +-1 lattice."""
+    N = words.shape[0]
+    bits = (words[:, :, None] >> np.arange(WORD_BITS, dtype=np.uint64)) & np.uint64(1)
+    return (2 * bits.reshape(N, N).astype(np.int8) - 1).astype(np.int8)
+
+
+@jit(nopython=True, cache=True)
+def _popcount(x):
+    """Number of set bits in a uint64 word."""
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return int((x * np.uint64(0x0101010101010101)) >> np.uint64(56))
+
+
+@jit(nopython=True, cache=True)
+def _right(words, i, w, W):
+    """Word holding the right-hand (j + 1) neighbour of every lane."""
+    return (words[i, w] >> np.uint64(1)) | (words[i, (w + 1) % W] << np.uint64(63))
+
+
+@jit(nopython=True, cache=True)
+def _left(words, i, w, W):
+    """Word holding the left-hand (j - 1) neighbour of every lane."""
+    return (words[i, w] << np.uint64(1)) | (words[i, (w - 1) % W] >> np.uint64(63))
+
+
+@jit(nopython=True, cache=True)
+def _thresholds(beta, J, H):
+    """
+    Per-class acceptance data indexed by [spin bit, antiparallel count]:
+    a mode (0 never, 1 always, 2 compare) and a 32-bit threshold.
+    """
+    table = _acceptance_table(beta, J, H)
+    mode = np.zeros((2, 5), dtype=np.int64)
+    threshold = np.zeros((2, 5), dtype=np.uint64)
+    for s in range(2):
+        for a in range(5):
+            # Neighbour sum is (4 - 2a) for an up spin, (2a - 4) for a down spin
+            p = table[s, 4 - a if s == 1 else a]
+            if p >= 1.0:
+                mode[s, a] = 1
+            elif p > 0.0:
+                mode[s, a] = 2
+                threshold[s, a] = np.uint64(p * 2.0 ** THRESHOLD_BITS)
+    return mode, threshold
+
+
+@jit(nopython=True, cache=True)
+def _update_colour(words, colour, mode, threshold, stream, randoms, pos):
+    """
+    Metropolis update of every lane of one checkerboard colour; returns
+    (pos, up spins flipped, down spins flipped, sum of their antiparallel counts).
+    """
+    N, W = words.shape
+    classes = np.zeros((2, 5), dtype=np.uint64)
+    up = 0
+    down = 0
+    antiparallel = 0
+    for i in range(N):
+        lanes = _EVEN_BITS if (i % 2) == colour else _ODD_BITS
+        up_row = (i - 1) % N
+        down_row = (i + 1) % N
+        for w in range(W):
+            s = words[i, w]
+            x1 = s ^ words[up_row, w]
+            x2 = s ^ words[down_row, w]
+            x3 = s ^ _left(words, i, w, W)
+            x4 = s ^ _right(words, i, w, W)
+
+            # Bit-sliced count of antiparallel neighbours: a = b0 + 2 b1 + 4 b2
+            s1 = x1 ^ x2
+            c1 = x1 & x2
+            s2 = x3 ^ x4
+            c2 = x3 & x4
+            b0 = s1 ^ s2
+            carry = s1 & s2
+            b1 = c1 ^ c2 ^ carry
+            b2 = (c1 & c2) | ((c1 ^ c2) & carry)
+
+            nb2 = ~b2
+            counts = (nb2 & ~b1 & ~b0, nb2 & ~b1 & b0, nb2 & b1 & ~b0, nb2 & b1 & b0, b2)
+            always = np.uint64(0)
+            pending = np.uint64(0)
+            for a in range(5):
+                classes[1, a] = lanes & s & counts[a]
+                classes[0, a] = lanes & ~s & counts[a]
+                for sb in range(2):
+                    if mode[sb, a] == 1:
+                        always |= classes[sb, a]
+                    elif mode[sb, a] == 2:
+                        pending |= classes[sb, a]
+
+            # Per-lane comparison random < threshold, one bit-plane at a time
+            below = np.uint64(0)
+            equal = pending
+            bit = THRESHOLD_BITS - 1
+            while equal != np.uint64(0) and bit >= 0:
+                plane = np.uint64(0)
+                for sb in range(2):
+                    for a in range(5):
+                        if mode[sb, a] == 2 and (threshold[sb, a] >> np.uint64(bit)) & np.uint64(1):
+                            plane |= classes[sb, a]
+                rand, pos = take_raw(stream, randoms, pos)
+                below |= equal & plane & ~rand
+                equal &= ~(plane ^ rand)
+                bit -= 1
+
+            flipped = always | below
+            words[i, w] = s ^ flipped
+            up += _popcount(flipped & s)
+            down += _popcount(flipped & ~s)
+            antiparallel += (_popcount(flipped & b0) + 2 * _popcount(flipped & b1)
+                             + 4 * _popcount(flipped & b2))
+    return pos, up, down, antiparallel
+
+
+@jit(nopython=True, cache=True)
+def metropolis_step(words, beta, J, H, stream):
+    """
+    One checkerboard Metropolis sweep (N*N attempts) of a packed lattice,
+    drawing from ``stream``; returns (dE, dM, accepted, attempts).
+    """
+    mode, threshold = _thresholds(beta, J, H)
+    randoms = raw_buffer(words.size)
+    pos, up, down, antiparallel = _update_colour(words, 0, mode, threshold, stream, randoms,
+                                                 len(randoms))
+    _, up_odd, down_odd, antiparallel_odd = _update_colour(words, 1, mode, threshold, stream,
+                                                           randoms, pos)
+    up += up_odd
+    down += down_odd
+    accepted = up + down
+    dE = 2 * J * (4 * accepted - 2 * (antiparallel + antiparallel_odd)) + 2 * H * (up - down)
+    return dE, 2 * (down - up), accepted, len(words) * len(words)
+
+
+@jit(nopython=True, cache=True)
+def _net_magnetization(words):
+    """Signed sum of all spins."""
+    N, W = words.shape
+    up = 0
+    for i in range(N):
+        for w in range(W):
+            up += _popcount(words[i, w])
+    return 2 * up - N * N
+
+
+@jit(nopython=True, cache=True)
+def calculate_magnetization(words):
+    """Calculate absolute magnetization."""
+    return abs(_net_magnetization(words))
+
+
+@jit(nopython=True, cache=True)
+def calculate_total_energy(words, J, H):
+    """Calculate total lattice energy from antiparallel bond counts."""
+    N, W = words.shape
+    antiparallel = 0
+    for i in range(N):
+        for w in range(W):
+            s = words[i, w]
+            antiparallel += _popcount(s ^ _right(words, i, w, W))
+            antiparallel += _popcount(s ^ words[(i + 1) % N, w])
+    return -J * (2 * N * N - 2 * antiparallel) - H * _net_magnetization(words)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed on-disk cache of grid-point summaries.
+
+An entry is one small JSON file named after the SHA-256 of everything
+that determines the point's result: the point function, the kernel
+version, (omega, T), the point's random stream and the run parameters (N, J,
+H_amp, thermalization, measure_steps, ...). Extending a grid or re-running
+a script with the same seed therefore only computes the new points.
+
+Hits refresh the entry's modification time, and once the entries exceed
+``max_bytes`` the least recently used ones are deleted.
+"""
+
+# cache.py
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+def _plain(value):
+    """JSON-serializable, exact form of parameter values (NumPy scalars, tuples)."""
+    if isinstance(value, (tuple, list, np.ndarray)):
+        return [_plain(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def cache_key(**fields):
+    """Hex digest identifying a result by the values that determine it."""
+    text = json.dumps({name: _plain(value) for name, value in fields.items()}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class ResultCache:
+    """Directory of summaries keyed by ``cache_key``, bounded to ``max_bytes``."""
+
+    def __init__(self, path, max_bytes=256 * 2 ** 20):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(path)
+                         if entry.name.endswith(".json"))
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key):
+        """Cached summary for ``key``, or None."""
+        try:
+            with open(self._file(key), "r") as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(self._file(key))
+        return summary
+
+    def put(self, key, summary):
+        """Store ``summary`` (a dict of floats, and histogram dicts), then evict down to ``max_bytes``."""
+        text = json.dumps({name: value if isinstance(value, dict) else float(value)
+                           for name, value in summary.items()})
+        temp = self._file(key) + ".tmp"
+        with open(temp, "w") as f:
+            f.write(text)
+        if os.path.exists(self._file(key)):
+            self._size -= os.path.getsize(self._file(key))
+        os.replace(temp, self._file(key))
+        self._size += len(text)
+        if self._size > self.max_bytes:
+            self.evict(self.max_bytes)
+
+    def evict(self, max_bytes):
+        """Delete least recently used entries until at most ``max_bytes`` remain."""
+        entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                         for entry in os.scandir(self.path) if entry.name.endswith(".json"))
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= max_bytes:
+                break
+            os.remove(path)
+            self._size -= size
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Wolff cluster updates for the critical region.
+
+Clusters are grown over aligned ferromagnetic bonds with probability
+p_add = 1 - exp(-2 beta J), which satisfies detailed balance for the
+exchange energy on its own. The field term breaks that symmetry, so the
+grown cluster is flipped with the Metropolis acceptance of its field
+energy change, dE = 2 H * spin * size (acceptance-corrected Wolff). For
+|H| small compared with the cluster sizes near Tc this rejects rarely.
+
+``wolff_step`` has the signature of ``ising.kernels.metropolis_step``
+(random numbers from the Philox ``stream``) and returns the same (dE, dM,
+accepted, attempts), over a fixed number of cluster moves per call (``clusters``, one
+by default). The count must not depend on the clusters grown: stopping
+once N*N sites have been visited makes the state seen at the end of a call
+depend on the path to it, and biases the sampled distribution towards
+large clusters (the ordered side). One call is therefore one cluster, not
+one sweep, in measurement and burn-in counts. Cluster moves change the
+kinetics, so they suit static fields; driven (omega > 0) points always
+run Metropolis (``ising.sweep.select_step``). The counts are in sites,
+flipped and grown, so their ratio is the size-weighted cluster acceptance.
+
+A move costs time in proportion to its cluster, not to the lattice: the
+N x N cluster marks and the site list live in a workspace
+(``wolff_workspace``) that ``wolff_move`` reuses, marking each cluster
+with its own id so the marks are never cleared, and uniforms are drawn
+WOLFF_DRAWS at a time. ``ising.driver.drive`` keeps one workspace per
+chunk; ``wolff_step`` allocates its own, which costs O(N^2) per call.
+"""
+
+# cluster.py
+import numpy as np
+from numba import jit
+
+from ising.philox import take
+
+# Uniforms per refill of a move's buffer; the unused rest is discarded
+WOLFF_DRAWS = 32
+
+
+@jit(nopython=True, cache=True)
+def wolff_workspace(N):
+    """(marks, sites, uniforms) for ``wolff_move`` on an N x N lattice; ids start at 1."""
+    return np.zeros((N, N), dtype=np.int64), np.empty(N * N, dtype=np.int64), np.empty(WOLFF_DRAWS)
+
+
+@jit(nopython=True, cache=True)
+def wolff_move(lattice, beta, J, H, stream, marks, sites, uniforms, cluster_id):
+    """
+    One Wolff cluster move in the ``wolff_workspace`` (marks, sites,
+    uniforms), marking the cluster with ``cluster_id``, which must exceed
+    every id used before on ``marks``; returns (dE, dM, sites flipped,
+    sites grown).
+    """
+    N = len(lattice)
+    if np.isinf(beta):
+        p_add = 1.0
+    else:
+        p_add = 1.0 - np.exp(-2 * beta * J) if J > 0 else 0.0
+    pos = len(uniforms)
+    u, pos = take(stream, uniforms, pos)
+    site = int(u * N * N)
+    i, j = site // N, site % N
+    spin = lattice[i, j]
+    marks[i, j] = cluster_id
+    sites[0] = i * N + j
+    size = 1
+    head = 0
+    while head < size:
+        site = sites[head]
+        head += 1
+        ci, cj = site // N, site % N
+        for ni, nj in ((ci, (cj + 1) % N), (ci, (cj - 1) % N),
+                       ((ci + 1) % N, cj), ((ci - 1) % N, cj)):
+            if marks[ni, nj] == cluster_id or lattice[ni, nj] != spin:
+                continue
+            u, pos = take(stream, uniforms, pos)
+            if u < p_add:
+                marks[ni, nj] = cluster_id
+                sites[size] = ni * N + nj
+                size += 1
+
+    dE = 2 * H * spin * size
+    accept = dE <= 0
+    if not accept and not np.isinf(beta):
+        u, pos = take(stream, uniforms, pos)
+        accept = u < np.exp(-beta * dE)
+    if not accept:
+        return 0.0, 0, 0, size
+    # Exchange energy changes only across bonds leaving the cluster
+    boundary = 0
+    for k in range(size):
+        ci, cj = sites[k] // N, sites[k] % N
+        for ni, nj in ((ci, (cj + 1) % N), (ci, (cj - 1) % N),
+                       ((ci + 1) % N, cj), ((ci - 1) % N, cj)):
+            if marks[ni, nj] != cluster_id:
+                boundary += lattice[ni, nj]
+    for k in range(size):
+        lattice[sites[k] // N, sites[k] % N] = -spin
+    return 2 * J * spin * boundary + dE, -2 * spin * size, size, size
+
+
+@jit(nopython=True, cache=True)
+def wolff_step(lattice, beta, J, H, stream, clusters=1):
+    """``clusters`` Wolff cluster moves with field-corrected acceptance; returns (dE, dM, sites flipped, sites grown)."""
+    marks, sites, uniforms = wolff_workspace(len(lattice))
+    dE = 0.0
+    dM = 0
+    flipped = 0
+    grown = 0
+    for cluster_id in range(1, clusters + 1):
+        e, m, f, g = wolff_move(lattice, beta, J, H, stream, marks, sites, uniforms, cluster_id)
+        dE += e
+        dM += m
+        flipped += f
+        grown += g
+    return dE, dM, flipped, grown
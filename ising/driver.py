@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled sweep drivers: many sweeps under a field schedule in one call.
+
+Calling a kernel once per sweep from Python costs an interpreter round
+trip, a field evaluation and a running-total update per sweep, which for
+small lattices rivals the sweep itself. The drivers take a block of
+precomputed field values (``ising.field.sinusoidal_schedule``), run one
+sweep per value and write the running E and M after every sweep into
+caller-owned buffers, which are then fed to the streaming statistics in
+bulk. The Philox streams (``ising.philox``) are consumed exactly as by
+the per-sweep loop.
+
+Metropolis sweeps run on halo-padded lattices (``ising.halo``) in the
+order given by ``schedule``; Wolff moves (one cluster per step) use the
+plain N x N lattice.
+
+With ``sample_every > 0``, every sweep whose global index (``first_step``
++ k) is a multiple of it adds the accepted flips and attempts its kernel
+counted (sites flipped and sites grown for Wolff moves) to the returned
+totals, for ``ising.instrument``.
+"""
+
+# driver.py
+import numpy as np
+from numba import jit
+
+from ising.cluster import wolff_move, wolff_workspace
+from ising.halo import metropolis_step_checkerboard, metropolis_step_padded
+from ising.kernels import metropolis_step
+from ising.replicas import metropolis_step_replicas_padded
+
+# Sweeps per driver call; bounds the E/M buffers, not the run length
+CHUNK = 1024
+
+
+@jit(nopython=True, cache=True)
+def drive(lattice, beta, J, fields, H, E, M, energies, magnetizations, stream, cluster,
+          first_step, sample_every):
+    """
+    Sweep ``lattice`` once per entry of ``fields`` (Wolff moves if
+    ``cluster``, else Metropolis), starting from the running totals E, M at
+    field H, drawing from ``stream``. energies[k], magnetizations[k]
+    receive E and M after sweep k.
+    Returns (E, M, sampled accepted flips, sampled attempts).
+    """
+    # One Wolff workspace per chunk; cluster k is marked with id k + 1
+    marks, sites, uniforms = wolff_workspace(len(lattice) if cluster else 0)
+    accepted = 0
+    attempts = 0
+    for k in range(len(fields)):
+        E -= (fields[k] - H) * M
+        H = fields[k]
+        if cluster:
+            dE, dM, flips, tries = wolff_move(lattice, beta, J, H, stream, marks, sites, uniforms,
+                                              k + 1)
+        else:
+            dE, dM, flips, tries = metropolis_step(lattice, beta, J, H, stream)
+        if sample_every > 0 and (first_step + k) % sample_every == 0:
+            accepted += flips
+            attempts += tries
+        E += dE
+        M += dM
+        energies[k] = E
+        magnetizations[k] = M
+    return E, M, accepted, attempts
+
+
+@jit(nopython=True, cache=True)
+def drive_padded(padded, beta, J, fields, H, E, M, energies, magnetizations, stream, schedule,
+                 tile, first_step, sample_every):
+    """
+    ``drive`` with Metropolis sweeps of a halo-padded lattice in the order
+    ``schedule`` (``ising.halo.SCHEDULES`` value, blocks of ``tile``).
+    """
+    accepted = 0
+    attempts = 0
+    for k in range(len(fields)):
+        E -= (fields[k] - H) * M
+        H = fields[k]
+        dE, dM, flips, tries = metropolis_step_padded(padded, beta, J, H, stream, schedule, tile)
+        if sample_every > 0 and (first_step + k) % sample_every == 0:
+            accepted += flips
+            attempts += tries
+        E += dE
+        M += dM
+        energies[k] = E
+        magnetizations[k] = M
+    return E, M, accepted, attempts
+
+
+@jit(nopython=True, cache=True)
+def drive_checkerboard(padded, beta, J, fields, H, E, M, energies, magnetizations, stream, rows,
+                       first_step, sample_every):
+    """
+    ``drive_padded`` with multithreaded "checkerboard" sweeps
+    (``ising.halo.metropolis_step_checkerboard``, blocks of ``rows``
+    rows); a separate driver so that only these runs start numba's threads.
+    """
+    accepted = 0
+    attempts = 0
+    for k in range(len(fields)):
+        E -= (fields[k] - H) * M
+        H = fields[k]
+        dE, dM, flips, tries = metropolis_step_checkerboard(padded, beta, J, H, stream, rows)
+        if sample_every > 0 and (first_step + k) % sample_every == 0:
+            accepted += flips
+            attempts += tries
+        E += dE
+        M += dM
+        energies[k] = E
+        magnetizations[k] = M
+    return E, M, accepted, attempts
+
+
+@jit(nopython=True, cache=True)
+def drive_replicas(padded, beta, J, fields, H, E, M, energies, magnetizations, streams,
+                   schedule, tile, first_step, sample_every):
+    """
+    ``drive_padded`` for an (R, N+2, N+2) stack through
+    ``metropolis_step_replicas_padded`` (replica r drawing from
+    ``streams[r]``); E and M are per-replica arrays updated in place,
+    energies[r, k] and magnetizations[r, k] receive replica r after
+    sweep k. Returns (sampled accepted flips, sampled attempts).
+    """
+    accepted = 0
+    attempts = 0
+    for k in range(len(fields)):
+        E -= (fields[k] - H) * M
+        H = fields[k]
+        dE, dM, flips, tries = metropolis_step_replicas_padded(padded, beta, J, H, streams,
+                                                               schedule, tile)
+        if sample_every > 0 and (first_step + k) % sample_every == 0:
+            accepted += np.sum(flips)
+            attempts += tries * len(flips)
+        E += dE
+        M += dM
+        energies[:, k] = E
+        magnetizations[:, k] = M
+    return accepted, attempts
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+External field schedules H(step) for the driven simulations.
+"""
+
+# field.py
+import numpy as np
+
+
+def sinusoidal_field(H_amp, omega):
+    """H(step) = H_amp * sin(omega * step), or the static H_amp when omega == 0."""
+    if omega == 0:
+        return lambda step: H_amp
+    return lambda step: H_amp * np.sin(omega * step)
+
+
+def sinusoidal_schedule(H_amp, omega, start, stop):
+    """``sinusoidal_field`` values for steps start .. stop - 1, as a float array."""
+    steps = np.arange(start, stop)
+    if omega == 0:
+        return np.full(len(steps), float(H_amp))
+    return H_amp * np.sin(omega * steps)
+
+
+def period_aligned_steps(omega, measure_steps):
+    """Measurement length rounded to whole field periods (at least ten)."""
+    if omega > 0:
+        field_period = int(2 * np.pi / omega)
+        num_periods = max(10, measure_steps // field_period)
+        return num_periods * field_period
+    return measure_steps
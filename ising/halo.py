@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Halo-padded lattices and selectable sweep orders for the Metropolis kernels.
+
+An N x N lattice is stored as (N+2, N+2) with the periodic images of the
+opposite edges in the outer ring (the halo), so every interior site reads
+its four neighbours at fixed offsets, without ``% N``. A flip on an edge
+is written to its halo image at once, so the halo is exact at every
+proposal, whatever the order of updates.
+
+Schedules (``SCHEDULES``):
+
+* ``"random"``: N*N uniformly random sites, drawing exactly the random
+  numbers of ``ising.kernels.metropolis_step`` (same chain for a stream),
+* ``"sequential"``: every site once, row by row; memory is walked in
+  order, so large lattices stream through the cache,
+* ``"tiled"``: every site once, TILE x TILE block by block, each block
+  row by row,
+* ``"checkerboard"``: every site once, all sites of one colour of the
+  checkerboard, then the other, with each colour split into blocks of
+  TILE rows that are updated concurrently on numba's threads
+  (``numba.set_num_threads`` / ``NUMBA_NUM_THREADS``). Needs an even N.
+
+The ordered schedules satisfy balance (not detailed balance) and sample
+the same equilibrium, but their kinetics differ from random-site updates,
+which matters for the driven response; "random" stays the default.
+
+"checkerboard" is for one large lattice on a whole node: sites of one
+colour share no bonds, and each row block draws from its own substream of
+the caller's stream (the block and colour in the stream's last word), so
+the result depends on the stream and TILE but not on the number of
+threads or the order they run in. Run it with one worker process, or
+processes times threads oversubscribes the cores. It has its own entry
+points, ``metropolis_step_checkerboard`` and
+``ising.driver.drive_checkerboard``, outside the serial ``_sweep``: only
+runs that use it start numba's threading layer, whose threads a process
+must not have when it forks workers.
+"""
+
+# halo.py
+import numpy as np
+from numba import jit, prange
+
+from ising.acceptance import build_acceptance_table
+from ising.philox import _advance, _counter, buffer, fill_uniform
+
+_acceptance_table = jit(nopython=True, cache=True)(build_acceptance_table)
+
+RANDOM, SEQUENTIAL, TILED, CHECKERBOARD = 0, 1, 2, 3
+SCHEDULES = {"random": RANDOM, "sequential": SEQUENTIAL, "tiled": TILED,
+             "checkerboard": CHECKERBOARD}
+
+# 32 x 32 int8 spins: a block and its neighbour rows stay in L1
+TILE = 32
+
+
+def refresh_halo(padded):
+    """Fill the halo of (..., N+2, N+2) ``padded`` from the interior edges."""
+    padded[..., 0, :] = padded[..., -2, :]
+    padded[..., -1, :] = padded[..., 1, :]
+    padded[..., :, 0] = padded[..., :, -2]
+    padded[..., :, -1] = padded[..., :, 1]
+
+
+def pad(lattice):
+    """Halo-padded copy of an (..., N, N) lattice or stack of lattices."""
+    N = lattice.shape[-1]
+    padded = np.empty(lattice.shape[:-2] + (N + 2, N + 2), dtype=lattice.dtype)
+    padded[..., 1:-1, 1:-1] = lattice
+    refresh_halo(padded)
+    return padded
+
+
+def interior(padded):
+    """View of the N x N spins of a padded lattice (or stack)."""
+    return padded[..., 1:-1, 1:-1]
+
+
+@jit(nopython=True, cache=True, inline="always")
+def _mirror(padded, i, j, n, spin):
+    """Write spin at interior (i, j) into its halo images."""
+    if i == 1:
+        padded[n + 1, j] = spin
+    if i == n:
+        padded[0, j] = spin
+    if j == 1:
+        padded[i, n + 1] = spin
+    if j == n:
+        padded[i, 0] = spin
+
+
+@jit(nopython=True, cache=True, inline="always")
+def _flip(padded, i, j, n, table, J, H, u):
+    """Metropolis test of interior site (i, j), 1-based, against uniform u; returns (dE, dM)."""
+    spin = padded[i, j]
+    local_field = padded[i, j + 1] + padded[i, j - 1] + padded[i + 1, j] + padded[i - 1, j]
+    p = table[1 if spin > 0 else 0, int(local_field + 4) // 2]
+    if p >= 1.0 or u < p:
+        padded[i, j] = -spin
+        _mirror(padded, i, j, n, -spin)
+        return 2 * spin * (J * local_field + H), -2 * spin
+    return 0.0, 0
+
+
+@jit(nopython=True, parallel=True, cache=True)
+def _checkerboard(padded, table, J, H, stream, rows):
+    """
+    Both colours of a padded lattice, each in concurrent blocks of ``rows``
+    rows; returns (dE, dM, accepted). Block b of colour c draws from ``stream`` with
+    its last word set to 2*b + c + 1, from the stream's next block, and the
+    stream then moves past the most any block can have used.
+    """
+    n = padded.shape[0] - 2
+    if n % 2:
+        raise ValueError("checkerboard sweeps need an even lattice size")
+    blocks = (n + rows - 1) // rows
+    draws = rows * (n // 2)
+    size = len(buffer(draws))
+    dE = 0.0
+    dM = 0
+    accepted = 0
+    for colour in range(2):
+        for b in prange(blocks):
+            substream = stream.copy()
+            substream[5] = 2 * b + colour + 1
+            uniforms = buffer(draws)
+            pos = size
+            for i in range(b * rows + 1, min((b + 1) * rows, n) + 1):
+                # Interior sites are 1-based: colour c holds (i + j) % 2 == c
+                for j in range(2 - (i + colour) % 2, n + 1, 2):
+                    if pos == size:
+                        fill_uniform(substream, uniforms)
+                        pos = 0
+                    e, m = _flip(padded, i, j, n, table, J, H, uniforms[pos])
+                    pos += 1
+                    dE += e
+                    dM += m
+                    accepted += m != 0
+    _advance(stream, _counter(stream) + np.uint64((draws + size - 1) // size * (size // 4)))
+    return dE, dM, accepted
+
+
+@jit(nopython=True, cache=True)
+def _sweep(padded, table, J, H, stream, uniforms, schedule, tile):
+    """
+    N*N attempts on one padded lattice in the order ``schedule``; returns
+    (dE, dM, accepted). Random-site attempts take two uniforms each (as
+    ``ising.kernels._sweep``), ordered ones only the acceptance uniform.
+    """
+    n = padded.shape[0] - 2
+    pos = len(uniforms)
+    dE = 0.0
+    dM = 0
+    accepted = 0
+    if schedule == RANDOM:
+        for _ in range(n * n):
+            if pos == len(uniforms):
+                fill_uniform(stream, uniforms)
+                pos = 0
+            site = int(uniforms[pos] * n * n)
+            e, m = _flip(padded, site // n + 1, site % n + 1, n, table, J, H, uniforms[pos + 1])
+            pos += 2
+            dE += e
+            dM += m
+            accepted += m != 0
+    elif schedule == SEQUENTIAL:
+        for i in range(1, n + 1):
+            for j in range(1, n + 1):
+                if pos == len(uniforms):
+                    fill_uniform(stream, uniforms)
+                    pos = 0
+                e, m = _flip(padded, i, j, n, table, J, H, uniforms[pos])
+                pos += 1
+                dE += e
+                dM += m
+                accepted += m != 0
+    elif schedule == TILED:
+        for ti in range(1, n + 1, tile):
+            for tj in range(1, n + 1, tile):
+                for i in range(ti, min(ti + tile, n + 1)):
+                    for j in range(tj, min(tj + tile, n + 1)):
+                        if pos == len(uniforms):
+                            fill_uniform(stream, uniforms)
+                            pos = 0
+                        e, m = _flip(padded, i, j, n, table, J, H, uniforms[pos])
+                        pos += 1
+                        dE += e
+                        dM += m
+                        accepted += m != 0
+    else:
+        raise ValueError("checkerboard sweeps run through metropolis_step_checkerboard")
+    return dE, dM, accepted
+
+
+@jit(nopython=True, cache=True)
+def metropolis_step_padded(padded, beta, J, H, stream, schedule=RANDOM, tile=TILE):
+    """One Metropolis sweep (N*N attempts) of a padded lattice in the given order; returns (dE, dM, accepted, attempts)."""
+    n = padded.shape[0] - 2
+    dE, dM, accepted = _sweep(padded, _acceptance_table(beta, J, H), J, H, stream,
+                              buffer(2 * n * n), schedule, tile)
+    return dE, dM, accepted, n * n
+
+
+@jit(nopython=True, cache=True)
+def metropolis_step_checkerboard(padded, beta, J, H, stream, rows=TILE):
+    """One multithreaded "checkerboard" sweep of a padded lattice in blocks of ``rows`` rows; returns (dE, dM, accepted, attempts)."""
+    n = padded.shape[0] - 2
+    dE, dM, accepted = _checkerboard(padded, _acceptance_table(beta, J, H), J, H, stream, rows)
+    return dE, dM, accepted, n * n
+
+
+@jit(nopython=True, cache=True)
+def calculate_total_energy_padded(padded, J, H):
+    """``ising.kernels.calculate_total_energy`` of a padded lattice."""
+    n = padded.shape[0] - 2
+    E = 0.0
+    M = 0
+    for i in range(1, n + 1):
+        for j in range(1, n + 1):
+            E -= J * padded[i, j] * (padded[i, j + 1] + padded[i + 1, j])
+            M += padded[i, j]
+    return E - H * M
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Low-overhead progress reporting, phase timers and acceptance counters.
+
+``Progress`` replaces per-step prints and nested tqdm bars: ``update``
+only counts, and reads the clock every ``stride`` updates, with the stride
+adapted so the clock is checked a few times per ``min_interval``; a line
+is written at most once per interval.
+
+``Instrumentation`` accumulates wall time per named phase (jit,
+thermalization, measurement, observables, io, ...) and flip attempts /
+acceptances. Its ``summary()`` is a plain dict meant to be stored with the
+results; summaries from worker processes are combined with ``merge``.
+"""
+
+# instrument.py
+import sys
+import time
+from contextlib import contextmanager
+
+
+class Progress:
+    """Rate-limited single-line progress display."""
+
+    def __init__(self, total, desc="", min_interval=0.5, stream=None):
+        self.total = total
+        self.desc = desc
+        self.min_interval = min_interval
+        self.stream = stream or sys.stderr
+        self.count = 0
+        self.start = time.perf_counter()
+        self._last = self.start
+        self._stride = 1
+        self._next_check = 1
+        self._width = 0
+
+    def update(self, n=1, info=""):
+        """Count ``n`` finished units; ``info`` is appended to the displayed line."""
+        self.count += n
+        if self.count < self._next_check:
+            return
+        now = time.perf_counter()
+        # Aim for about ten clock reads per display interval
+        if now - self._last < 0.1 * self.min_interval:
+            self._stride *= 2
+        elif self._stride > 1 and now - self._last > self.min_interval:
+            self._stride //= 2
+        self._next_check = self.count + self._stride
+        if now - self._last >= self.min_interval or self.count >= self.total:
+            self._last = now
+            self._write(now, info)
+
+    def _write(self, now, info=""):
+        elapsed = now - self.start
+        fraction = self.count / self.total if self.total else 1.0
+        eta = elapsed / fraction - elapsed if fraction > 0 else float("nan")
+        line = (f"\r{self.desc}: {self.count}/{self.total} ({100 * fraction:.1f}%) "
+                f"| {elapsed:.1f}s elapsed | ETA {eta:.1f}s")
+        line += f" | {info}" if info else ""
+        # Pad over the rest of a longer previous line
+        self.stream.write(line.ljust(self._width))
+        self._width = len(line)
+        self.stream.flush()
+
+    def close(self):
+        """Write the final state and end the line."""
+        self._write(time.perf_counter())
+        self.stream.write("\n")
+        self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Instrumentation:
+    """Wall time per phase plus flip attempt/acceptance counts."""
+
+    def __init__(self):
+        self.phases = {}
+        self.attempts = 0
+        self.accepted = 0
+
+    def add_time(self, name, seconds, calls=1):
+        """Charge ``seconds`` to phase ``name``."""
+        total, count = self.phases.get(name, (0.0, 0))
+        self.phases[name] = (total + seconds, count + calls)
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as phase ``name``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def count(self, attempts, accepted):
+        """Record flip attempts and how many were accepted."""
+        self.attempts += int(attempts)
+        self.accepted += int(accepted)
+
+    @property
+    def acceptance_rate(self):
+        return self.accepted / self.attempts if self.attempts else float("nan")
+
+    def summary(self):
+        """Plain-dict summary (JSON-serializable)."""
+        return {
+            "phases": {name: {"seconds": seconds, "calls": calls}
+                       for name, (seconds, calls) in self.phases.items()},
+            "attempts": self.attempts,
+            "accepted": self.accepted,
+            "acceptance_rate": self.acceptance_rate,
+        }
+
+    def merge(self, summary):
+        """Add a ``summary()`` from another Instrumentation (e.g. a worker)."""
+        for name, phase in summary["phases"].items():
+            self.add_time(name, phase["seconds"], phase["calls"])
+        self.count(summary["attempts"], summary["accepted"])
+
+    def report(self):
+        """Human-readable multi-line breakdown."""
+        total = sum(seconds for seconds, _ in self.phases.values()) or 1.0
+        lines = [f"{name:>16}: {seconds:9.2f} s ({100 * seconds / total:5.1f}%) in {calls} calls"
+                 for name, (seconds, calls) in sorted(self.phases.items(), key=lambda p: -p[1][0])]
+        if self.attempts:
+            lines.append(f"{'acceptance':>16}: {self.acceptance_rate:.4f} "
+                         f"({self.accepted} of {self.attempts} attempts)")
+        return "\n".join(lines)
+
+
+def compile_kernel(kernel, *args, instrument=None):
+    """
+    Compile numba ``kernel`` for the types of ``args`` without running it
+    (so no random numbers are drawn), timed as the "jit" phase. No-op when
+    that signature is already compiled.
+    """
+    # Deferred: Progress and Instrumentation are used by the pure-Python
+    # scripts, which should not pay for importing numba
+    import numba
+
+    signature = tuple(numba.typeof(arg) for arg in args)
+    if signature in kernel.overloads:
+        return
+    start = time.perf_counter()
+    kernel.compile(signature)
+    if instrument is not None:
+        instrument.add_time("jit", time.perf_counter() - start)
+
+
+def instrumented_call(function, *args, **kwargs):
+    """``function(*args, instrument=..., **kwargs)`` and its Instrumentation summary."""
+    instrument = Instrumentation()
+    result = function(*args, instrument=instrument, **kwargs)
+    return result, instrument.summary()
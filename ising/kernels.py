@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled Metropolis kernels shared by the sinusoidal-field simulators.
+
+Lattices are int8 (see ``ising.lattice``); each sweep looks acceptance
+probabilities up in a ten-entry table rebuilt from (beta, J, H) at the
+start of the sweep, so a changing field costs ten exponentials per sweep
+instead of one per proposal.
+
+Update kernels return the (energy, magnetization) change of the sweep at
+the field they were called with, so callers can keep running totals
+instead of re-evaluating the O(N^2) observables, followed by the number
+of accepted flips and of attempts, counted as the sweep runs.
+
+All kernels in the package are compiled with ``cache=True``: the machine
+code is stored next to the source (or under ``NUMBA_CACHE_DIR``) and
+reused by later processes until any module of the package changes (see
+``ising.numba_cache``), so edits to helpers inlined from another module,
+e.g. ``ising.philox.take``, are picked up too.
+
+Random numbers come from a Philox stream passed to every update kernel
+(``ising.philox``), never from the global NumPy state, so a run is fixed
+by the streams it is given.
+"""
+
+# kernels.py
+import numpy as np
+from numba import jit
+
+from ising.acceptance import build_acceptance_table
+from ising.philox import buffer, fill_uniform
+
+_acceptance_table = jit(nopython=True, cache=True)(build_acceptance_table)
+
+
+@jit(nopython=True, cache=True)
+def calculate_total_energy(lattice, J, H):
+    """Calculate total lattice energy correctly."""
+    N = len(lattice)
+    E = 0.0
+    for i in range(N):
+        for j in range(N):
+            E -= J * lattice[i,j] * (
+                lattice[i, (j+1)%N] +
+                lattice[(i+1)%N, j]
+            )
+    E -= H * np.sum(lattice)
+    return E
+
+
+@jit(nopython=True, cache=True)
+def calculate_magnetization(lattice):
+    """Calculate absolute magnetization."""
+    return abs(np.sum(lattice))
+
+
+@jit(nopython=True, cache=True)
+def _sweep(lattice, table, J, H, stream, uniforms):
+    """
+    N*N Metropolis attempts at random sites, drawing from ``stream``;
+    returns (dE, dM, accepted). Every attempt takes two uniforms (site, acceptance)
+    from ``uniforms``, whose length is a multiple of four.
+    """
+    N = len(lattice)
+    pos = len(uniforms)
+    dE = 0.0
+    dM = 0
+    accepted = 0
+    for _ in range(N*N):
+        if pos == len(uniforms):
+            fill_uniform(stream, uniforms)
+            pos = 0
+        site = int(uniforms[pos] * N * N)
+        u = uniforms[pos + 1]
+        pos += 2
+        i, j = site // N, site % N
+        spin = lattice[i,j]
+        local_field = (lattice[i, (j+1)%N] +
+                      lattice[i, (j-1)%N] +
+                      lattice[(i+1)%N, j] +
+                      lattice[(i-1)%N, j])
+        p = table[1 if spin > 0 else 0, int(local_field + 4) // 2]
+        if p >= 1.0 or u < p:
+            lattice[i,j] = -spin
+            dE += 2 * spin * (J * local_field + H)
+            dM -= 2 * spin
+            accepted += 1
+    return dE, dM, accepted
+
+
+@jit(nopython=True, cache=True)
+def metropolis_step(lattice, beta, J, H, stream):
+    """Single Metropolis step with external field; returns (dE, dM, accepted, attempts)."""
+    N = len(lattice)
+    dE, dM, accepted = _sweep(lattice, _acceptance_table(beta, J, H), J, H, stream,
+                              buffer(2 * N * N))
+    return dE, dM, accepted, N * N
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+Compact spin lattices: one signed byte per +-1 spin.
+"""
+
+# lattice.py
+import numpy as np
+
+from ising.philox import default_stream
+
+SPIN_DTYPE = np.int8
+
+
+def init_lattice(size, random_spins=False, rng=None):
+    """
+    Create a size x size int8 lattice with either random spins (from
+    ``rng``, a ``RandomStream``; the process default if None) or all +1.
+    """
+    if random_spins:
+        up = (rng or default_stream()).uniform(size * size).reshape(size, size) < 0.5
+        return np.where(up, 1, -1).astype(SPIN_DTYPE)
+    return np.ones((size, size), dtype=SPIN_DTYPE)
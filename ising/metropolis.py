@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Single-spin Metropolis update shared by the pure-Python simulators.
+
+Random numbers come from a ``ising.philox.RandomStream``, out of its
+bulk-filled buffer, instead of two NumPy calls per step.
+"""
+
+# metropolis.py
+from ising.acceptance import acceptance_table, inverse_temperature, neighbour_index, spin_index
+from ising.philox import default_stream
+
+
+def metropolis_update(lattice, temp, J, ext_field, boltzmann_const=1.0, rng=None):
+    """
+    Try to flip one random spin, drawing from ``rng`` (a ``RandomStream``;
+    the process default if None); returns (energy_change, magnetization_change).
+    """
+    rng = rng or default_stream()
+    size = lattice.shape[0]
+    x, y = int(rng.uniform() * size), int(rng.uniform() * size)
+    spin = lattice[x, y]
+    neighbors = (
+        lattice[(x + 1) % size, y]
+        + lattice[(x - 1) % size, y]
+        + lattice[x, (y + 1) % size]
+        + lattice[x, (y - 1) % size]
+    )
+    table = acceptance_table(inverse_temperature(temp, boltzmann_const), J, ext_field)
+    probability = table[spin_index(spin), neighbour_index(neighbors)]
+    if probability >= 1.0 or rng.uniform() < probability:
+        lattice[x, y] *= -1
+        return 2 * J * spin * neighbors + 2 * ext_field * spin, -2 * spin
+    return 0, 0
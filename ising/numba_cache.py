@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Numba cache entries stamped with the source of the whole package.
+
+Numba marks a cached kernel with the modification time and size of the
+file that defines it, and nothing else, so a kernel that inlines a helper
+from another module (``ising.philox.take``, the acceptance tables, ...)
+keeps its old machine code after the helper is edited. ``install`` puts
+locators at the front of numba's list that, for functions defined in this
+package, stamp the entries with a SHA-256 of every ``ising/*.py`` file
+instead: editing any module invalidates every cached kernel on its next
+use. Entries still live next to the source, or under ``NUMBA_CACHE_DIR``.
+
+``ising.philox`` installs them when it jits its kernels, which every
+compiled module imports before defining its own.
+"""
+
+# numba_cache.py
+import glob
+import hashlib
+import os
+from functools import lru_cache
+
+from numba.core.caching import InTreeCacheLocator, UserProvidedCacheLocator, CacheImpl
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@lru_cache(maxsize=None)
+def source_hash():
+    """SHA-256 of the package sources, in file name order."""
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(PACKAGE_DIR, "*.py"))):
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class _PackageStamp:
+    """Locator mixin: package functions only, stamped with ``source_hash()``."""
+
+    def get_source_stamp(self):
+        return source_hash()
+
+    @classmethod
+    def from_function(cls, py_func, py_file):
+        if os.path.dirname(os.path.abspath(py_file)) != PACKAGE_DIR:
+            return None
+        return super().from_function(py_func, py_file)
+
+
+class PackageUserProvidedLocator(_PackageStamp, UserProvidedCacheLocator):
+    """``NUMBA_CACHE_DIR`` entries of package kernels."""
+
+
+class PackageInTreeLocator(_PackageStamp, InTreeCacheLocator):
+    """``__pycache__`` entries of package kernels."""
+
+
+def install():
+    """Put the package locators first (once); affects kernels jitted afterwards."""
+    locators = CacheImpl._locator_classes
+    if PackageInTreeLocator not in locators:
+        locators[:0] = [PackageUserProvidedLocator, PackageInTreeLocator]
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Counter-based random streams (Philox4x32-10) for every kernel.
+
+A stream is six 32-bit words, a 64-bit key and a 128-bit counter:
+
+    [key0, key1, block_low, block_high, replica, 0]
+
+Block b of a stream is the Philox bijection of its counter advanced by b,
+under the key: four 32-bit words, computable on their own, so streams
+share no state and any of them can be regenerated anywhere. The key is
+derived from (seed, point) with ``np.random.SeedSequence`` (the point's
+values, e.g. (omega, T), are its spawn key); the counter holds the
+replica and the block number. A point of a parallel run is therefore
+reproduced bit for bit by rebuilding its stream from (seed, point,
+replica), whatever else ran before it or beside it.
+
+Kernels draw in bulk: they read uniforms from a small buffer that
+``fill_uniform`` refills with whole blocks, so the Philox rounds run in a
+tight loop instead of once per proposal (``take`` does the bookkeeping
+for kernels with a variable number of draws). Numbers left in a buffer
+when a kernel returns are discarded, so how many a call consumes depends
+on the buffer size (``buffer``), which is part of the kernel.
+``RandomStream`` does the same for pure-Python code, and its state (the
+stream at the last refill plus the position in the buffer) is what a
+checkpoint stores.
+
+The kernels are jitted on first access (a module ``__getattr__``), and
+``RandomStream`` refills with the same rounds evaluated by NumPy over
+whole arrays of blocks, so the pure-Python scripts never import numba.
+
+Uniforms have 32-bit resolution, which is plenty for acceptance tests and
+site choices on lattices of up to 2**16 x 2**16 spins.
+"""
+
+# philox.py
+import os
+
+import numpy as np
+
+STREAM_WORDS = 6
+
+# Numbers per kernel buffer: a few kilobytes, refilled in place
+BUFFER = 512
+
+_MASK = np.uint64(0xFFFFFFFF)
+_SHIFT = np.uint64(32)
+_M0 = np.uint64(0xD2511F53)
+_M1 = np.uint64(0xCD9E8D57)
+_W0 = np.uint64(0x9E3779B9)
+_W1 = np.uint64(0xBB67AE85)
+_SCALE = 1.0 / 4294967296.0
+
+
+def new_stream(seed=None, point=(), replica=0):
+    """
+    Stream for (seed, point, replica): ``point`` is a tuple of the values
+    that identify the sweep point; seed None draws fresh entropy.
+    """
+    spawn_key = tuple(int(np.float64(value).view(np.uint64)) for value in point)
+    key = np.random.SeedSequence(seed, spawn_key=spawn_key).generate_state(2, np.uint32)
+    return np.array([key[0], key[1], 0, 0, replica, 0], dtype=np.uint32)
+
+
+def new_streams(seed, point, replicas):
+    """(len(replicas), 6) streams of one point, one per replica index."""
+    streams = np.tile(new_stream(seed, point), (len(replicas), 1))
+    streams[:, 4] = np.asarray(replicas, dtype=np.uint32)
+    return streams
+
+
+# name -> (function, jit options); the names are bound by ``__getattr__``
+_KERNELS = {}
+
+
+def _kernel(**options):
+    """Register a numba kernel, jitted with ``options`` when first accessed."""
+    def register(function):
+        _KERNELS[function.__name__] = function, options
+        return function
+    return register
+
+
+@_kernel(inline="always")
+def _round(c0, c1, c2, c3, k0, k1):
+    """One Philox round on 32-bit values held in uint64."""
+    p0 = _M0 * c0
+    p1 = _M1 * c2
+    return ((p1 >> _SHIFT) ^ c1 ^ k0, p1 & _MASK, (p0 >> _SHIFT) ^ c3 ^ k1, p0 & _MASK)
+
+
+@_kernel(inline="always")
+def _philox(c0, c1, c2, c3, k0, k1):
+    """Philox4x32-10 of counter (c0, c1, c2, c3) under key (k0, k1)."""
+    c0, c1, c2, c3 = _round(c0, c1, c2, c3, k0, k1)
+    for _ in range(9):
+        k0 = (k0 + _W0) & _MASK
+        k1 = (k1 + _W1) & _MASK
+        c0, c1, c2, c3 = _round(c0, c1, c2, c3, k0, k1)
+    return c0, c1, c2, c3
+
+
+@_kernel(inline="always")
+def _block(stream, b):
+    """Words of block b (64-bit block number) of ``stream``."""
+    return _philox(b & _MASK, b >> _SHIFT, np.uint64(stream[4]), np.uint64(stream[5]),
+                   np.uint64(stream[0]), np.uint64(stream[1]))
+
+
+@_kernel(inline="always")
+def _counter(stream):
+    """64-bit number of the next block of ``stream``."""
+    return np.uint64(stream[2]) | (np.uint64(stream[3]) << _SHIFT)
+
+
+@_kernel(inline="always")
+def _advance(stream, b):
+    """Make block b the next block of ``stream``."""
+    stream[2] = b & _MASK
+    stream[3] = b >> _SHIFT
+
+
+@_kernel()
+def fill_uniform(stream, out):
+    """Fill ``out`` with uniform [0, 1) doubles, four per block (a partial last block is cut)."""
+    n = len(out)
+    b = _counter(stream)
+    # The key and counter stay in registers; the stream is written back once
+    for i in range(0, n - 3, 4):
+        x0, x1, x2, x3 = _block(stream, b)
+        # Words are below 2**32: the signed conversion is exact and cheaper
+        out[i] = np.int64(x0) * _SCALE
+        out[i + 1] = np.int64(x1) * _SCALE
+        out[i + 2] = np.int64(x2) * _SCALE
+        out[i + 3] = np.int64(x3) * _SCALE
+        b += np.uint64(1)
+    if n % 4:
+        words = _block(stream, b)
+        for w in range(n % 4):
+            out[n - n % 4 + w] = np.int64(words[w]) * _SCALE
+        b += np.uint64(1)
+    _advance(stream, b)
+
+
+@_kernel()
+def fill_raw(stream, out):
+    """Fill uint64 ``out`` with random words, two per block (a partial last block is cut)."""
+    n = len(out)
+    b = _counter(stream)
+    for i in range(0, n - 1, 2):
+        x0, x1, x2, x3 = _block(stream, b)
+        out[i] = (x0 << _SHIFT) | x1
+        out[i + 1] = (x2 << _SHIFT) | x3
+        b += np.uint64(1)
+    if n % 2:
+        x0, x1, x2, x3 = _block(stream, b)
+        out[n - 1] = (x0 << _SHIFT) | x1
+        b += np.uint64(1)
+    _advance(stream, b)
+
+
+@_kernel()
+def buffer(draws):
+    """Empty kernel buffer for about ``draws`` uniforms: at most BUFFER, whole blocks."""
+    return np.empty(min(BUFFER, (draws + 3) // 4 * 4))
+
+
+@_kernel(inline="always")
+def take(stream, buffer, pos):
+    """Next uniform of ``buffer``, refilled from ``stream`` when used up; returns (u, pos)."""
+    if pos == len(buffer):
+        fill_uniform(stream, buffer)
+        pos = 0
+    return buffer[pos], pos + 1
+
+
+@_kernel()
+def raw_buffer(draws):
+    """``buffer`` for uint64 words (``take_raw``)."""
+    return np.empty(min(BUFFER, (draws + 1) // 2 * 2), dtype=np.uint64)
+
+
+@_kernel(inline="always")
+def take_raw(stream, buffer, pos):
+    """``take`` for 64-bit random words from a ``raw_buffer``."""
+    if pos == len(buffer):
+        fill_raw(stream, buffer)
+        pos = 0
+    return buffer[pos], pos + 1
+
+
+# Unbound until jitted, so the first access reaches ``__getattr__``
+for _name in _KERNELS:
+    del globals()[_name]
+
+
+def __getattr__(name):
+    """Jit every kernel when one is first accessed."""
+    if name not in _KERNELS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # Deferred: RandomStream alone should not pay for importing numba
+    from numba import jit
+
+    from ising.numba_cache import install
+
+    install()
+    for kernel, (function, options) in _KERNELS.items():
+        globals()[kernel] = jit(nopython=True, cache=True, **options)(function)
+    return globals()[name]
+
+
+def _fill_uniform_numpy(stream, out):
+    """``fill_uniform`` with each Philox round applied to all blocks at once by NumPy."""
+    n = len(out)
+    b = np.uint64(stream[2]) | (np.uint64(stream[3]) << _SHIFT)
+    blocks = b + np.arange((n + 3) // 4, dtype=np.uint64)
+    c0, c1 = blocks & _MASK, blocks >> _SHIFT
+    c2 = np.full(len(blocks), stream[4], dtype=np.uint64)
+    c3 = np.full(len(blocks), stream[5], dtype=np.uint64)
+    k0, k1 = np.uint64(stream[0]), np.uint64(stream[1])
+    for r in range(10):
+        if r:
+            k0 = (k0 + _W0) & _MASK
+            k1 = (k1 + _W1) & _MASK
+        p0 = _M0 * c0
+        p1 = _M1 * c2
+        c0, c1, c2, c3 = (p1 >> _SHIFT) ^ c1 ^ k0, p1 & _MASK, (p0 >> _SHIFT) ^ c3 ^ k1, p0 & _MASK
+    out[:] = np.stack((c0, c1, c2, c3), axis=1).ravel()[:n] * _SCALE
+    b += np.uint64(len(blocks))
+    stream[2] = b & _MASK
+    stream[3] = b >> _SHIFT
+
+
+class RandomStream:
+    """Uniforms from one stream for pure-Python code, refilled in bulk."""
+
+    def __init__(self, seed=None, point=(), replica=0, size=4096):
+        self.stream = new_stream(seed, point, replica)
+        self._origin = self.stream.copy()
+        self._buffer = np.empty(size)
+        self._refill()
+
+    def _refill(self):
+        self._origin[:] = self.stream
+        _fill_uniform_numpy(self.stream, self._buffer)
+        self._pos = 0
+
+    def uniform(self, n=None):
+        """One uniform [0, 1) float, or an array of ``n``."""
+        if n is None:
+            if self._pos == len(self._buffer):
+                self._refill()
+            self._pos += 1
+            return float(self._buffer[self._pos - 1])
+        out = np.empty(n)
+        filled = 0
+        while filled < n:
+            if self._pos == len(self._buffer):
+                self._refill()
+            k = min(n - filled, len(self._buffer) - self._pos)
+            out[filled:filled + k] = self._buffer[self._pos:self._pos + k]
+            self._pos += k
+            filled += k
+        return out
+
+    def get_state(self):
+        """(stream at the last refill, position in the buffer)."""
+        return self._origin.copy(), self._pos
+
+    def set_state(self, origin, position):
+        """Resume from a ``get_state()``; the buffer is regenerated from ``origin``."""
+        self.stream[:] = origin
+        self._refill()
+        self._pos = int(position)
+
+
+_default = (None, None)
+
+
+def default_stream():
+    """
+    Unseeded process-wide ``RandomStream`` for callers that pass none;
+    a forked child gets its own instead of repeating its parent's numbers.
+    """
+    global _default
+    pid, stream = _default
+    if pid != os.getpid():
+        _default = pid, stream = os.getpid(), RandomStream()
+    return stream
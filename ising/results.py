@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar, appendable results store shared by all simulators and plotters.
+
+A store is a directory with ``schema.json`` (column names, dtypes and
+free-form metadata such as run parameters) and one raw little-endian
+``<column>.bin`` file per column. Simulators append a row per finished
+(field, omega, T, replica) point, so partial sweeps are on disk as they
+progress; readers memory-map only the columns they need.
+
+Points run with ``histogram_width`` also carry an energy histogram
+(``ising.reweighting``), which does not fit a fixed-width column: those go
+one JSON line per point to ``histograms.jsonl`` in the same directory.
+"""
+
+# results.py
+import json
+import os
+
+import numpy as np
+
+POINT_COLUMNS = {"field": "<f8", "omega": "<f8", "T": "<f8", "replica": "<i4"}
+
+
+class ResultsStore:
+    """Typed columns in one directory; rows are appended, columns memory-mapped."""
+
+    SCHEMA_FILE = "schema.json"
+    HISTOGRAM_FILE = "histograms.jsonl"
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, self.SCHEMA_FILE), "r") as f:
+            schema = json.load(f)
+        self.columns = {name: np.dtype(dtype) for name, dtype in schema["columns"]}
+        self.metadata = schema["metadata"]
+        self._repair()
+
+    @classmethod
+    def create(cls, path, columns, metadata=None):
+        """Start an empty store at ``path``, replacing any previous one."""
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.endswith(".bin") or name in (cls.SCHEMA_FILE, cls.HISTOGRAM_FILE):
+                os.remove(os.path.join(path, name))
+        schema = {"columns": [[name, np.dtype(dtype).str] for name, dtype in columns.items()],
+                  "metadata": metadata or {}}
+        with open(os.path.join(path, cls.SCHEMA_FILE), "w") as f:
+            json.dump(schema, f, indent=1)
+        for name in columns:
+            open(os.path.join(path, f"{name}.bin"), "wb").close()
+        return cls(path)
+
+    def _column_file(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _lengths(self):
+        return [os.path.getsize(self._column_file(name)) // dtype.itemsize
+                for name, dtype in self.columns.items()]
+
+    def _repair(self):
+        """Cut every column back to the shortest one (an append interrupted mid-row)."""
+        lengths = self._lengths()
+        if lengths and min(lengths) != max(lengths):
+            self.truncate(min(lengths))
+
+    def __len__(self):
+        lengths = self._lengths()
+        return min(lengths) if lengths else 0
+
+    def append(self, **row):
+        """Append one row; every column must be given."""
+        self.append_rows(**{name: [value] for name, value in row.items()})
+
+    def append_rows(self, **columns):
+        """Append equal-length arrays, one per column."""
+        missing = set(self.columns) - set(columns)
+        if missing:
+            raise ValueError(f"missing columns: {sorted(missing)}")
+        for name, dtype in self.columns.items():
+            with open(self._column_file(name), "ab") as f:
+                f.write(np.asarray(columns[name], dtype=dtype).tobytes())
+
+    def append_histogram(self, histogram, **point):
+        """Append one point's histogram (``EnergyHistogram.to_dict``) with the values identifying it."""
+        record = {name: value.item() if isinstance(value, np.generic) else value
+                  for name, value in point.items()}
+        record["histogram"] = histogram
+        with open(os.path.join(self.path, self.HISTOGRAM_FILE), "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def read_histograms(self):
+        """Every appended histogram record, in order; a line cut short by an interrupted append is skipped."""
+        records = []
+        try:
+            with open(os.path.join(self.path, self.HISTOGRAM_FILE), "r") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        pass
+        except FileNotFoundError:
+            pass
+        return records
+
+    def truncate(self, n_rows):
+        """Drop every row from ``n_rows`` on."""
+        for name, dtype in self.columns.items():
+            with open(self._column_file(name), "r+b") as f:
+                f.truncate(n_rows * dtype.itemsize)
+
+    def update_metadata(self, **metadata):
+        """Merge entries into the stored metadata."""
+        self.metadata.update(metadata)
+        schema = {"columns": [[name, dtype.str] for name, dtype in self.columns.items()],
+                  "metadata": self.metadata}
+        with open(os.path.join(self.path, self.SCHEMA_FILE), "w") as f:
+            json.dump(schema, f, indent=1)
+
+    def read(self, *names):
+        """Read-only memory maps of the requested columns, as a dict."""
+        n_rows = len(self)
+        result = {}
+        for name in names:
+            dtype = self.columns[name]
+            if n_rows == 0:
+                result[name] = np.zeros(0, dtype=dtype)
+            else:
+                result[name] = np.memmap(self._column_file(name), dtype=dtype, mode="r", shape=(n_rows,))
+        return result
+
+
+def pivot(rows, cols, values):
+    """
+    Group ``values`` by the unique (row, col) key pairs.
+
+    Returns (row_keys, col_keys, mean, std) with mean/std of shape
+    (len(row_keys), len(col_keys)); empty cells are NaN.
+    """
+    row_keys, row_idx = np.unique(rows, return_inverse=True)
+    col_keys, col_idx = np.unique(cols, return_inverse=True)
+    shape = (len(row_keys), len(col_keys))
+    count = np.zeros(shape)
+    total = np.zeros(shape)
+    total_sq = np.zeros(shape)
+    values = np.asarray(values, dtype=float)
+    np.add.at(count, (row_idx, col_idx), 1)
+    np.add.at(total, (row_idx, col_idx), values)
+    np.add.at(total_sq, (row_idx, col_idx), values ** 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        std = np.sqrt(np.maximum(total_sq / count - mean ** 2, 0.0))
+    return row_keys, col_keys, mean, std
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Energy histograms and Ferrenberg-Swendsen reweighting.
+
+A run at inverse temperature beta_0 samples states with weight
+exp(-beta_0 E), so reweighting its energy histogram by
+exp(-(beta - beta_0) E) gives canonical averages at any nearby beta
+(single histogram). The multiple-histogram method combines runs at
+several temperatures: it solves self-consistently for the density of
+states and the free energy of every run, each run weighted by its
+effective sample count n / (2 tau_int), and so covers the whole span
+between the simulated temperatures with continuous curves.
+
+``EnergyHistogram`` bins the measured E in bins of ``width`` and keeps,
+per bin, the count, the sums of E - centre and (E - centre)**2 (exact
+energy moments without cancellation), and the sums of |M| and M**2, so
+the magnetization curves come from the same bins without a joint (E, M)
+histogram. ``reweight`` turns the histograms of a set of runs into E, |M|,
+specific heat and susceptibility curves in the units of
+``ThermoAccumulator.summary``, with jackknife errors over the replicas.
+
+Reweighting assumes every run samples the Boltzmann distribution of one
+fixed Hamiltonian. That holds in a static field (omega = 0, with E
+including the -H M term), not for the driven runs, whose histograms are
+recorded but should not be reweighted.
+"""
+
+# reweighting.py
+from collections import defaultdict
+
+import numpy as np
+
+FIELDS = ("count", "energy", "energy_sq", "abs_magnetization", "magnetization_sq")
+
+
+class EnergyHistogram:
+    """Per-bin count and sums of E, E^2, |M|, M^2 over bins of ``width`` in E."""
+
+    def __init__(self, width=1.0):
+        self.width = float(width)
+        self.offset = 0
+        self.sums = np.zeros((len(FIELDS), 0))
+
+    @property
+    def count(self):
+        return int(self.sums[0].sum())
+
+    def centres(self):
+        """Energy at the centre of every bin."""
+        return (self.offset + np.arange(self.sums.shape[1])) * self.width
+
+    def _cover(self, low, high):
+        """Grow the bins to span bin indices low .. high."""
+        if not self.sums.shape[1]:
+            self.offset = low
+            self.sums = np.zeros((len(FIELDS), high - low + 1))
+            return
+        start = min(low, self.offset)
+        stop = max(high, self.offset + self.sums.shape[1] - 1)
+        if start == self.offset and stop == self.offset + self.sums.shape[1] - 1:
+            return
+        sums = np.zeros((len(FIELDS), stop - start + 1))
+        sums[:, self.offset - start:self.offset - start + self.sums.shape[1]] = self.sums
+        self.offset, self.sums = start, sums
+
+    def extend(self, E, M):
+        """Add measurements of total energy and signed magnetization."""
+        E = np.asarray(E, dtype=float)
+        M = np.asarray(M, dtype=float)
+        if not len(E):
+            return
+        bins = np.rint(E / self.width).astype(np.int64)
+        self._cover(int(bins.min()), int(bins.max()))
+        deviation = E - bins * self.width
+        index = bins - self.offset
+        for k, values in enumerate((np.ones(len(E)), deviation, deviation ** 2, np.abs(M), M * M)):
+            self.sums[k] += np.bincount(index, weights=values, minlength=self.sums.shape[1])
+
+    def add(self, other):
+        """Merge the counts of ``other`` (same width) into this histogram."""
+        if other.width != self.width:
+            raise ValueError(f"histogram widths differ: {self.width} and {other.width}")
+        if not other.sums.shape[1]:
+            return
+        self._cover(other.offset, other.offset + other.sums.shape[1] - 1)
+        start = other.offset - self.offset
+        self.sums[:, start:start + other.sums.shape[1]] += other.sums
+
+    def to_dict(self):
+        """JSON-serializable form (for summaries, caches and stores)."""
+        return dict(width=self.width, offset=int(self.offset),
+                    **{name: self.sums[k].tolist() for k, name in enumerate(FIELDS)})
+
+    @classmethod
+    def from_dict(cls, state):
+        """Inverse of ``to_dict``."""
+        histogram = cls(state["width"])
+        histogram.offset = int(state["offset"])
+        histogram.sums = np.array([state[name] for name in FIELDS], dtype=float).reshape(len(FIELDS), -1)
+        return histogram
+
+
+def _logsumexp(x, axis):
+    peak = np.max(x, axis=axis, keepdims=True)
+    peak[~np.isfinite(peak)] = 0.0
+    return np.log(np.sum(np.exp(x - peak), axis=axis)) + np.squeeze(peak, axis=axis)
+
+
+def _pooled(histograms):
+    """One histogram spanning all of ``histograms`` plus their counts on its bins, (K, B)."""
+    total = EnergyHistogram(histograms[0].width)
+    for histogram in histograms:
+        total.add(histogram)
+    counts = np.zeros((len(histograms), total.sums.shape[1]))
+    for k, histogram in enumerate(histograms):
+        start = histogram.offset - total.offset
+        counts[k, start:start + histogram.sums.shape[1]] = histogram.sums[0]
+    return total, counts
+
+
+def free_energies(histograms, betas, taus=None, tol=1e-10, max_iterations=100000):
+    """
+    Multiple-histogram solve for the runs ``histograms`` at ``betas``:
+    returns (pooled histogram, its bin energies, log density of states per
+    bin) with -inf for empty bins. ``taus`` are the runs' tau_int of E
+    (0.5, uncorrelated, if None).
+    """
+    betas = np.asarray(betas, dtype=float)
+    taus = np.full(len(betas), 0.5) if taus is None else np.asarray(taus, dtype=float)
+    inefficiency = 2 * np.maximum(taus, 0.5)
+    total, counts = _pooled(histograms)
+    occupied = total.sums[0] > 0
+    energies = total.centres()
+    energies[occupied] += total.sums[1, occupied] / total.sums[0, occupied]
+    with np.errstate(divide="ignore"):
+        log_numerator = np.log((counts / inefficiency[:, None]).sum(axis=0))
+        log_samples = np.log(counts.sum(axis=1) / inefficiency)
+    # f[k] = -ln Z_k, fixed to 0 for the first run
+    f = np.zeros(len(betas))
+    for _ in range(max_iterations):
+        log_denominator = _logsumexp(log_samples[:, None] - betas[:, None] * energies[occupied]
+                                     + f[:, None], axis=0)
+        log_dos = log_numerator[occupied] - log_denominator
+        f_new = -_logsumexp(log_dos[None, :] - betas[:, None] * energies[occupied], axis=1)
+        f_new -= f_new[0]
+        converged = np.max(np.abs(f_new - f)) < tol
+        f = f_new
+        if converged:
+            break
+    log_g = np.full(len(energies), -np.inf)
+    log_g[occupied] = log_dos
+    return total, energies, log_g
+
+
+def reweighted_averages(histograms, betas, target_betas, n_sites, taus=None):
+    """
+    Canonical E and |M| (lattice totals), specific heat and susceptibility
+    per site at every ``target_betas`` from the runs ``histograms`` at ``betas``; a single
+    run gives single-histogram reweighting.
+    """
+    total, energies, log_g = free_energies(histograms, betas, taus)
+    occupied = np.isfinite(log_g)
+    sums = total.sums[:, occupied]
+    centres, energies = total.centres()[occupied], energies[occupied]
+    target_betas = np.atleast_1d(np.asarray(target_betas, dtype=float))
+    log_weights = log_g[occupied][None, :] - target_betas[:, None] * energies[None, :]
+    weights = np.exp(log_weights - log_weights.max(axis=1, keepdims=True))
+    weights /= weights.sum(axis=1, keepdims=True)
+    # Per-bin means; var(E) about the reweighted mean from the exact in-bin moments
+    shift, shift_sq, abs_m, m_sq = sums[1:] / sums[0]
+    E = weights @ (centres + shift)
+    offset = centres[None, :] - E[:, None]
+    var_E = (weights * (offset ** 2 + 2 * offset * shift + shift_sq)).sum(axis=1)
+    abs_M = weights @ abs_m
+    M2 = weights @ m_sq
+    return {"energy": E, "abs_magnetization": abs_M,
+            "specific_heat": target_betas ** 2 * var_E / n_sites,
+            "susceptibility": target_betas * (M2 - abs_M ** 2) / n_sites}
+
+
+def reweight(histograms, T_runs, T_values, n_sites, taus=None):
+    """
+    Curves at ``T_values`` from the (len(T_runs), replicas) nested
+    ``histograms`` (``EnergyHistogram`` or ``to_dict`` form; None, e.g. at
+    T = 0, is skipped). The replicas of each T are pooled; every entry gets
+    a ``_err`` from the jackknife over replicas (0 with one replica).
+    ``taus`` are the matching energy_tau values.
+    """
+    runs = defaultdict(list)
+    for t, row in enumerate(histograms):
+        for m, histogram in enumerate(row):
+            if histogram is None or T_runs[t] <= 0:
+                continue
+            if isinstance(histogram, dict):
+                histogram = EnergyHistogram.from_dict(histogram)
+            runs[float(T_runs[t])].append((m, histogram, 0.5 if taus is None else taus[t][m]))
+    if not runs:
+        raise ValueError("no histograms at T > 0 to reweight")
+    temperatures = sorted(runs)
+    replicas = sorted({m for T in temperatures for m, _, _ in runs[T]})
+    target_betas = 1 / np.asarray(T_values, dtype=float)
+
+    def curves(exclude=None):
+        pooled, betas, run_taus = [], [], []
+        for T in temperatures:
+            kept = [(histogram, tau) for m, histogram, tau in runs[T] if m != exclude]
+            if not kept:
+                continue
+            histogram = EnergyHistogram(kept[0][0].width)
+            for part, _ in kept:
+                histogram.add(part)
+            pooled.append(histogram)
+            betas.append(1 / T)
+            run_taus.append(np.mean([tau for _, tau in kept]))
+        return reweighted_averages(pooled, betas, target_betas, n_sites, run_taus)
+
+    result = curves()
+    if len(replicas) > 1:
+        estimates = [curves(m) for m in replicas]
+        n = len(replicas)
+        for name in list(result):
+            values = np.array([estimate[name] for estimate in estimates])
+            result[f"{name}_err"] = np.sqrt((n - 1) * np.mean((values - values.mean(axis=0)) ** 2, axis=0))
+    else:
+        for name in list(result):
+            result[f"{name}_err"] = np.zeros(len(target_betas))
+    return result
+
+
+def store_curves(store, omega, T_values):
+    """
+    ``reweight`` of the histograms a ``ResultsStore`` holds for
+    frequency ``omega`` (only meaningful for omega = 0), or None if it has
+    none.
+    """
+    records = [record for record in store.read_histograms() if record["omega"] == omega]
+    if not records:
+        return None
+    T_runs = sorted({record["T"] for record in records})
+    replicas = sorted({record["replica"] for record in records})
+    histograms = [[None] * len(replicas) for _ in T_runs]
+    taus = [[0.5] * len(replicas) for _ in T_runs]
+    for record in records:
+        t, m = T_runs.index(record["T"]), replicas.index(record["replica"])
+        histograms[t][m] = record["histogram"]
+        taus[t][m] = record.get("energy_tau", 0.5)
+    N = store.metadata["parameters"]["N"]
+    return reweight(histograms, T_runs, T_values, N * N, taus)
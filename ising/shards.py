@@ -0,0 +1,421 @@
+# -*- coding: utf-8 -*-
+"""
+Sharded (field, omega, T, N) sweeps over several machines through a work
+queue on a shared filesystem; no scheduler or server is involved.
+
+A JSON config describes the grid (see ``load_config``). ``init`` splits it
+into shard manifests, each one (field, N, omega) and a run of temperatures
+with all replicas, under ``<queue>/shards``. Any number of ``work``
+processes, on any machine that sees the directory, then loop:
+
+* claim a pending shard by creating ``<queue>/claims/<id>.lock`` with
+  O_CREAT | O_EXCL, which succeeds for exactly one process, and write the
+  worker's unique owner token into it,
+* keep the claim alive by touching the lock from a heartbeat thread,
+* run the shard through ``run_grid`` and write ``<queue>/results/<id>.json``
+  atomically (temporary file + rename), then drop the lock.
+
+A lock not touched for ``stale_after`` seconds (a crashed or killed
+worker) is renamed away, again atomic, so one process wins, and the shard
+is pending again. A worker only ever removes or refreshes the lock it
+judged: a lock is removed by renaming it to a private name and checking
+what was moved (owner token and modification time), and put back with
+``os.link`` (which never replaces a newer lock) if it turns out to be
+another worker's; heartbeats touch the lock through a handle whose owner
+was checked. The one remaining race, a third worker claiming in the
+moment a wrongly moved lock is away, leaves the displaced worker running
+without a lock; its heartbeat notices and stops, and since its rows are
+identical the duplicate only costs time. Point streams derive from the config seed and the point's
+(N, field, omega, T, replica), so a shard that ends up run twice produces
+the same rows. ``merge`` collects the finished shards into a
+``ResultsStore``.
+
+    python -m ising.shards init sweep_config.json queue/
+    python -m ising.shards work queue/            # on every node, as often as wanted
+    python -m ising.shards status queue/
+    python -m ising.shards merge queue/ ising_magnetization_data.store --N 50 --field 0.1
+"""
+
+# shards.py
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from ising.dynamics import DYNAMIC_KEYS
+from ising.instrument import Instrumentation
+from ising.results import POINT_COLUMNS, ResultsStore
+from ising.stats import SUMMARY_KEYS
+from ising.sweep import (energy_point, energy_replicas, ground_state, magnetization_point,
+                         magnetization_replicas, run_grid)
+
+POINTS = {
+    "energy": (energy_point, energy_replicas),
+    "magnetization": (magnetization_point, magnetization_replicas),
+}
+
+DEFAULTS = {
+    "observable": "energy",
+    "fields": [0.1],
+    "omegas": [0.0],
+    "sizes": [50],
+    "replicas": 5,
+    "seed": None,
+    "temperatures_per_shard": 4,
+    "batch_replicas": True,
+    "warm_start": None,
+    "parameters": {},
+}
+
+SHARD_COLUMNS = dict(POINT_COLUMNS, N="<i4")
+
+
+def load_config(path):
+    """
+    Grid config with defaults filled in. ``temperatures`` is a list of
+    values or {"linspace": [[start, stop, num], ...]} (merged and sorted);
+    ``parameters`` are passed to the point functions (J, thermalization,
+    measure_steps, min_thermalization, cluster_range).
+    """
+    with open(path, "r") as f:
+        config = dict(DEFAULTS, **json.load(f))
+    if config["observable"] not in POINTS:
+        raise ValueError(f"unknown observable {config['observable']!r}")
+    temperatures = config["temperatures"]
+    if isinstance(temperatures, dict):
+        temperatures = np.concatenate([np.linspace(*segment) for segment in temperatures["linspace"]])
+    config["temperatures"] = np.unique(np.asarray(temperatures, dtype=float)).tolist()
+    return config
+
+
+def make_shards(config):
+    """Shard manifests: per (field, N, omega), the temperatures in runs of
+    ``temperatures_per_shard`` (all of them in one shard with a warm start)."""
+    T_range = config["temperatures"]
+    per_shard = len(T_range) if config["warm_start"] else config["temperatures_per_shard"]
+    shards = []
+    for field in config["fields"]:
+        for N in config["sizes"]:
+            for omega in config["omegas"]:
+                for start in range(0, len(T_range), per_shard):
+                    shards.append({"id": f"shard-{len(shards):05d}", "field": field, "N": N,
+                                   "omega": omega, "temperatures": T_range[start:start + per_shard]})
+    return shards
+
+
+def group_seed(seed, N, field):
+    """Base seed for the points of one (N, field); ``run_grid`` adds (omega, T, replica)."""
+    key = [int(seed), int(N), int(np.float64(field).view(np.uint64))]
+    return int(np.random.SeedSequence(key).generate_state(1)[0])
+
+
+def run_shard(shard, config, workers=1, instrument=None):
+    """Rows (dicts of ``SHARD_COLUMNS`` plus the summary) of every point in ``shard``."""
+    rows = []
+
+    def collect(omega, T, replica, summary):
+        rows.append(dict(summary, field=shard["field"], N=shard["N"], omega=float(omega),
+                         T=float(T), replica=replica))
+
+    point = POINTS[config["observable"]][1 if config["batch_replicas"] else 0]
+    run_grid(point, [shard["omega"]], np.array(shard["temperatures"]), config["replicas"],
+             workers=workers, seed=group_seed(config["seed"], shard["N"], shard["field"]),
+             on_result=collect, batch_replicas=config["batch_replicas"],
+             warm_start=config["warm_start"], instrument=instrument,
+             N=shard["N"], H_amp=shard["field"], **config["parameters"])
+    return rows
+
+
+class WorkQueue:
+    """Shard manifests, claim locks and results under one shared directory."""
+
+    def __init__(self, path, stale_after=600.0, heartbeat=30.0):
+        self.path = path
+        self.stale_after = stale_after
+        self.heartbeat = heartbeat
+        # Written into every lock this instance takes; identifies its claims
+        self.token = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex}"
+        with open(os.path.join(path, "config.json"), "r") as f:
+            self.config = json.load(f)
+
+    @classmethod
+    def create(cls, path, config):
+        """Write ``config`` (with a seed drawn if it has none) and its shard manifests."""
+        for name in ("shards", "claims", "results"):
+            os.makedirs(os.path.join(path, name), exist_ok=True)
+        if os.listdir(os.path.join(path, "shards")):
+            raise FileExistsError(f"{path} already holds a queue")
+        if config["seed"] is None:
+            config = dict(config, seed=int(np.random.SeedSequence().generate_state(1)[0]))
+        for shard in make_shards(config):
+            _write_json(os.path.join(path, "shards", f"{shard['id']}.json"), shard)
+        _write_json(os.path.join(path, "config.json"), config)
+        return cls(path)
+
+    def _file(self, kind, shard_id):
+        extension = {"shards": "json", "claims": "lock", "results": "json"}[kind]
+        return os.path.join(self.path, kind, f"{shard_id}.{extension}")
+
+    def shard_ids(self):
+        return sorted(name[:-len(".json")] for name in os.listdir(os.path.join(self.path, "shards")))
+
+    def shard(self, shard_id):
+        with open(self._file("shards", shard_id), "r") as f:
+            return json.load(f)
+
+    def done(self, shard_id):
+        return os.path.exists(self._file("results", shard_id))
+
+    @staticmethod
+    def _read_lock(f):
+        """(owner token, modification time) of an open lock; the owner is None while it is written."""
+        mtime = os.fstat(f.fileno()).st_mtime
+        try:
+            owner = json.loads(f.read())["owner"]
+        except (ValueError, KeyError, TypeError):
+            owner = None
+        return owner, mtime
+
+    def _claim_of(self, shard_id, path=None):
+        """(owner, mtime) of the lock on ``shard_id`` (or at ``path``), or None if unclaimed."""
+        try:
+            with open(path or self._file("claims", shard_id), "r") as f:
+                return self._read_lock(f)
+        except FileNotFoundError:
+            return None
+
+    def _lock_age(self, shard_id):
+        """Seconds since the claim on ``shard_id`` was last touched, or None if unclaimed."""
+        claim = self._claim_of(shard_id)
+        return None if claim is None else time.time() - claim[1]
+
+    def owns(self, shard_id):
+        """Whether this instance holds the claim on ``shard_id``."""
+        claim = self._claim_of(shard_id)
+        return claim is not None and claim[0] == self.token
+
+    def status(self):
+        """Shard ids by state: "done", "claimed", "stale" and "pending"."""
+        states = {"done": [], "claimed": [], "stale": [], "pending": []}
+        for shard_id in self.shard_ids():
+            age = self._lock_age(shard_id)
+            if self.done(shard_id):
+                states["done"].append(shard_id)
+            elif age is None:
+                states["pending"].append(shard_id)
+            else:
+                states["stale" if age > self.stale_after else "claimed"].append(shard_id)
+        return states
+
+    def claim(self, shard_id):
+        """Take ``shard_id`` for this process; False if it is done or held by another."""
+        if self.done(shard_id):
+            return False
+        claim = self._claim_of(shard_id)
+        if claim is not None and time.time() - claim[1] > self.stale_after:
+            self._requeue(shard_id, claim)
+        try:
+            fd = os.open(self._file("claims", shard_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            json.dump({"owner": self.token, "host": socket.gethostname(), "pid": os.getpid(),
+                       "claimed": time.time()}, f)
+        # Finished between the done() check and the claim
+        if self.done(shard_id):
+            self.release(shard_id)
+            return False
+        return True
+
+    def _remove_lock(self, shard_id, expected):
+        """
+        Remove the lock on ``shard_id`` if ``expected(owner, mtime)`` holds
+        for it. The lock is first renamed to a private name, so the check
+        sees exactly the file that was taken; a lock that fails it (claimed
+        or touched since it was judged) is linked back, unless a newer claim
+        already took its place. Returns whether a matching lock was removed.
+        """
+        lock = self._file("claims", shard_id)
+        moved = f"{lock}.removed-{self.token}"
+        try:
+            os.rename(lock, moved)
+        except FileNotFoundError:
+            return False
+        claim = self._claim_of(shard_id, moved)
+        matches = claim is not None and expected(*claim)
+        if not matches:
+            try:
+                os.link(moved, lock)
+            except FileExistsError:
+                pass
+        os.remove(moved)
+        return matches
+
+    def _requeue(self, shard_id, claim):
+        """Remove the stale lock last seen as ``claim`` (owner, mtime), and no other."""
+        return self._remove_lock(shard_id, lambda owner, mtime: (owner, mtime) == tuple(claim))
+
+    def release(self, shard_id):
+        """Drop this instance's claim; another worker's lock is left alone."""
+        return self._remove_lock(shard_id, lambda owner, mtime: owner == self.token)
+
+    def _touch(self, shard_id):
+        """Refresh this instance's lock on ``shard_id``; False if the lock is gone or another's."""
+        try:
+            with open(self._file("claims", shard_id), "r") as f:
+                if self._read_lock(f)[0] != self.token:
+                    return False
+                # Touch the file whose owner was read, not whatever the path holds now
+                os.utime(f.fileno() if os.utime in os.supports_fd else self._file("claims", shard_id))
+                return True
+        except FileNotFoundError:
+            return False
+
+    def _keep_alive(self, shard_id, stop):
+        while not stop.wait(self.heartbeat):
+            if not self._touch(shard_id):
+                return
+
+    def complete(self, shard_id, rows, instrument=None):
+        """Store the rows of a finished shard and release it."""
+        _write_json(self._file("results", shard_id), {
+            "shard": self.shard(shard_id), "rows": rows, "host": socket.gethostname(),
+            "instrumentation": instrument.summary() if instrument is not None else None})
+        self.release(shard_id)
+
+    def work(self, workers=1, max_shards=None, wait=False, poll=None):
+        """
+        Claim and run shards until none is pending (``max_shards`` at
+        most). With ``wait``, keep polling every ``poll`` seconds while
+        other workers hold claims, to pick up any that go stale.
+        Returns the ids run here.
+        """
+        poll = poll or self.heartbeat
+        order = random.Random(f"{socket.gethostname()}-{os.getpid()}")
+        finished = []
+        while max_shards is None or len(finished) < max_shards:
+            states = self.status()
+            candidates = states["pending"] + states["stale"]
+            # Spread concurrent workers over different shards
+            order.shuffle(candidates)
+            shard_id = next((s for s in candidates if self.claim(s)), None)
+            if shard_id is None:
+                if wait and states["claimed"]:
+                    time.sleep(poll)
+                    continue
+                break
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=self._keep_alive, args=(shard_id, stop), daemon=True)
+            heartbeat.start()
+            try:
+                instrument = Instrumentation()
+                rows = run_shard(self.shard(shard_id), self.config, workers, instrument)
+                self.complete(shard_id, rows, instrument)
+            except BaseException:
+                self.release(shard_id)
+                raise
+            finally:
+                stop.set()
+                heartbeat.join()
+            finished.append(shard_id)
+        return finished
+
+    def results(self):
+        """Contents of every finished shard's result file."""
+        for shard_id in self.shard_ids():
+            if self.done(shard_id):
+                with open(self._file("results", shard_id), "r") as f:
+                    yield json.load(f)
+
+    def merge(self, store_path, N=None, field=None):
+        """
+        Write the rows of all finished shards (only size N / only ``field``,
+        if given) to a new ``ResultsStore``. With a single N and field the
+        store gets the simulators' ground-state metadata, so their plotters
+        read it directly. Points run with ``histogram_width`` (in the
+        config parameters) also get their histograms written to the store.
+        Returns the number of rows.
+        """
+        keys = SUMMARY_KEYS + DYNAMIC_KEYS
+        rows = [row for result in self.results() for row in result["rows"]
+                if (N is None or row["N"] == N) and (field is None or row["field"] == field)]
+        metadata = {"config": self.config,
+                    "shards": {state: len(ids) for state, ids in self.status().items()}}
+        sizes = {row["N"] for row in rows}
+        fields = {row["field"] for row in rows}
+        if len(sizes) == 1 and len(fields) == 1:
+            (N,), (field,) = sizes, fields
+            J = self.config["parameters"].get("J", 1.0)
+            static = ground_state(0.0, N, J, field)
+            metadata.update(ground_state_energy=static["energy"],
+                            ground_state_magnetization=static["magnetization"],
+                            parameters={"N": N, "J": J, "H_amp": field, "Tc": 2.269185})
+        store = ResultsStore.create(store_path, dict(SHARD_COLUMNS, **{key: "<f8" for key in keys}),
+                                    metadata)
+        store.append_rows(**{name: [row[name] for row in rows] for name in list(SHARD_COLUMNS) + list(keys)})
+        for row in rows:
+            if "histogram" in row:
+                store.append_histogram(row["histogram"], **{name: row[name] for name in SHARD_COLUMNS},
+                                       energy_tau=row["energy_tau"])
+        return len(rows)
+
+
+def _write_json(path, content):
+    """Write ``content`` to ``path`` atomically: readers see the old file or the new one."""
+    tmp = f"{path}.tmp-{socket.gethostname()}-{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(content, f)
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    init = commands.add_parser("init", help="split a grid config into shards")
+    init.add_argument("config")
+    init.add_argument("queue")
+    work = commands.add_parser("work", help="claim and run shards")
+    work.add_argument("queue")
+    work.add_argument("--workers", type=int, default=1, help="processes per shard (run_grid)")
+    work.add_argument("--max-shards", type=int)
+    work.add_argument("--wait", action="store_true", help="poll until every shard is done")
+    status = commands.add_parser("status", help="count shards by state")
+    status.add_argument("queue")
+    merge = commands.add_parser("merge", help="collect finished shards into a results store")
+    merge.add_argument("queue")
+    merge.add_argument("store")
+    merge.add_argument("--N", type=int)
+    merge.add_argument("--field", type=float)
+    for command in (work, status, merge):
+        command.add_argument("--stale-after", type=float, default=600.0,
+                             help="seconds without a heartbeat before a claim is requeued")
+    args = parser.parse_args(argv)
+
+    if args.command == "init":
+        queue = WorkQueue.create(args.queue, load_config(args.config))
+        print(f"{len(queue.shard_ids())} shards written to {args.queue}")
+        return 0
+    queue = WorkQueue(args.queue, stale_after=args.stale_after)
+    if args.command == "work":
+        finished = queue.work(args.workers, args.max_shards, args.wait)
+        print(f"Ran {len(finished)} shards")
+    elif args.command == "status":
+        for state, ids in queue.status().items():
+            print(f"{state:>8}: {len(ids)}")
+    else:
+        missing = len(queue.shard_ids()) - len(queue.status()["done"])
+        n_rows = queue.merge(args.store, args.N, args.field)
+        print(f"Merged {n_rows} rows into {args.store}"
+              + (f" ({missing} shards not finished)" if missing else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
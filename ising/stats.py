@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming statistics for correlated Monte Carlo time series.
+
+``StreamingObservable`` keeps Welford moments of the raw series and of its
+bin averages at bin sizes 1, 2, 4, ... (logarithmic binning), holding one
+pending value and one (count, mean, M2) triple per level, so memory grows
+as O(log n). The standard error of the mean at level k, err_k, rises with
+k until bins are longer than the autocorrelation time; the plateau gives
+the honest error and tau_int = err_k**2 / (2 * err_0**2).
+
+``ThermoAccumulator`` tracks E, M, |M|, E**2 and M**2 per sample and
+derives the specific heat and susceptibility, with block-jackknife errors
+from a fixed number of blocks whose size doubles as the run grows.
+"""
+
+# stats.py
+import numpy as np
+
+
+class StreamingObservable:
+    """Running mean and variance with logarithmic binning analysis."""
+
+    MAX_LEVELS = 64
+    STATE_SIZE = 1 + 4 * MAX_LEVELS
+
+    def __init__(self, min_bins=32):
+        self.min_bins = min_bins
+        self._count = []
+        self._mean = []
+        self._m2 = []
+        self._pending = []
+
+    def add(self, x):
+        """Add one sample."""
+        x = float(x)
+        level = 0
+        while True:
+            if level == len(self._count):
+                self._count.append(0)
+                self._mean.append(0.0)
+                self._m2.append(0.0)
+                self._pending.append(None)
+            self._count[level] += 1
+            delta = x - self._mean[level]
+            self._mean[level] += delta / self._count[level]
+            self._m2[level] += delta * (x - self._mean[level])
+            if self._pending[level] is None:
+                self._pending[level] = x
+                return
+            x = 0.5 * (self._pending[level] + x)
+            self._pending[level] = None
+            level += 1
+
+    def extend(self, values):
+        """
+        Add samples in order: each binning level merges the new values in
+        one vectorized (Chan et al.) update, then pairs them, after any
+        pending value, into the next level's input. Equal to calling
+        ``add`` per value up to rounding.
+        """
+        values = np.asarray(values, dtype=float)
+        level = 0
+        while len(values):
+            if level == len(self._count):
+                self._count.append(0)
+                self._mean.append(0.0)
+                self._m2.append(0.0)
+                self._pending.append(None)
+            n_old, n_new = self._count[level], len(values)
+            count = n_old + n_new
+            mean = values.mean()
+            delta = mean - self._mean[level]
+            self._m2[level] += ((values - mean) ** 2).sum() + delta * delta * n_old * n_new / count
+            self._mean[level] += delta * n_new / count
+            self._count[level] = count
+            if self._pending[level] is not None:
+                values = np.concatenate(([self._pending[level]], values))
+            pairs = len(values) // 2
+            self._pending[level] = float(values[-1]) if len(values) % 2 else None
+            values = 0.5 * (values[0:2 * pairs:2] + values[1:2 * pairs:2])
+            level += 1
+
+    @property
+    def count(self):
+        return self._count[0] if self._count else 0
+
+    @property
+    def mean(self):
+        return self._mean[0] if self._count else np.nan
+
+    @property
+    def variance(self):
+        n = self.count
+        return self._m2[0] / (n - 1) if n > 1 else 0.0
+
+    def level_errors(self):
+        """Naive standard error of the mean at every binning level with two or more bins."""
+        return [np.sqrt(self._m2[k] / (n - 1) / n)
+                for k, n in enumerate(self._count) if n > 1]
+
+    def _plateau_level(self):
+        """Highest binning level that still has ``min_bins`` bins."""
+        levels = [k for k, n in enumerate(self._count) if n >= self.min_bins]
+        return levels[-1] if levels else 0
+
+    @property
+    def error(self):
+        """Standard error of the mean from the binning plateau."""
+        errors = self.level_errors()
+        if not errors:
+            return 0.0
+        return errors[min(self._plateau_level(), len(errors) - 1)]
+
+    @property
+    def tau_int(self):
+        """Integrated autocorrelation time in samples (0.5 for uncorrelated data)."""
+        errors = self.level_errors()
+        if not errors or errors[0] == 0:
+            return 0.5
+        return 0.5 * (self.error / errors[0]) ** 2
+
+    def summary(self, name):
+        """{name, name_err, name_tau} entries."""
+        return {name: self.mean, f"{name}_err": self.error, f"{name}_tau": self.tau_int}
+
+    def get_state(self):
+        """Fixed-size float64 vector of the accumulator state (for checkpoints)."""
+        state = np.zeros(self.STATE_SIZE)
+        levels = len(self._count)
+        state[0] = levels
+        state[1:1 + levels] = self._count
+        state[1 + self.MAX_LEVELS:1 + self.MAX_LEVELS + levels] = self._mean
+        state[1 + 2 * self.MAX_LEVELS:1 + 2 * self.MAX_LEVELS + levels] = self._m2
+        state[1 + 3 * self.MAX_LEVELS:1 + 3 * self.MAX_LEVELS + levels] = [
+            np.nan if x is None else x for x in self._pending]
+        return state
+
+    def set_state(self, state):
+        """Restore from ``get_state``."""
+        levels = int(state[0])
+        self._count = [int(x) for x in state[1:1 + levels]]
+        self._mean = [float(x) for x in state[1 + self.MAX_LEVELS:1 + self.MAX_LEVELS + levels]]
+        self._m2 = [float(x) for x in state[1 + 2 * self.MAX_LEVELS:1 + 2 * self.MAX_LEVELS + levels]]
+        self._pending = [None if np.isnan(x) else float(x)
+                         for x in state[1 + 3 * self.MAX_LEVELS:1 + 3 * self.MAX_LEVELS + levels]]
+
+
+class ThermoAccumulator:
+    """Streaming E, M, |M|, E^2, M^2 with specific heat and susceptibility."""
+
+    def __init__(self, max_blocks=64, min_bins=32):
+        self.observables = {
+            name: StreamingObservable(min_bins)
+            for name in ("energy", "magnetization", "abs_magnetization",
+                         "energy_sq", "magnetization_sq")
+        }
+        # Block sums of (E, E^2, |M|, M^2) for jackknife errors of C and chi
+        self._max_blocks = max_blocks
+        self._blocks = np.zeros((2 * max_blocks, 4))
+        self._block_size = 1
+        self._n_blocks = 0
+        self._filled = 0
+
+    def add(self, E, M):
+        """Add one measurement of total energy and signed magnetization."""
+        E = float(E)
+        M = float(M)
+        row = (E, E * E, abs(M), M * M)
+        for name, value in zip(("energy", "energy_sq", "abs_magnetization", "magnetization_sq"), row):
+            self.observables[name].add(value)
+        self.observables["magnetization"].add(M)
+
+        self._blocks[self._n_blocks] += row
+        self._filled += 1
+        if self._filled == self._block_size:
+            self._close_block()
+
+    def extend(self, E, M):
+        """Add measurements in order; ``add`` for each (E, M) pair, vectorized."""
+        E = np.asarray(E, dtype=float)
+        M = np.asarray(M, dtype=float)
+        rows = np.column_stack((E, E * E, np.abs(M), M * M))
+        for k, name in enumerate(("energy", "energy_sq", "abs_magnetization", "magnetization_sq")):
+            self.observables[name].extend(rows[:, k])
+        self.observables["magnetization"].extend(M)
+
+        start = 0
+        while start < len(rows):
+            take = min(self._block_size - self._filled, len(rows) - start)
+            self._blocks[self._n_blocks] += rows[start:start + take].sum(axis=0)
+            self._filled += take
+            start += take
+            if self._filled == self._block_size:
+                self._close_block()
+
+    def _close_block(self):
+        """Move on to the next block, halving the block count when all are full."""
+        self._n_blocks += 1
+        self._filled = 0
+        if self._n_blocks == len(self._blocks):
+            merged = self._blocks[0::2] + self._blocks[1::2]
+            self._blocks[:] = 0.0
+            self._blocks[:self._max_blocks] = merged
+            self._n_blocks = self._max_blocks
+            self._block_size *= 2
+
+    @property
+    def count(self):
+        return self.observables["energy"].count
+
+    @property
+    def state_size(self):
+        return len(self.observables) * StreamingObservable.STATE_SIZE + self._blocks.size + 3
+
+    def get_state(self):
+        """Fixed-size float64 vector of the accumulator state (for checkpoints)."""
+        return np.concatenate([observable.get_state() for observable in self.observables.values()]
+                              + [self._blocks.ravel(), [self._block_size, self._n_blocks, self._filled]])
+
+    def set_state(self, state):
+        """Restore from ``get_state``."""
+        size = StreamingObservable.STATE_SIZE
+        for k, observable in enumerate(self.observables.values()):
+            observable.set_state(state[k * size:(k + 1) * size])
+        offset = len(self.observables) * size
+        self._blocks[:] = np.reshape(state[offset:offset + self._blocks.size], self._blocks.shape)
+        self._block_size, self._n_blocks, self._filled = (int(x) for x in state[offset + self._blocks.size:])
+
+    @staticmethod
+    def _response(means, beta, n_sites):
+        """(specific heat, susceptibility) per site from moment means."""
+        E, E2, absM, M2 = means
+        return beta ** 2 * (E2 - E ** 2) / n_sites, beta * (M2 - absM ** 2) / n_sites
+
+    def _jackknife_errors(self, beta, n_sites):
+        n = self._n_blocks
+        if n < 2:
+            return 0.0, 0.0
+        blocks = self._blocks[:n]
+        leave_one_out = (blocks.sum(axis=0) - blocks) / ((n - 1) * self._block_size)
+        estimates = np.array([self._response(means, beta, n_sites) for means in leave_one_out])
+        return tuple(np.sqrt((n - 1) * np.mean((estimates - estimates.mean(axis=0)) ** 2, axis=0)))
+
+    def summary(self, beta, n_sites):
+        """
+        Means, binning errors and tau_int of every observable, plus
+        specific_heat and susceptibility per site with jackknife errors.
+        """
+        result = {}
+        for name, observable in self.observables.items():
+            result.update(observable.summary(name))
+        means = [result[name] for name in ("energy", "energy_sq", "abs_magnetization", "magnetization_sq")]
+        result["specific_heat"], result["susceptibility"] = self._response(means, beta, n_sites)
+        result["specific_heat_err"], result["susceptibility_err"] = self._jackknife_errors(beta, n_sites)
+        return result
+
+
+def exact_summary(E, M):
+    """``ThermoAccumulator.summary`` layout for a state known exactly (e.g. T = 0)."""
+    result = {}
+    for name, value in (("energy", E), ("magnetization", M), ("abs_magnetization", abs(M)),
+                        ("energy_sq", E * E), ("magnetization_sq", M * M)):
+        result.update({name: value, f"{name}_err": 0.0, f"{name}_tau": 0.0})
+    result.update(specific_heat=0.0, specific_heat_err=0.0, susceptibility=0.0, susceptibility_err=0.0)
+    return result
+
+
+def per_site(summary, n_sites):
+    """
+    ``summary`` with the E and M moments and their errors divided down to one
+    site (squares by n_sites**2); tau_int, C and chi are left as they are.
+    """
+    result = dict(summary)
+    for name, power in (("energy", 1), ("magnetization", 1), ("abs_magnetization", 1),
+                        ("energy_sq", 2), ("magnetization_sq", 2)):
+        result[name] = summary[name] / n_sites ** power
+        result[f"{name}_err"] = summary[f"{name}_err"] / n_sites ** power
+    return result
+
+
+def combine_errors(errors, axis=-1):
+    """Standard error of the mean of independent runs from their individual errors."""
+    errors = np.asarray(errors)
+    return np.sqrt((errors ** 2).sum(axis=axis)) / errors.shape[axis]
+
+
+SUMMARY_KEYS = tuple(exact_summary(0.0, 0.0))
@@ -0,0 +1,498 @@
+# -*- coding: utf-8 -*-
+"""
+Sweep runner for the (omega, T, replica) grids of the sinusoidal-field
+simulators.
+
+Every grid point is an independent run from an all-up lattice, so points
+are fanned out to a process pool and merged back into (omega, T, replica)
+arrays of streaming statistics (``ising.stats``). Each point draws from
+its own Philox stream (``ising.philox``), keyed by the base seed and the
+point's (omega, T) values, with the replica in its counter, rather than
+by its position in the grid, so a point reproduces bit for bit on its
+own, in any worker and when the grid is extended.
+
+Sweeps run in compiled chunks (``ising.driver``) under a precomputed
+field schedule, and each chunk's E and M series is fed to the statistics
+in bulk, so Python is entered once per chunk rather than once per sweep.
+
+Static-field (omega = 0) temperatures inside ``cluster_range`` use Wolff
+cluster moves (``ising.cluster``), one cluster per step, in place of
+single-spin Metropolis sweeps. Driven points always sweep with
+Metropolis: the field advances once per step, and a step must be a sweep
+for the period, Q, loop area and harmonics to mean anything. Metropolis sweeps run on halo-padded lattices
+(``ising.halo``); ``schedule="random"`` (the default) keeps the
+random-site chains, "sequential" and "tiled" visit the sites in memory
+order for large lattices, and "checkerboard" spreads each sweep of one
+large lattice over numba's threads.
+
+Given ``min_thermalization``, the burn-in is detected online
+(``ising.equilibration``) between that and ``thermalization`` sweeps
+instead of always running ``thermalization`` sweeps.
+
+``energy_replicas`` / ``magnetization_replicas`` run all replicas of an
+(omega, T) point together through ``ising.replicas``; pass
+``batch_replicas=True`` to ``run_grid`` for them.
+
+``warm_start="ascending"`` or ``"descending"`` instead chains the
+temperatures of each (omega, replica): every T continues from the final
+lattice of the previous one, as in the heating/cooling scans.
+
+Given ``histogram_width``, every point also records an energy histogram
+(``ising.reweighting``) as the "histogram" entry of its summary, from
+which static-field curves are reweighted between the simulated
+temperatures.
+
+With a ``ResultCache`` (``ising.cache``) and a fixed seed, points already
+computed with the same parameters and ``KERNEL_VERSION`` are served from
+disk and only the misses are run.
+
+The compiled kernels are cached on disk (``cache=True``), so after the
+first run a fresh worker process loads them instead of recompiling.
+"""
+
+# sweep.py
+import time
+
+import numpy as np
+
+from ising.cache import cache_key
+from ising.cluster import wolff_step
+from ising.driver import CHUNK, drive, drive_checkerboard, drive_padded, drive_replicas
+from ising.dynamics import NO_DYNAMICS, PeriodAccumulator, exact_dynamics
+from ising.equilibration import EquilibrationDetector
+from ising.field import period_aligned_steps, sinusoidal_field, sinusoidal_schedule
+from ising.halo import SCHEDULES, TILE, interior, pad
+from ising.instrument import Progress, compile_kernel, instrumented_call
+from ising.kernels import calculate_total_energy, metropolis_step
+from ising.philox import new_stream
+from ising.reweighting import EnergyHistogram
+from ising.stats import ThermoAccumulator, exact_summary
+
+# Part of every cache key; bump when a change to the kernels or point
+# functions alters the numbers a point produces.
+KERNEL_VERSION = 6
+
+
+def point_stream(base_entropy, omega, T, replica):
+    """Philox stream of one grid point."""
+    return new_stream(base_entropy, (omega, T), replica)
+
+
+def select_step(T, cluster_range=None, omega=0.0):
+    """Update kernel for temperature T: Wolff inside cluster_range in a static field, else Metropolis."""
+    if omega == 0 and cluster_range is not None and cluster_range[0] <= T <= cluster_range[1]:
+        return wolff_step
+    return metropolis_step
+
+
+def ground_state(omega, N, J, H_amp):
+    """Exact T = 0 observables: all spins up."""
+    E = -2 * N * N * J - N * N * H_amp if omega == 0 else -2 * N * N * J
+    return dict(exact_summary(E, N * N), **(exact_dynamics(1.0) if omega > 0 else NO_DYNAMICS))
+
+
+def burn_in_detector(omega, thermalization, min_thermalization=None):
+    """
+    ``EquilibrationDetector`` between min_thermalization and thermalization
+    sweeps (exactly thermalization when min_thermalization is None).
+    """
+    if min_thermalization is None:
+        min_thermalization = thermalization
+    # Windows span whole field periods, so the drive does not look like drift
+    window = max(min_thermalization // 2, 10)
+    if omega > 0:
+        window = max(window, int(2 * np.pi / omega))
+    return EquilibrationDetector(min_thermalization, thermalization, window)
+
+
+def _charge_phases(instrument, start, equilibrated_at, end):
+    """Split [start, end] into thermalization and measurement time."""
+    if instrument is not None:
+        equilibrated_at = end if equilibrated_at is None else equilibrated_at
+        instrument.add_time("thermalization", equilibrated_at - start)
+        instrument.add_time("measurement", end - equilibrated_at)
+
+
+def field_period(omega):
+    """Sweeps per period of the sinusoidal field (np.inf for a static one)."""
+    return 2 * np.pi / omega if omega > 0 else np.inf
+
+
+def _burn_in_allowance(detector, measure_sweeps):
+    """
+    Sweeps a chunk may run while ``detector`` is still burning in: at most
+    to the forced end of the burn-in, and never more past the detection
+    point than the measurement needs, so no sweep is run in excess.
+    """
+    return min(measure_sweeps, detector.max_sweeps - detector.sweeps)
+
+
+def measure_point(omega, T, stream, N, J, H_amp, thermalization, measure_sweeps,
+                  cluster_range=None, min_thermalization=None, lattice=None, instrument=None,
+                  schedule="random", sample_every=64, histogram_width=None):
+    """
+    Streaming statistics (``ThermoAccumulator.summary``, plus the
+    per-period response of ``ising.dynamics``) of one run at
+    (omega, T > 0), drawing from a copy of ``stream``
+    (``ising.philox``). Without ``min_thermalization`` the first
+    ``thermalization`` sweeps are discarded; with it, measurement starts
+    once the chain is detected as stationary, within those two caps.
+
+    The run starts all-up, or from ``lattice``, which is then advanced in
+    place. Sweeps run in compiled chunks (``ising.driver``); Metropolis
+    sweeps visit sites in the order ``schedule`` (``ising.halo.SCHEDULES``)
+    on a halo-padded copy of the lattice. ``instrument``
+    (``ising.instrument.Instrumentation``) collects phase timings and the
+    acceptance of every ``sample_every``-th sweep. With ``histogram_width``
+    the measured E and M are also binned into an ``EnergyHistogram``,
+    returned in ``to_dict`` form as summary["histogram"].
+    """
+    stream = np.array(stream, dtype=np.uint32)
+    if lattice is None:
+        lattice = np.ones((N, N), dtype=np.int8)
+    if select_step(T, cluster_range, omega) is wolff_step:
+        kernel, spins, options = drive, lattice, (stream, True)
+    elif schedule == "checkerboard":
+        kernel, spins, options = drive_checkerboard, pad(lattice), (stream, TILE)
+    else:
+        kernel, spins, options = drive_padded, pad(lattice), (stream, SCHEDULES[schedule], TILE)
+    H = float(sinusoidal_field(H_amp, omega)(0))
+    E = calculate_total_energy(lattice, J, H)
+    M = int(np.sum(lattice))
+    energies = np.empty(CHUNK)
+    magnetizations = np.empty(CHUNK, dtype=np.int64)
+    sample_every = sample_every if instrument is not None else 0
+    if instrument is not None:
+        compile_kernel(kernel, spins, 1 / T, float(J), energies, H, E, M, energies,
+                       magnetizations, *options, 0, sample_every, instrument=instrument)
+
+    detector = burn_in_detector(omega, thermalization, min_thermalization)
+    measurements = ThermoAccumulator()
+    dynamics = PeriodAccumulator(field_period(omega), N * N)
+    histogram = EnergyHistogram(histogram_width) if histogram_width else None
+    start = time.perf_counter()
+    equilibrated_at = start if detector.equilibrated else None
+    step = 0
+    while measurements.count < measure_sweeps:
+        if detector.equilibrated:
+            n = min(CHUNK, measure_sweeps - measurements.count)
+        else:
+            n = min(CHUNK, _burn_in_allowance(detector, measure_sweeps))
+        fields = sinusoidal_schedule(H_amp, omega, step, step + n)
+        E, M, accepted, attempts = kernel(spins, 1 / T, float(J), fields, H, E, M, energies,
+                                          magnetizations, *options, step, sample_every)
+        H = fields[-1]
+        if instrument is not None:
+            instrument.count(attempts, accepted)
+        burn_in = 0
+        if not detector.equilibrated:
+            burn_in = detector.extend(energies[:n], np.abs(magnetizations[:n]))
+            if detector.equilibrated:
+                equilibrated_at = time.perf_counter()
+        measurements.extend(energies[burn_in:n], magnetizations[burn_in:n])
+        dynamics.extend(step + burn_in, fields[burn_in:], magnetizations[burn_in:n])
+        if histogram is not None:
+            histogram.extend(energies[burn_in:n], magnetizations[burn_in:n])
+        step += n
+    end = time.perf_counter()
+    if spins is not lattice:
+        lattice[:] = interior(spins)
+    _charge_phases(instrument, start, equilibrated_at, end)
+    summary = dict(measurements.summary(1 / T, N * N), **dynamics.summary())
+    if histogram is not None:
+        summary["histogram"] = histogram.to_dict()
+    if instrument is not None:
+        instrument.add_time("observables", time.perf_counter() - end)
+    return summary
+
+
+def measure_replicas(omega, T, streams, N, J, H_amp, thermalization, measure_sweeps,
+                     cluster_range=None, min_thermalization=None, lattice=None,
+                     instrument=None, schedule="random", sample_every=64, histogram_width=None):
+    """
+    ``measure_point`` for one replica per row of the (R, 6) ``streams``,
+    advanced together as an (R, N, N) array (``lattice``, if given);
+    returns a list of summaries, each equal to that replica's
+    ``measure_point``. A replica stops sweeping once its measurement is
+    complete, so the lattices left in ``lattice`` (the warm start of the
+    next temperature) are the ones ``measure_point`` would leave.
+    Wolff temperatures (``select_step``) run the replicas one by one, as
+    does the multithreaded "checkerboard" schedule.
+    """
+    R = len(streams)
+    lattices = np.ones((R, N, N), dtype=np.int8) if lattice is None else lattice
+    if select_step(T, cluster_range, omega) is not metropolis_step or schedule == "checkerboard":
+        return [measure_point(omega, T, stream, N, J, H_amp, thermalization, measure_sweeps,
+                              cluster_range, min_thermalization, lattices[r], instrument,
+                              schedule, sample_every, histogram_width)
+                for r, stream in enumerate(streams)]
+    streams = np.array(streams, dtype=np.uint32)
+    padded = pad(lattices)
+    order = SCHEDULES[schedule]
+    H = float(sinusoidal_field(H_amp, omega)(0))
+    E = np.array([calculate_total_energy(lattice, J, H) for lattice in lattices])
+    M = lattices.sum(axis=(1, 2)).astype(np.int64)
+    energies = np.empty((R, CHUNK))
+    magnetizations = np.empty((R, CHUNK), dtype=np.int64)
+    sample_every = sample_every if instrument is not None else 0
+    if instrument is not None:
+        compile_kernel(drive_replicas, padded, 1 / T, float(J), energies[0], H, E, M, energies,
+                       magnetizations, streams, order, TILE, 0, sample_every, instrument=instrument)
+
+    detectors = [burn_in_detector(omega, thermalization, min_thermalization) for _ in range(R)]
+    measurements = [ThermoAccumulator() for _ in range(R)]
+    dynamics = [PeriodAccumulator(field_period(omega), N * N) for _ in range(R)]
+    histograms = [EnergyHistogram(histogram_width) if histogram_width else None for _ in range(R)]
+    start = time.perf_counter()
+    equilibrated_at = None
+    step = 0
+    while True:
+        # The chunk ends where the first still-running replica needs a decision
+        allowances = [measure_sweeps - measurements[r].count if detectors[r].equilibrated
+                      else _burn_in_allowance(detectors[r], measure_sweeps) for r in range(R)]
+        running = [r for r in range(R) if allowances[r] > 0]
+        if not running:
+            break
+        n = min(CHUNK, *(allowances[r] for r in running))
+        fields = sinusoidal_schedule(H_amp, omega, step, step + n)
+        # Finished replicas are left out of the stack (a copy) and stay where they stopped
+        batch = slice(None) if len(running) == R else np.array(running)
+        stack, E_run, M_run, streams_run = padded[batch], E[batch], M[batch], streams[batch]
+        chunk_E, chunk_M = energies[batch], magnetizations[batch]
+        accepted, attempts = drive_replicas(stack, 1 / T, float(J), fields, H, E_run, M_run,
+                                            chunk_E, chunk_M, streams_run, order, TILE, step,
+                                            sample_every)
+        if len(running) < R:
+            padded[batch], E[batch], M[batch], streams[batch] = stack, E_run, M_run, streams_run
+        H = fields[-1]
+        if instrument is not None:
+            instrument.count(attempts, accepted)
+        for i, r in enumerate(running):
+            burn_in = 0
+            if not detectors[r].equilibrated:
+                burn_in = detectors[r].extend(chunk_E[i, :n], np.abs(chunk_M[i, :n]))
+            take = min(n - burn_in, measure_sweeps - measurements[r].count)
+            measurements[r].extend(chunk_E[i, burn_in:burn_in + take],
+                                   chunk_M[i, burn_in:burn_in + take])
+            dynamics[r].extend(step + burn_in, fields[burn_in:burn_in + take],
+                               chunk_M[i, burn_in:burn_in + take])
+            if histograms[r] is not None:
+                histograms[r].extend(chunk_E[i, burn_in:burn_in + take],
+                                     chunk_M[i, burn_in:burn_in + take])
+        step += n
+        if equilibrated_at is None and all(detector.equilibrated for detector in detectors):
+            equilibrated_at = time.perf_counter()
+    end = time.perf_counter()
+    lattices[:] = interior(padded)
+    _charge_phases(instrument, start, equilibrated_at, end)
+    summaries = [dict(measurement.summary(1 / T, N * N), **period.summary())
+                 for measurement, period in zip(measurements, dynamics)]
+    for summary, histogram in zip(summaries, histograms):
+        if histogram is not None:
+            summary["histogram"] = histogram.to_dict()
+    if instrument is not None:
+        instrument.add_time("observables", time.perf_counter() - end)
+    return summaries
+
+
+def energy_point(omega, T, stream, N, J, H_amp, thermalization, measure_steps,
+                 cluster_range=None, min_thermalization=None, lattice=None, instrument=None,
+                 schedule="random", histogram_width=None):
+    """Observables of one run at (omega, T), measured every sweep."""
+    if T == 0:
+        return ground_state(omega, N, J, H_amp)
+    return measure_point(omega, T, stream, N, J, H_amp, thermalization, measure_steps,
+                         cluster_range, min_thermalization, lattice, instrument, schedule,
+                         histogram_width=histogram_width)
+
+
+def magnetization_point(omega, T, stream, N, J, H_amp, thermalization, measure_steps,
+                        cluster_range=None, min_thermalization=None, lattice=None, instrument=None,
+                        schedule="random", histogram_width=None):
+    """Observables of one run at (omega, T), measured every sweep over whole field periods."""
+    if T == 0:
+        return ground_state(omega, N, J, H_amp)
+    return measure_point(omega, T, stream, N, J, H_amp, thermalization,
+                         period_aligned_steps(omega, measure_steps), cluster_range,
+                         min_thermalization, lattice, instrument, schedule,
+                         histogram_width=histogram_width)
+
+
+def energy_replicas(omega, T, streams, N, J, H_amp, thermalization, measure_steps,
+                    cluster_range=None, min_thermalization=None, lattice=None, instrument=None,
+                    schedule="random", histogram_width=None):
+    """``energy_point`` for a batch of replicas; returns a list of summaries."""
+    if T == 0:
+        return [ground_state(omega, N, J, H_amp) for _ in streams]
+    return measure_replicas(omega, T, streams, N, J, H_amp, thermalization, measure_steps,
+                            cluster_range, min_thermalization, lattice, instrument, schedule,
+                            histogram_width=histogram_width)
+
+
+def magnetization_replicas(omega, T, streams, N, J, H_amp, thermalization, measure_steps,
+                           cluster_range=None, min_thermalization=None, lattice=None,
+                           instrument=None, schedule="random", histogram_width=None):
+    """``magnetization_point`` for a batch of replicas; returns a list of summaries."""
+    if T == 0:
+        return [ground_state(omega, N, J, H_amp) for _ in streams]
+    return measure_replicas(omega, T, streams, N, J, H_amp, thermalization,
+                            period_aligned_steps(omega, measure_steps), cluster_range,
+                            min_thermalization, lattice, instrument, schedule,
+                            histogram_width=histogram_width)
+
+
+def chain_temperatures(point, omega, T_values, streams, N, **params):
+    """
+    ``point`` at each of ``T_values`` in turn, every temperature continuing
+    from the final lattice of the previous one (all-up at the first).
+    ``streams`` holds one stream, or one (R, 6) array of replica streams,
+    per temperature. Returns the per-temperature results.
+    """
+    shape = (len(streams[0]), N, N) if np.ndim(streams[0]) == 2 else (N, N)
+    lattice = np.ones(shape, dtype=np.int8)
+    results = []
+    for T, stream in zip(T_values, streams):
+        if T == 0:
+            lattice[:] = 1
+        results.append(point(omega, T, stream, N=N, lattice=lattice, **params))
+    return results
+
+
+def run_grid(point, omegas, T_range, measures_per_T, workers=None, seed=None, on_result=None,
+             cache=None, batch_replicas=False, warm_start=None, instrument=None, **params):
+    """
+    Evaluate ``point(omega, T, stream, **params)`` for every omega, T and
+    replica. Returns a dict mapping each summary entry to an array of shape
+    (len(omegas), len(T_range), measures_per_T); a "histogram" entry is an
+    object array of ``EnergyHistogram.to_dict`` forms (None at T = 0).
+
+    ``workers`` is the process count (None: all cores, 1: run in-process).
+    Pool workers are started fresh (forkserver or spawn), so a script that
+    runs a pool needs the ``if __name__ == "__main__":`` guard.
+    ``on_result(omega, T, replica, summary)`` is called as each point
+    finishes, e.g. to append it to a ``ResultsStore``.
+
+    ``stream`` is the point's Philox stream (``point_stream``) for
+    ``seed``. ``cache`` is an optional ``ResultCache``; it is only used
+    with a fixed ``seed``, since unseeded points cannot be reproduced.
+
+    With ``batch_replicas``, ``point(omega, T, streams, **params)`` computes
+    all replicas of an (omega, T) pair at once and returns their summaries
+    as a list (e.g. ``energy_replicas``).
+
+    ``warm_start`` ("ascending" or "descending") runs the temperatures of
+    each omega (and replica, unless batched) as one chain in that order
+    through ``chain_temperatures``; chains, not points, are then the unit
+    of parallel work.
+
+    ``instrument`` (``ising.instrument.Instrumentation``) receives the
+    phase timings and acceptance counts of every point, plus "io" time for
+    the cache and ``on_result``.
+    """
+    base_entropy = np.random.SeedSequence(seed).entropy
+    samples = {}
+
+    def store(task, summary):
+        if on_result is not None:
+            on_result(omegas[task[0]], T_range[task[1]], task[2], summary)
+        for key, value in summary.items():
+            if key not in samples:
+                shape = (len(omegas), len(T_range), measures_per_T)
+                samples[key] = np.empty(shape, dtype=object) if isinstance(value, dict) else np.zeros(shape)
+            samples[key][task] = value
+
+    # A call covers one temperature (and all replicas when batched); a
+    # group is the calls one task runs, several temperatures when chained
+    t_order = list(range(len(T_range)))
+    if warm_start is not None:
+        t_order = sorted(t_order, key=lambda t: T_range[t], reverse=(warm_start == "descending"))
+    replica_sets = [list(range(measures_per_T))] if batch_replicas else [[m] for m in range(measures_per_T)]
+    if warm_start is None:
+        groups = [[[(w_idx, t_idx, m) for m in replicas]]
+                  for w_idx in range(len(omegas)) for t_idx in t_order for replicas in replica_sets]
+    else:
+        groups = [[[(w_idx, t_idx, m) for m in replicas] for t_idx in t_order]
+                  for w_idx in range(len(omegas)) for replicas in replica_sets]
+
+    def call_streams(call):
+        omega, T = omegas[call[0][0]], T_range[call[0][1]]
+        streams = np.array([point_stream(base_entropy, omega, T, task[2]) for task in call])
+        return streams if batch_replicas else streams[0]
+
+    def submission(group):
+        omega = omegas[group[0][0][0]]
+        if warm_start is None:
+            return point, (omega, T_range[group[0][0][1]], call_streams(group[0]))
+        return chain_temperatures, (point, omega, [T_range[call[0][1]] for call in group],
+                                    [call_streams(call) for call in group])
+
+    def key(task):
+        omega, T = omegas[task[0]], T_range[task[1]]
+        fields = dict(point=point.__name__, version=KERNEL_VERSION, omega=omega, T=T,
+                      stream=point_stream(base_entropy, omega, T, task[2]), **params)
+        if warm_start is not None and t_order.index(task[1]) > 0:
+            # A chained point also depends on every temperature run before it
+            fields["previous"] = [T_range[t] for t in t_order[:t_order.index(task[1])]]
+        return cache_key(**fields)
+
+    def job(group):
+        function, args = submission(group)
+        if instrument is None:
+            return function, args
+        return instrumented_call, (function,) + args
+
+    def finish(group, result):
+        if instrument is not None:
+            result, timings = result
+            instrument.merge(timings)
+        start = time.perf_counter()
+        for call, call_result in zip(group, result if warm_start is not None else [result]):
+            for task, summary in zip(call, call_result if batch_replicas else [call_result]):
+                if cache is not None:
+                    cache.put(key(task), summary)
+                store(task, summary)
+        if instrument is not None:
+            instrument.add_time("io", time.perf_counter() - start)
+
+    if cache is not None and seed is not None:
+        start = time.perf_counter()
+        misses = []
+        for group in groups:
+            tasks = [task for call in group for task in call]
+            hits = [cache.get(key(task)) for task in tasks]
+            if any(summary is None for summary in hits):
+                misses.append(group)
+            else:
+                for task, summary in zip(tasks, hits):
+                    store(task, summary)
+        groups = misses
+        if instrument is not None:
+            instrument.add_time("io", time.perf_counter() - start)
+    else:
+        cache = None
+
+    with Progress(len(groups), desc="Grid points") as progress:
+        if workers == 1:
+            for group in groups:
+                function, args = job(group)
+                finish(group, function(*args, **params))
+                progress.update()
+        elif groups:
+            # Deferred: single-worker runs (and pool workers) never need it
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+
+            # Workers start from a fresh interpreter, never a fork of this
+            # process, which may already run threads (numba's, a heartbeat)
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context(method)) as pool:
+                futures = {}
+                for group in groups:
+                    function, args = job(group)
+                    futures[pool.submit(function, *args, **params)] = group
+                for future in as_completed(futures):
+                    finish(futures[future], future.result())
+                    progress.update()
+
+    return samples
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel tempering (replica exchange) over a temperature grid.
+
+One lattice per temperature is advanced every sweep. Every
+``exchange_every`` sweeps neighbouring temperatures k, k+1 (even pairs,
+then odd pairs on the next attempt) swap configurations with probability
+min(1, exp((beta_k - beta_k+1) * (E_k - E_k+1))). Ordered configurations
+found at low T and decorrelated ones from high T travel along the grid,
+so chains near and below Tc equilibrate far faster than from a cold start.
+
+All replicas share the same sweep counter and therefore see the same
+H(step); the swap criterion uses energies at that field, kept as running
+totals from the kernels' (dE, dM) returns. The sweeps between two swap
+attempts run in one compiled ``ising.driver.drive`` call per replica, and
+the running totals it records reach the statistics in blocks of about
+``CHUNK`` sweeps, so Python only handles the swaps. Swaps cut the time
+series of every temperature, so the per-period response
+(``ising.dynamics``) is reported as NaN.
+
+Lattice r draws from Philox stream (seed, point, r) and the swaps from
+(seed, point, R) (``ising.philox``), so a run is fixed by its seed.
+"""
+
+# tempering.py
+import numpy as np
+
+from ising.driver import CHUNK, drive
+from ising.dynamics import NO_DYNAMICS
+from ising.kernels import calculate_total_energy
+from ising.philox import RandomStream, new_streams
+from ising.stats import ThermoAccumulator
+
+
+def replica_exchange(betas, N, J, field, thermalization, measure_steps,
+                     exchange_every=10, seed=None, point=()):
+    """
+    Run one replica per entry of ``betas`` (finite, any order) with
+    ``ising.kernels.metropolis_step`` sweeps.
+
+    ``field(steps)`` gives H for an array of sweep indices (a scalar for a
+    static field, as ``ising.field.sinusoidal_field``); every measurement
+    sweep feeds the running E and M of each temperature into a
+    ``ThermoAccumulator``. Returns the per-beta summaries and the swap
+    acceptance rate of each neighbouring pair.
+    """
+    betas = np.asarray(betas, dtype=float)
+    R = len(betas)
+    lattices = np.ones((R, N, N), dtype=np.int8)
+    slot = np.arange(R)  # slot[k] is the lattice currently at betas[k]
+    accepted = np.zeros(max(R - 1, 0))
+    attempted = np.zeros(max(R - 1, 0))
+    measurements = [ThermoAccumulator() for _ in range(R)]
+    streams = new_streams(seed, point, range(R))
+    swaps = RandomStream(seed, point, R)
+
+    # Running totals, indexed by lattice rather than by temperature
+    H = float(field(0))
+    energies = np.array([calculate_total_energy(lattices[r], J, H) for r in range(R)])
+    magnetizations = lattices.sum(axis=(1, 2)).astype(float)
+
+    # Running totals of each temperature after every sweep of a block, and
+    # the measured ones not yet passed to the accumulators
+    block_energies = np.empty((R, exchange_every))
+    block_magnetizations = np.empty((R, exchange_every))
+    pending = []
+
+    total = thermalization + measure_steps
+    start = 0
+    while start < total:
+        # Sweeps start .. stop - 1; swaps are attempted after each sweep
+        # that is a multiple of exchange_every
+        exchange = -(-start // exchange_every) * exchange_every
+        stop = min(exchange + 1, total)
+        n = stop - start
+        fields = np.broadcast_to(field(np.arange(start, stop)), (n,)).astype(float)
+        for k in range(R):
+            r = slot[k]
+            energies[r], magnetizations[r], _, _ = drive(
+                lattices[r], betas[k], J, fields, H, energies[r], magnetizations[r],
+                block_energies[k], block_magnetizations[k], streams[r], False, 0, 0)
+        H = fields[-1]
+
+        if stop - 1 == exchange and R > 1:
+            for k in range((exchange // exchange_every) % 2, R - 1, 2):
+                attempted[k] += 1
+                delta = (betas[k] - betas[k + 1]) * (energies[slot[k]] - energies[slot[k + 1]])
+                if delta >= 0 or swaps.uniform() < np.exp(delta):
+                    slot[k], slot[k + 1] = slot[k + 1], slot[k]
+                    accepted[k] += 1
+            # The last sweep is measured after the swaps
+            block_energies[:, n - 1] = energies[slot]
+            block_magnetizations[:, n - 1] = magnetizations[slot]
+
+        first = max(thermalization - start, 0)
+        if first < n:
+            pending.append((block_energies[:, first:n].copy(), block_magnetizations[:, first:n].copy()))
+        if pending and (stop == total or len(pending) * exchange_every >= CHUNK):
+            E = np.concatenate([e for e, _ in pending], axis=1)
+            M = np.concatenate([m for _, m in pending], axis=1)
+            for k in range(R):
+                measurements[k].extend(E[k], M[k])
+            pending = []
+        start = stop
+
+    summaries = [dict(measurements[k].summary(betas[k], N * N), **NO_DYNAMICS) for k in range(R)]
+    return summaries, accepted / np.maximum(attempted, 1)
+
+
+def temperature_scan(T_range, N, J, field, thermalization, measure_steps,
+                     repeats, ground_state, seed=None, point=(), **kwargs):
+    """
+    Summaries of ``repeats`` independent replica-exchange runs covering
+    every T > 0 of ``T_range``, as a dict of (len(T_range), repeats)
+    arrays; T = 0 points take the ``ground_state`` summary. Run m uses
+    the streams of point ``point + (m,)``.
+    """
+    T_range = np.asarray(T_range, dtype=float)
+    hot = np.flatnonzero(T_range > 0)
+    samples = {key: np.full((len(T_range), repeats), float(value))
+               for key, value in ground_state.items()}
+    for m in range(repeats):
+        summaries, _ = replica_exchange(
+            1 / T_range[hot], N, J, field, thermalization, measure_steps,
+            seed=seed, point=tuple(point) + (m,), **kwargs
+        )
+        for t_idx, summary in zip(hot, summaries):
+            for key, value in summary.items():
+                samples[key][t_idx, m] = value
+    return samples
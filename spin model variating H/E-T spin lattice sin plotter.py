@@ -6,21 +6,23 @@ Created on Thu Dec 12 06:08:44 2024
 """
 
 # plotting.py
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
-import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from ising.results import ResultsStore, pivot
+from ising.reweighting import store_curves
 
 def plot_results():
-    # Load simulation data
-    with open('ising_simulation_data.json', 'r') as f:
-        data = json.load(f)
+    # Load simulation data (only the columns plotted here)
+    store = ResultsStore('ising_simulation_data.store')
+    data = store.read('omega', 'T', 'energy')
     
-    # Extract data
-    T_range = np.array(data['temperatures'])
-    omegas = np.array(data['frequencies'])
-    energies = np.array(data['energies'])
-    energy_stds = np.array(data['energy_stds'])
-    E_ground = data['ground_state_energy']
+    # Mean and spread over restarts
+    omegas, T_range, energies, energy_stds = pivot(data['omega'], data['T'], data['energy'])
+    E_ground = store.metadata['ground_state_energy']
     
     # Create plot
     plt.figure(figsize=(14, 10))
@@ -33,6 +35,14 @@ def plot_results():
                     fmt='o-', color=colors[i], label=label,
                     capsize=3, markersize=4, alpha=0.8)
     
+    # Static-field curve reweighted between the simulated temperatures (runs with histograms)
+    T_fine = np.linspace(T_range[T_range > 0].min(), T_range.max(), 400)
+    curves = store_curves(store, 0.0, T_fine)
+    if curves is not None:
+        plt.plot(T_fine, curves['energy'], '-', color=colors[0], label='Static field (reweighted)')
+        plt.fill_between(T_fine, curves['energy'] - curves['energy_err'],
+                         curves['energy'] + curves['energy_err'], color=colors[0], alpha=0.2)
+    
     # Add critical temperature line
     plt.axvline(x=2.269185, color='gray', linestyle='--', label='Tc')
     
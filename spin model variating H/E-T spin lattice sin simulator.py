@@ -6,45 +6,28 @@ Created on Thu Dec 12 06:08:03 2024
 """
 
 # simulation.py
+import os
+import sys
 import numpy as np
-from numba import jit
-from tqdm import tqdm
-import json
 
-@jit(nopython=True)
-def calculate_total_energy(lattice, J, H):
-    """Calculate total lattice energy correctly."""
-    N = len(lattice)
-    E = 0.0
-    for i in range(N):
-        for j in range(N):
-            E -= J * lattice[i,j] * (
-                lattice[i, (j+1)%N] + 
-                lattice[(i+1)%N, j]
-            )
-    E -= H * np.sum(lattice)
-    return E
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from ising.cache import ResultCache
+from ising.dynamics import DYNAMIC_KEYS
+from ising.field import sinusoidal_field
+from ising.instrument import Instrumentation, Progress
+from ising.results import POINT_COLUMNS, ResultsStore
+from ising.stats import SUMMARY_KEYS
+from ising.sweep import energy_point, energy_replicas, ground_state, run_grid
+from ising.tempering import temperature_scan
 
-@jit(nopython=True)
-def metropolis_step(lattice, beta, J, H):
-    """Single Metropolis step with external field."""
-    N = len(lattice)
-    for _ in range(N*N):
-        i, j = np.random.randint(0, N), np.random.randint(0, N)
-        spin = lattice[i,j]
-        local_field = (lattice[i, (j+1)%N] + 
-                      lattice[i, (j-1)%N] + 
-                      lattice[(i+1)%N, j] + 
-                      lattice[(i-1)%N, j])
-        dE = 2 * spin * (J * local_field + H)
-        if beta == np.inf:
-            if dE < 0:
-                lattice[i,j] = -spin
-        else:
-            if dE <= 0 or np.random.random() < np.exp(-beta * dE):
-                lattice[i,j] = -spin
-
-def run_simulation():
+def run_simulation(mode="independent", workers=None, seed=None):
+    """
+    mode="independent" restarts every (omega, T, m) point from an all-up
+    lattice, spread over ``workers`` processes (None: all cores);
+    mode="tempering" runs T_range as exchanged replicas.
+    With a fixed ``seed``, independent points are cached in ``cache_dir``
+    and reused when the grid is extended or the script re-run.
+    """
     # System parameters
     N = 50
     J = 1.0
@@ -55,75 +38,84 @@ def run_simulation():
     T_mid = np.linspace(0.5, 2.0, 15)
     T_high = np.linspace(2.0, 4.0, 20)
     T_range = np.unique(np.concatenate([T_low, T_mid, T_high]))
-    beta_range = np.where(T_range != 0, 1/T_range, np.inf)
     
     # Frequencies
     omegas = np.array([0.0, 0.01, 0.02, 0.05])
     
     # Simulation steps
-    thermalization = 6000
+    thermalization = 6000  # upper cap on burn-in sweeps
+    min_thermalization = 200  # burn-in is detected online from here on; None: always 6000
     measure_steps = 9000
     measures_per_T = 5
+    tempering_thermalization = 1000  # replica exchange equilibrates much faster
+    warm_start = None  # "ascending"/"descending": each T continues from the previous T's final lattice
+    batch_replicas = True  # advance the measures_per_T replicas of a point in one compiled call
+    schedule = "random"  # Metropolis site order: "random", or "sequential"/"tiled" (cache-friendly for large N),
+                         # or "checkerboard" (multithreaded, for one large lattice: use workers = 1)
+    cache_dir = 'point_cache'  # content-addressed point results (seeded runs only)
+    cache_size = 256 * 2 ** 20  # bytes kept before least recently used points are evicted
+    histogram_width = None  # e.g. 1.0: record energy histograms for reweighted static-field curves (ising.reweighting)
+    cluster_range = None  # (T_min, T_max) for Wolff cluster moves at omega = 0 (driven points stay Metropolis), e.g. (2.0, 2.5)
     
-    # Results storage
-    energies = np.zeros((len(omegas), len(T_range)))
-    energy_stds = np.zeros((len(omegas), len(T_range)))
+    # Ground state energy
     E_ground = -2 * N * N * J - N * N * H_amp
     
-    # Main simulation loop
-    for w_idx, omega in enumerate(tqdm(omegas, desc="Frequencies")):
-        for t_idx, (T, beta) in enumerate(tqdm(zip(T_range, beta_range), 
-                                              desc="Temperature", 
-                                              total=len(T_range))):
-            energy_samples = np.zeros(measures_per_T)
-            
-            for m in range(measures_per_T):
-                lattice = np.ones((N, N))
-                
-                if T == 0:
-                    if omega == 0:
-                        energy_samples[m] = E_ground
-                    else:
-                        energy_samples[m] = -2 * N * N * J
-                else:
-                    # Thermalization
-                    for step in range(thermalization):
-                        H = H_amp * np.sin(omega * step) if omega > 0 else H_amp
-                        metropolis_step(lattice, beta, J, H)
-                    
-                    # Measurement
-                    E_total = 0
-                    measure_count = 0
-                    for step in range(measure_steps):
-                        H = H_amp * np.sin(omega * (step + thermalization)) if omega > 0 else H_amp
-                        metropolis_step(lattice, beta, J, H)
-                        if step % 10 == 0:
-                            E = calculate_total_energy(lattice, J, H)
-                            E_total += E
-                            measure_count += 1
-                    
-                    energy_samples[m] = E_total / measure_count
-            
-            energies[w_idx, t_idx] = np.mean(energy_samples)
-            energy_stds[w_idx, t_idx] = np.std(energy_samples)
+    # One row per (omega, T, replica), appended as points finish
+    store = ResultsStore.create(
+        'ising_simulation_data.store',
+        dict(POINT_COLUMNS, **{key: '<f8' for key in SUMMARY_KEYS + DYNAMIC_KEYS}),
+        metadata={
+            'ground_state_energy': E_ground,
+            'parameters': {
+                'N': N,
+                'J': J,
+                'H_amp': H_amp,
+                'Tc': 2.269185
+            }
+        })
+    
+    # Phase timings and acceptance, saved with the results
+    instrument = Instrumentation()
+    
+    def save_point(omega, T, replica, summary):
+        store.append(field=H_amp, omega=omega, T=T, replica=replica, **summary)
+        if 'histogram' in summary:
+            store.append_histogram(summary['histogram'], field=H_amp, omega=omega, T=T,
+                                   replica=replica, energy_tau=summary['energy_tau'])
     
-    # Save results
-    simulation_data = {
-        'temperatures': T_range.tolist(),
-        'frequencies': omegas.tolist(),
-        'energies': energies.tolist(),
-        'energy_stds': energy_stds.tolist(),
-        'ground_state_energy': E_ground,
-        'parameters': {
-            'N': N,
-            'J': J,
-            'H_amp': H_amp,
-            'Tc': 2.269185
-        }
-    }
+    point = energy_replicas if batch_replicas else energy_point
+    
+    # Unseeded points are never reused, so they get no cache directory
+    cache = ResultCache(cache_dir, cache_size) if seed is not None else None
+    
+    # Main simulation loop
+    if mode == "tempering":
+        with Progress(len(omegas), desc="Frequencies") as progress:
+            for omega in omegas:
+                with instrument.phase('measurement'):
+                    scan = temperature_scan(T_range, N, J, sinusoidal_field(H_amp, omega),
+                                            tempering_thermalization, measure_steps,
+                                            measures_per_T, ground_state(omega, N, J, H_amp),
+                                            seed=seed, point=(omega,))
+                with instrument.phase('io'):
+                    store.append_rows(field=np.full(scan['energy'].size, H_amp),
+                                      omega=np.full(scan['energy'].size, omega),
+                                      T=np.repeat(T_range, measures_per_T),
+                                      replica=np.tile(np.arange(measures_per_T), len(T_range)),
+                                      **{key: scan[key].ravel() for key in SUMMARY_KEYS + DYNAMIC_KEYS})
+                progress.update()
+    else:
+        run_grid(
+            point, omegas, T_range, measures_per_T,
+            workers=workers, seed=seed, on_result=save_point, batch_replicas=batch_replicas,
+            warm_start=warm_start, instrument=instrument,
+            cache=cache, N=N, J=J, H_amp=H_amp,
+            thermalization=thermalization, measure_steps=measure_steps,
+            cluster_range=cluster_range, min_thermalization=min_thermalization,
+            schedule=schedule, histogram_width=histogram_width)
     
-    with open('ising_simulation_data.json', 'w') as f:
-        json.dump(simulation_data, f)
+    store.update_metadata(instrumentation=instrument.summary())
+    print(instrument.report())
 
 if __name__ == "__main__":
     run_simulation()
\ No newline at end of file
@@ -6,36 +6,31 @@ Created on Thu Dec 12 06:17:04 2024
 """
 
 # magnetization_simulation.py
+import os
+import sys
 import numpy as np
-from numba import jit
-from tqdm import tqdm
-import json
 
-@jit(nopython=True)
-def calculate_magnetization(lattice):
-    """Calculate absolute magnetization."""
-    return abs(np.sum(lattice))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from ising.adaptive import adaptive_grid
+from ising.cache import ResultCache
+from ising.dynamics import DYNAMIC_KEYS
+from ising.field import period_aligned_steps, sinusoidal_field
+from ising.instrument import Instrumentation, Progress
+from ising.results import POINT_COLUMNS, ResultsStore
+from ising.stats import SUMMARY_KEYS
+from ising.sweep import ground_state, magnetization_point, magnetization_replicas, run_grid
+from ising.tempering import temperature_scan
 
-@jit(nopython=True)
-def metropolis_step(lattice, beta, J, H):
-    """Single Metropolis step with external field."""
-    N = len(lattice)
-    for _ in range(N*N):
-        i, j = np.random.randint(0, N), np.random.randint(0, N)
-        spin = lattice[i,j]
-        local_field = (lattice[i, (j+1)%N] + 
-                      lattice[i, (j-1)%N] + 
-                      lattice[(i+1)%N, j] + 
-                      lattice[(i-1)%N, j])
-        dE = 2 * spin * (J * local_field + H)
-        if beta == np.inf:
-            if dE < 0:
-                lattice[i,j] = -spin
-        else:
-            if dE <= 0 or np.random.random() < np.exp(-beta * dE):
-                lattice[i,j] = -spin
-
-def run_simulation():
+def run_simulation(mode="independent", workers=None, seed=None):
+    """
+    mode="independent" restarts every (omega, T, m) point from an all-up
+    lattice, spread over ``workers`` processes (None: all cores);
+    mode="tempering" runs T_range as exchanged replicas;
+    mode="adaptive" starts from T_coarse and adds temperatures where the
+    susceptibility or its error changes fastest.
+    With a fixed ``seed``, independent points are cached in ``cache_dir``
+    and reused when the grid is extended or the script re-run.
+    """
     # System parameters
     N = 50
     J = 1.0
@@ -48,83 +43,100 @@ def run_simulation():
         np.linspace(2.0, 2.5, 15),  # Dense around Tc
         np.linspace(2.5, 4.0, 15)   # Fewer points after Tc
     ])
-    beta_range = np.where(T_range != 0, 1/T_range, np.inf)
+    
+    # Adaptive mode: coarse starting grid, refined up to adaptive_points temperatures
+    T_coarse = np.linspace(0.0, 4.0, 11)
+    adaptive_points = 30
+    adaptive_tol = 0.05  # stop once no interval changes by more than this fraction of the peak
+    adaptive_keys = ('susceptibility',)  # driven-field C includes beta^2 var(-H(t) M), which diverges as T -> 0
     
     # Selected frequencies
     omegas = np.array([0.0, 0.01, 0.02, 0.05])
     
     # Simulation steps
-    thermalization = 5000
+    thermalization = 5000  # upper cap on burn-in sweeps
+    min_thermalization = 200  # burn-in is detected online from here on; None: always 5000
     measure_steps = 5000
     measures_per_T = 5
-    
-    # Store results
-    magnetizations = np.zeros((len(omegas), len(T_range)))
-    mag_stds = np.zeros((len(omegas), len(T_range)))
+    tempering_thermalization = 1000  # replica exchange equilibrates much faster
+    warm_start = None  # "ascending"/"descending": each T continues from the previous T's final lattice
+    batch_replicas = True  # advance the measures_per_T replicas of a point in one compiled call
+    schedule = "random"  # Metropolis site order: "random", or "sequential"/"tiled" (cache-friendly for large N),
+                         # or "checkerboard" (multithreaded, for one large lattice: use workers = 1)
+    cache_dir = 'point_cache'  # content-addressed point results (seeded runs only)
+    cache_size = 256 * 2 ** 20  # bytes kept before least recently used points are evicted
+    histogram_width = None  # e.g. 1.0: record energy histograms for reweighted static-field curves (ising.reweighting)
+    cluster_range = None  # (T_min, T_max) for Wolff cluster moves at omega = 0 (driven points stay Metropolis), e.g. (2.0, 2.5) for the dense critical grid
     
     # Ground state magnetization
     M_ground = N * N
     
-    for w_idx, omega in enumerate(tqdm(omegas, desc="Frequencies")):
-        for t_idx, (T, beta) in enumerate(tqdm(zip(T_range, beta_range), 
-                                              desc="Temperature", 
-                                              total=len(T_range))):
-            mag_samples = np.zeros(measures_per_T)
-            
-            for m in range(measures_per_T):
-                lattice = np.ones((N, N))
-                
-                if T == 0:
-                    mag_samples[m] = M_ground
-                    continue
-                    
-                # Thermalization
-                for step in range(thermalization):
-                    H = H_amp if omega == 0 else H_amp * np.sin(omega * step)
-                    metropolis_step(lattice, beta, J, H)
-                
-                # Measurement with proper period handling
-                M_total = 0
-                measure_count = 0
-                
-                if omega > 0:
-                    field_period = int(2 * np.pi / omega)
-                    num_periods = max(10, measure_steps // field_period)
-                    actual_steps = num_periods * field_period
-                else:
-                    actual_steps = measure_steps
-                
-                for step in range(actual_steps):
-                    H = H_amp if omega == 0 else H_amp * np.sin(omega * (step + thermalization))
-                    metropolis_step(lattice, beta, J, H)
-                    
-                    if step % 10 == 0:
-                        M = calculate_magnetization(lattice)
-                        M_total += M
-                        measure_count += 1
-                
-                mag_samples[m] = M_total / measure_count
-            
-            magnetizations[w_idx, t_idx] = np.mean(mag_samples)
-            mag_stds[w_idx, t_idx] = np.std(mag_samples)
+    # One row per (omega, T, replica), appended as points finish
+    store = ResultsStore.create(
+        'ising_magnetization_data.store',
+        dict(POINT_COLUMNS, **{key: '<f8' for key in SUMMARY_KEYS + DYNAMIC_KEYS}),
+        metadata={
+            'ground_state_magnetization': M_ground,
+            'parameters': {
+                'N': N,
+                'J': J,
+                'H_amp': H_amp,
+                'Tc': 2.269185
+            }
+        })
+    
+    # Phase timings and acceptance, saved with the results
+    instrument = Instrumentation()
+    
+    def save_point(omega, T, replica, summary):
+        store.append(field=H_amp, omega=omega, T=T, replica=replica, **summary)
+        if 'histogram' in summary:
+            store.append_histogram(summary['histogram'], field=H_amp, omega=omega, T=T,
+                                   replica=replica, energy_tau=summary['energy_tau'])
+    
+    point = magnetization_replicas if batch_replicas else magnetization_point
+    
+    # Unseeded points are never reused, so they get no cache directory
+    cache = ResultCache(cache_dir, cache_size) if seed is not None else None
     
-    # Save results
-    simulation_data = {
-        'temperatures': T_range.tolist(),
-        'frequencies': omegas.tolist(),
-        'magnetizations': magnetizations.tolist(),
-        'magnetization_stds': mag_stds.tolist(),
-        'ground_state_magnetization': M_ground,
-        'parameters': {
-            'N': N,
-            'J': J,
-            'H_amp': H_amp,
-            'Tc': 2.269185
-        }
-    }
+    if mode == "tempering":
+        with Progress(len(omegas), desc="Frequencies") as progress:
+            for omega in omegas:
+                with instrument.phase('measurement'):
+                    scan = temperature_scan(T_range, N, J, sinusoidal_field(H_amp, omega),
+                                            tempering_thermalization, period_aligned_steps(omega, measure_steps),
+                                            measures_per_T, ground_state(omega, N, J, H_amp),
+                                            seed=seed, point=(omega,))
+                with instrument.phase('io'):
+                    store.append_rows(field=np.full(scan['energy'].size, H_amp),
+                                      omega=np.full(scan['energy'].size, omega),
+                                      T=np.repeat(T_range, measures_per_T),
+                                      replica=np.tile(np.arange(measures_per_T), len(T_range)),
+                                      **{key: scan[key].ravel() for key in SUMMARY_KEYS + DYNAMIC_KEYS})
+                progress.update()
+    elif mode == "adaptive":
+        T_range, _ = adaptive_grid(
+            point, omegas, T_coarse, measures_per_T,
+            adaptive_points, adaptive_tol, keys=adaptive_keys,
+            workers=workers, seed=seed, on_result=save_point, batch_replicas=batch_replicas,
+            warm_start=warm_start, instrument=instrument,
+            cache=cache, N=N, J=J, H_amp=H_amp,
+            thermalization=thermalization, measure_steps=measure_steps,
+            cluster_range=cluster_range, min_thermalization=min_thermalization,
+            schedule=schedule, histogram_width=histogram_width)
+        store.update_metadata(temperatures=T_range.tolist())
+    else:
+        run_grid(
+            point, omegas, T_range, measures_per_T,
+            workers=workers, seed=seed, on_result=save_point, batch_replicas=batch_replicas,
+            warm_start=warm_start, instrument=instrument,
+            cache=cache, N=N, J=J, H_amp=H_amp,
+            thermalization=thermalization, measure_steps=measure_steps,
+            cluster_range=cluster_range, min_thermalization=min_thermalization,
+            schedule=schedule, histogram_width=histogram_width)
     
-    with open('ising_magnetization_data.json', 'w') as f:
-        json.dump(simulation_data, f)
+    store.update_metadata(instrumentation=instrument.summary())
+    print(instrument.report())
 
 if __name__ == "__main__":
     run_simulation()
\ No newline at end of file
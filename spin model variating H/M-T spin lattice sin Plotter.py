@@ -6,21 +6,23 @@ Created on Thu Dec 12 06:17:59 2024
 """
 
 # magnetization_plotting.py
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
-import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from ising.results import ResultsStore, pivot
+from ising.reweighting import store_curves
 
 def plot_results():
-    # Load simulation data
-    with open('ising_magnetization_data.json', 'r') as f:
-        data = json.load(f)
+    # Load simulation data (only the columns plotted here)
+    store = ResultsStore('ising_magnetization_data.store')
+    data = store.read('omega', 'T', 'abs_magnetization')
     
-    # Extract data
-    T_range = np.array(data['temperatures'])
-    omegas = np.array(data['frequencies'])
-    magnetizations = np.array(data['magnetizations'])
-    mag_stds = np.array(data['magnetization_stds'])
-    M_ground = data['ground_state_magnetization']
+    # Mean and spread over restarts
+    omegas, T_range, magnetizations, mag_stds = pivot(data['omega'], data['T'], data['abs_magnetization'])
+    M_ground = store.metadata['ground_state_magnetization']
     
     # Create plot
     plt.figure(figsize=(12, 8))
@@ -33,6 +35,16 @@ def plot_results():
                     fmt='o-', color=colors[i], label=label,
                     capsize=3, markersize=4, alpha=0.8)
     
+    # Static-field curves reweighted between the simulated temperatures (runs with histograms)
+    T_fine = np.linspace(T_range[T_range > 0].min(), T_range.max(), 400)
+    curves = store_curves(store, 0.0, T_fine)
+    if curves is not None:
+        plt.plot(T_fine, curves['abs_magnetization']/M_ground, '-', color=colors[0],
+                 label='Static field (reweighted)')
+        plt.fill_between(T_fine, (curves['abs_magnetization'] - curves['abs_magnetization_err'])/M_ground,
+                         (curves['abs_magnetization'] + curves['abs_magnetization_err'])/M_ground,
+                         color=colors[0], alpha=0.2)
+    
     # Add critical temperature line
     plt.axvline(x=2.269185, color='gray', linestyle='--', label='Tc')
     
@@ -69,6 +81,68 @@ def plot_results():
     plt.tight_layout()
     plt.savefig('ising_magnetization_plot.png', dpi=300, bbox_inches='tight')
     plt.show()
+    
+    # Per-period response of the driven runs (stores written with ising.dynamics)
+    if 'abs_Q' in store.columns:
+        plot_dynamics(store)
+    
+    if curves is not None:
+        plot_response(store, T_fine, curves)
+
+def plot_response(store, T_fine, curves):
+    """Specific heat and susceptibility per spin in the static field: simulated points and reweighted curves."""
+    data = store.read('omega', 'T', 'specific_heat', 'susceptibility')
+    static = np.asarray(data['omega']) == 0
+    
+    fig, axes = plt.subplots(1, 2, figsize=(16, 7))
+    for ax, key, label in zip(axes, ('specific_heat', 'susceptibility'), ('C per spin', 'χ per spin')):
+        _, T_range, values, stds = pivot(data['omega'][static], data['T'][static], data[key][static])
+        ax.errorbar(T_range, values[0], yerr=stds[0], fmt='o', color='tab:blue',
+                    label='Simulated', capsize=3, markersize=4, alpha=0.8)
+        ax.plot(T_fine, curves[key], '-', color='tab:red', label='Reweighted')
+        ax.fill_between(T_fine, curves[key] - curves[f'{key}_err'], curves[key] + curves[f'{key}_err'],
+                        color='tab:red', alpha=0.2)
+        ax.axvline(x=2.269185, color='gray', linestyle='--', label='Tc')
+        ax.set_xlabel('Temperature (kT/J)', fontsize=12)
+        ax.set_ylabel(label, fontsize=12)
+        ax.grid(True, alpha=0.3)
+        ax.legend()
+    axes[0].set_title('Specific Heat vs Temperature (static field)', fontsize=14)
+    axes[1].set_title('Susceptibility vs Temperature (static field)', fontsize=14)
+    
+    plt.tight_layout()
+    plt.savefig('ising_response_plot.png', dpi=300, bbox_inches='tight')
+    plt.show()
+
+def plot_dynamics(store):
+    """Dynamic order parameter |Q| and hysteresis loop area vs T for each omega > 0."""
+    data = store.read('omega', 'T', 'abs_Q', 'loop_area')
+    driven = np.asarray(data['omega']) > 0
+    if not driven.any():
+        return
+    omegas, T_range, Q, Q_stds = pivot(data['omega'][driven], data['T'][driven], data['abs_Q'][driven])
+    _, _, areas, area_stds = pivot(data['omega'][driven], data['T'][driven], data['loop_area'][driven])
+    
+    fig, (ax_Q, ax_area) = plt.subplots(1, 2, figsize=(16, 7))
+    colors = plt.cm.coolwarm(np.linspace(0.2, 0.8, len(omegas)))
+    for i, omega in enumerate(omegas):
+        ax_Q.errorbar(T_range, Q[i], yerr=Q_stds[i], fmt='o-', color=colors[i],
+                      label=f'ω = {omega:.3f}', capsize=3, markersize=4, alpha=0.8)
+        ax_area.errorbar(T_range, areas[i], yerr=area_stds[i], fmt='o-', color=colors[i],
+                         label=f'ω = {omega:.3f}', capsize=3, markersize=4, alpha=0.8)
+    for ax in (ax_Q, ax_area):
+        ax.axvline(x=2.269185, color='gray', linestyle='--', label='Tc')
+        ax.set_xlabel('Temperature (kT/J)', fontsize=12)
+        ax.grid(True, alpha=0.3)
+        ax.legend()
+    ax_Q.set_ylabel('|Q| (period-averaged m)', fontsize=12)
+    ax_Q.set_title('Dynamic Order Parameter vs Temperature', fontsize=14)
+    ax_area.set_ylabel('Loop area -∮ m dH per spin', fontsize=12)
+    ax_area.set_title('Hysteresis Loop Area vs Temperature', fontsize=14)
+    
+    plt.tight_layout()
+    plt.savefig('ising_dynamic_response_plot.png', dpi=300, bbox_inches='tight')
+    plt.show()
 
 if __name__ == "__main__":
     plot_results()
\ No newline at end of file
@@ -5,9 +5,18 @@ Created on Sat Nov 16 22:48:19 2024
 @author: Salar
 """
 
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
-import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from ising.dynamics import PeriodAccumulator
+from ising.instrument import Instrumentation, Progress
+from ising.lattice import init_lattice
+from ising.metropolis import metropolis_update
+from ising.philox import RandomStream
+from ising.stats import ThermoAccumulator
 
 # Simulation settings
 L = 20  # Size of the lattice (LxL grid)
@@ -19,10 +28,8 @@ T_min = 1.0
 T_max = 5.0
 num_T = 50  # Number of temperature steps
 temperatures = np.linspace(T_min, T_max, num_T)  # Temperature range
-
-# Function to initialize the lattice
-def init_lattice(L, random=False):
-    return np.random.choice([-1, 1], size=(L, L)) if random else np.ones((L, L), dtype=int)
+seed = None  # Fixed integer to make runs reproducible; each (period, T) draws from its own stream
+chunk = 1024  # Steps buffered before the statistics are updated in one vectorized call
 
 # Function to compute the total energy
 def compute_energy(lattice, J, H):
@@ -36,82 +43,96 @@ def compute_energy(lattice, J, H):
     energy -= H * np.sum(lattice)
     return energy
 
-# Metropolis-Hastings algorithm
-def metropolis_step(lattice, T, J, H):
-    L = lattice.shape[0]
-    i, j = np.random.randint(0, L, 2)
-    S = lattice[i, j]
-    neighbors = (
-        lattice[(i + 1) % L, j] +
-        lattice[(i - 1) % L, j] +
-        lattice[i, (j + 1) % L] +
-        lattice[i, (j - 1) % L]
-    )
-    dE = 2 * J * S * neighbors + 2 * H * S
-    if dE <= 0 or np.random.rand() < np.exp(-dE / (k_B * T)):
-        lattice[i, j] *= -1
-        return dE, -2 * S
-    else:
-        return 0, 0
-
 # Function to calculate the total magnetization
 def compute_magnetization(lattice):
     return np.sum(lattice)
 
 # Function to compute the time-dependent field
+# (t is reduced modulo the period so the field repeats exactly and the
+# cached acceptance tables are reused every period)
 def time_dependent_field(t, period):
-    return H_0 * np.sin(2 * np.pi * t / period)
+    return H_0 * np.sin(2 * np.pi * (t % period) / period)
 
 # Simulate magnetization and energy for different field periods and temperatures
 periods = [50, 100, 200]  # Field periods to simulate
 results = {}
 colors = {50: "purple", 100: "green", 200: "red"}  # Field period colors
 
-start_time = time.time()  # Track start time
-
-# Total number of steps in the entire simulation
-total_steps = len(periods) * num_T * num_steps
-
-step_count = 0  # Counter for overall progress
+# Phase timings and acceptance counts; progress is redrawn at most twice a second
+instrument = Instrumentation()
+progress = Progress(len(periods) * num_T * num_steps, desc="Metropolis steps")
 
 for period in periods:
     magnetization_avg = []
     energy_avg = []
+    magnetization_err = []
+    energy_err = []
+    Q_avg = []
+    Q_err = []
+    loop_area = []
+    loop_area_err = []
     for T_idx, T in enumerate(temperatures):
         lattice = init_lattice(L)
-        E = compute_energy(lattice, J, 0)
-        M = compute_magnetization(lattice)
-
-        M_total = 0
-        E_total = 0
-
-        # Loop over time steps
-        for t in range(num_steps):
-            H = time_dependent_field(t, period)
-            dE, dM = metropolis_step(lattice, T, J, H)
-            E += dE
-            M += dM
-            M_total += M
-            E_total += E
-
-            # Update progress display
-            step_count += 1
-            elapsed = time.time() - start_time
-            est_total_time = elapsed / step_count * total_steps
-            print(f"\rTemp: {T:.2f} | {((step_count) / total_steps) * 100:.1f}% Complete | Time: {est_total_time:.1f}s", end="")
-
-        # Average over all time steps
-        M_avg = M_total / (num_steps * L * L)
-        E_avg = E_total / (num_steps * L * L)
-        magnetization_avg.append(M_avg)
-        energy_avg.append(E_avg)
+        rng = RandomStream(seed, point=(period, T))
+        with instrument.phase("observables"):
+            E = compute_energy(lattice, J, 0)
+            M = compute_magnetization(lattice)
+
+        measurements = ThermoAccumulator()
+        # Per field period: Q, hysteresis loop area, harmonics of m(t)
+        dynamics = PeriodAccumulator(period, L * L)
+        accepted = 0
+        H_old = time_dependent_field(0, period)
+        energies = np.empty(chunk)
+        magnetizations = np.empty(chunk)
+
+        # Loop over time steps, feeding the statistics once per chunk
+        with instrument.phase("measurement"):
+            for first in range(0, num_steps, chunk):
+                fields = time_dependent_field(np.arange(first, min(first + chunk, num_steps)), period)
+                for k, H in enumerate(fields):
+                    # E includes -H M, which changes with the field before the step
+                    E -= (H - H_old) * M
+                    H_old = H
+                    dE, dM = metropolis_update(lattice, T, J, H, k_B, rng)
+                    E += dE
+                    M += dM
+                    accepted += dM != 0
+                    energies[k] = E
+                    magnetizations[k] = M
+                measurements.extend(energies[:len(fields)], magnetizations[:len(fields)])
+                dynamics.extend(first, fields, magnetizations[:len(fields)])
+        instrument.count(num_steps, accepted)
+        progress.update(num_steps, info=f"Period: {period} | Temp: {T:.2f}")
+
+        # Average over all time steps, with binning errors
+        with instrument.phase("observables"):
+            summary = measurements.summary(1 / (k_B * T), L * L)
+            response = dynamics.summary()
+        magnetization_avg.append(summary["magnetization"] / (L * L))
+        energy_avg.append(summary["energy"] / (L * L))
+        magnetization_err.append(summary["magnetization_err"] / (L * L))
+        energy_err.append(summary["energy_err"] / (L * L))
+        Q_avg.append(response["abs_Q"])
+        Q_err.append(response["abs_Q_err"])
+        loop_area.append(response["loop_area"])
+        loop_area_err.append(response["loop_area_err"])
 
     results[period] = {
         "temperature": temperatures,
         "magnetization": magnetization_avg,
         "energy": energy_avg,
+        "magnetization_err": magnetization_err,
+        "energy_err": energy_err,
+        "Q": Q_avg,
+        "Q_err": Q_err,
+        "loop_area": loop_area,
+        "loop_area_err": loop_area_err,
     }
 
+progress.close()
+print(instrument.report())
+
 # Plot magnetization vs temperature for different periods
 plt.figure(figsize=(12, 6))
 for period, result in results.items():
@@ -133,3 +154,21 @@ plt.title("Energy vs Temperature for Different Field Periods")
 plt.legend()
 plt.savefig("SinH E-T (S)")
 plt.show()
+
+# Plot the dynamic order parameter and hysteresis loop area vs temperature
+fig, (ax_Q, ax_area) = plt.subplots(1, 2, figsize=(14, 6))
+for period, result in results.items():
+    ax_Q.errorbar(result["temperature"], result["Q"], yerr=result["Q_err"],
+                  label=f"Period = {period}", color=colors[period], capsize=2)
+    ax_area.errorbar(result["temperature"], result["loop_area"], yerr=result["loop_area_err"],
+                     label=f"Period = {period}", color=colors[period], capsize=2)
+ax_Q.set_xlabel("Temperature (T / k_BJ)")
+ax_Q.set_ylabel("|Q| (period-averaged magnetization per spin)")
+ax_Q.set_title("Dynamic Order Parameter vs Temperature")
+ax_Q.legend()
+ax_area.set_xlabel("Temperature (T / k_BJ)")
+ax_area.set_ylabel("Hysteresis loop area -∮ m dH")
+ax_area.set_title("Hysteresis Loop Area vs Temperature")
+ax_area.legend()
+plt.savefig("SinH Q-T (S)")
+plt.show()
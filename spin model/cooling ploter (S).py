@@ -3,23 +3,28 @@
 @author: Salar
 """
 
-import numpy as np
+import os
+import sys
 import matplotlib.pyplot as plt
 
-# Load results from file
-data = np.load('cooling_simulation_results.npz', allow_pickle=True)
-temp_cooling = data['temp_cooling']
-results = data['results'].item()
-energy_results = data['energy_results'].item()
-total_time = data['total_time']
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from ising.results import ResultsStore
+
+# Load results from the store; it holds per-spin values
+store = ResultsStore('cooling_simulation_results.store')
+data = store.read('field', 'T', 'magnetization', 'energy')
+total_time = store.metadata['total_time']
+fields = list(dict.fromkeys(data['field']))
+rows = {field: data['field'] == field for field in fields}
+temp_cooling = data['T'][rows[fields[0]]]
 
 # Display the timing
 print(f"Total simulation time: {total_time:.2f} seconds.")
 
 # Plot magnetization vs temperature
 plt.figure(figsize=(8, 6))
-for field, magnetization in results.items():
-    plt.plot(temp_cooling, magnetization, label=f"H = {field:.2f}")
+for field in fields:
+    plt.plot(data['T'][rows[field]], data['magnetization'][rows[field]], label=f"H = {field:.2f}")
 plt.axhline(0, color='black', linestyle='--', linewidth=0.8)
 plt.gca().invert_xaxis()
 plt.xlabel("Temperature (T / k_BJ)")
@@ -41,8 +46,8 @@ plt.show()
 
 # Plot energy vs temperature
 plt.figure(figsize=(8, 6))
-for field, energy in energy_results.items():
-    plt.plot(temp_cooling, energy, label=f"H = {field:.2f}")
+for field in fields:
+    plt.plot(data['T'][rows[field]], data['energy'][rows[field]], label=f"H = {field:.2f}")
 plt.gca().invert_xaxis()
 plt.xlabel("Temperature (T / k_BJ)")
 plt.ylabel("Energy per spin")
@@ -2,94 +2,104 @@
 @author: Salar
 """
 
+import os
+import sys
 import numpy as np
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from ising.checkerboard import checkerboard_sweep
+from ising.equilibration import EquilibrationDetector
+from ising.lattice import init_lattice
+from ising.metropolis import metropolis_update
+from ising.philox import RandomStream
+from ising.results import POINT_COLUMNS, ResultsStore
+from ising.stats import SUMMARY_KEYS, ThermoAccumulator, per_site
+
 # Simulation parameters
 grid_size = 20
 interaction_strength = 1.0
 boltzmann_const = 1.0
 steps_per_temp = 100000
+min_equilibration = 10000  # Burn-in steps per temperature are detected online
+max_equilibration = 50000  # between these two caps; the rest is averaged
+sweep_mode = "checkerboard"  # "single": one random spin per step, "checkerboard": whole-lattice sweeps
+results_path = "cooling_simulation_results.store"  # columnar results, one row per (field, T)
+seed = None  # Fixed integer to make runs reproducible; each field draws from its own stream
 temp_high = 10.0
 temp_low = 0.1
 cooling_steps = 100
 temp_cooling = np.linspace(temp_high, temp_low, cooling_steps)
 
-# Initialize lattice
-def init_lattice(size, random_spins=False):
-    return (
-        np.random.choice([-1, 1], size=(size, size))
-        if random_spins
-        else np.ones((size, size), dtype=int)
-    )
-
-# Metropolis-Hastings update step
-def metropolis_update(lattice, temp, J, ext_field):
-    size = lattice.shape[0]
-    x, y = np.random.randint(0, size, 2)
-    spin = lattice[x, y]
-    neighbors = (
-        lattice[(x + 1) % size, y]
-        + lattice[(x - 1) % size, y]
-        + lattice[x, (y + 1) % size]
-        + lattice[x, (y - 1) % size]
-    )
-    energy_change = 2 * J * spin * neighbors + 2 * ext_field * spin
-    if energy_change <= 0 or np.random.rand() < np.exp(-energy_change / (boltzmann_const * temp)):
-        lattice[x, y] *= -1
-        return energy_change, -2 * spin
-    return 0, 0
-
 # Compute magnetization
 def calc_magnetization(lattice):
     return np.sum(lattice) / (grid_size ** 2)
 
+# Compute total energy
+def calc_energy(lattice, J, ext_field):
+    return (
+        -J * np.sum(
+            lattice
+            * (
+                np.roll(lattice, 1, axis=0)
+                + np.roll(lattice, -1, axis=0)
+                + np.roll(lattice, 1, axis=1)
+                + np.roll(lattice, -1, axis=1)
+            )
+        )
+        / 2
+        - ext_field * np.sum(lattice)
+    )
+
 # External field values
 field_values = [0.0, 0.1, -0.1]
-results = {}
-energy_results = {}
+
+# One row per (field, temperature): per-spin means, errors and tau_int of every observable
+store = ResultsStore.create(results_path, dict(POINT_COLUMNS, **{key: "<f8" for key in SUMMARY_KEYS}),
+                            metadata={"N": grid_size, "J": interaction_strength, "units": "per_spin",
+                                      "steps_per_temp": steps_per_temp, "sweep_mode": sweep_mode})
+
+# A checkerboard sweep stands in for grid_size**2 single-spin steps
+if sweep_mode == "checkerboard":
+    update, steps_per_update = checkerboard_sweep, grid_size ** 2
+else:
+    update, steps_per_update = metropolis_update, 1
+updates_per_temp = steps_per_temp // steps_per_update
 
 total_simulation_steps = len(field_values) * cooling_steps
 current_step = 0
 start_time = time.time()
 
 for field in field_values:
-    magnetization_data = []
-    energy_data = []
-
-    lattice = init_lattice(grid_size, random_spins=True)
+    rng = RandomStream(seed, point=(field,))
+    lattice = init_lattice(grid_size, random_spins=True, rng=rng)
+    energy = calc_energy(lattice, interaction_strength, field)
+    magnetization = float(np.sum(lattice))
 
     for idx, temp in enumerate(temp_cooling):
-        for _ in range(steps_per_temp):
-            metropolis_update(lattice, temp, interaction_strength, field)
+        measurements = ThermoAccumulator()
+        burn_in = EquilibrationDetector(min_equilibration // steps_per_update,
+                                        max_equilibration // steps_per_update)
+        for _ in range(updates_per_temp):
+            delta_energy, delta_magnetization = update(lattice, temp, interaction_strength, field,
+                                                       boltzmann_const, rng)
+            energy += delta_energy
+            magnetization += delta_magnetization
+            if burn_in.equilibrated:
+                measurements.add(energy, magnetization)
+            else:
+                burn_in.add(energy, abs(magnetization))
 
-        magnetization_data.append(calc_magnetization(lattice))
-        energy = (
-            -interaction_strength * np.sum(
-                lattice
-                * (
-                    np.roll(lattice, 1, axis=0)
-                    + np.roll(lattice, -1, axis=0)
-                    + np.roll(lattice, 1, axis=1)
-                    + np.roll(lattice, -1, axis=1)
-                )
-            )
-            / 2
-            - field * np.sum(lattice)
-        )
-        energy_data.append(energy / (grid_size ** 2))
+        store.append(field=field, omega=0.0, T=temp, replica=0,
+                     **per_site(measurements.summary(1.0 / (boltzmann_const * temp), grid_size ** 2),
+                                grid_size ** 2))
 
         current_step += 1
         percent_complete = (current_step / total_simulation_steps) * 100
         elapsed = time.time() - start_time
         print(f"\rSimulation Progress: {percent_complete:.1f}% | Elapsed: {elapsed:.2f}s", end="")
 
-    results[field] = magnetization_data
-    energy_results[field] = energy_data
-
 total_time = time.time() - start_time
 print(f"\nSimulation completed in {total_time:.2f} seconds.")
-
-# Save results to a file
-np.savez('cooling_simulation_results.npz', temp_cooling=temp_cooling, results=results, energy_results=energy_results, total_time=total_time)
-print("Simulation results saved to 'cooling_simulation_results.npz'.")
+store.update_metadata(total_time=total_time)
+print(f"Simulation results saved to '{results_path}'.")
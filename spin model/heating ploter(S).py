@@ -1,11 +1,17 @@
 
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
-import pickle
 
-# Load results
-with open("ising_results.pkl", "rb") as f:
-    results = pickle.load(f)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from ising.results import ResultsStore
+
+# Load results; the store holds per-spin values
+store = ResultsStore("ising_results.store")
+data = store.read("field", "T", "magnetization", "energy")
+fields = list(dict.fromkeys(data["field"]))
+rows = {field: data["field"] == field for field in fields}
 
 # Define constants
 kB = 1  # Boltzmann constant (in units where k_B = 1)
@@ -30,8 +36,8 @@ mag_analytical = analytical_magnetization(temp_analytical)
 
 # Magnetization plot with analytical comparison
 plt.figure(figsize=(8, 6))
-for field, data in results.items():
-    plt.plot(data["temp"], data["magnetization"], label=f"Simulated: H = {field:.2f}")
+for field in fields:
+    plt.plot(data["T"][rows[field]], data["magnetization"][rows[field]], label=f"Simulated: H = {field:.2f}")
 plt.plot(temp_analytical, mag_analytical, 'k--', label="Analytical")
 plt.axhline(0, color='black', linestyle='--', linewidth=0.8)
 plt.xlabel("Temperature (T / k_BJ)")
@@ -43,8 +49,8 @@ plt.show()
 
 # Energy plot
 plt.figure(figsize=(8, 6))
-for field, data in results.items():
-    plt.plot(data["temp"], data["energy"], label=f"H = {field:.2f}")
+for field in fields:
+    plt.plot(data["T"][rows[field]], data["energy"][rows[field]], label=f"H = {field:.2f}")
 plt.xlabel("Temperature (T / k_BJ)")
 plt.ylabel("Energy per spin")
 plt.title("Energy vs Temperature for Various Fields")
@@ -4,15 +4,39 @@
 @author: Salar
 """
 
+import argparse
+import os
+import sys
 import numpy as np
-import pickle
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from ising.checkerboard import checkerboard_sweep
+from ising.checkpoint import RNG_FIELDS, Checkpoint, get_rng_state, set_rng_state
+from ising.equilibration import EquilibrationDetector
+from ising.lattice import SPIN_DTYPE, init_lattice
+from ising.metropolis import metropolis_update
+from ising.philox import RandomStream
+from ising.results import POINT_COLUMNS, ResultsStore
+from ising.stats import SUMMARY_KEYS, ThermoAccumulator, per_site
+
 # Simulation parameters
 grid_size = 20  # Grid dimensions (grid_size x grid_size)
 interaction_strength = 1.0  # Interaction strength (rescaled units)
 boltzmann_const = 1.0  # Boltzmann constant (rescaled units)
 steps_per_temp = 1000000  # Simulation steps per temperature
+min_equilibration = 50000  # Burn-in steps per temperature are detected online
+max_equilibration = 500000  # between these two caps, then the rest is measured
+sweep_mode = "checkerboard"  # "single": one random spin per step, "checkerboard": whole-lattice sweeps
+results_path = "ising_results.store"  # columnar results, one row per (field, T)
+checkpoint_file = "heating_checkpoint.npy"  # memory-mapped lattice, RNG and accumulator state
+checkpoint_interval = 60.0  # Seconds between checkpoints
+seed = None  # Fixed integer to make runs reproducible; each field draws from its own stream
+
+# Pass --resume to continue from the last checkpoint instead of starting over
+parser = argparse.ArgumentParser()
+parser.add_argument("--resume", action="store_true")
+args, _ = parser.parse_known_args()
 
 # Critical temperature for the 2D Ising model in rescaled units
 critical_temp = 2.0 / np.log(1 + np.sqrt(2))  # ~2.269185
@@ -23,15 +47,6 @@ temp_max = 5.0
 temp_steps_count = 50
 temp_steps = np.linspace(temp_min, temp_max, temp_steps_count)
 
-# Initialize lattice spins
-def init_lattice(size, random_spins=False):
-    # Create a lattice with either random spins or all +1
-    return (
-        np.random.choice([-1, 1], size=(size, size))
-        if random_spins
-        else np.ones((size, size), dtype=int)
-    )
-
 # Compute total energy of the lattice
 def compute_energy(lattice, J, ext_field):
     total_energy = 0
@@ -44,23 +59,6 @@ def compute_energy(lattice, J, ext_field):
     total_energy -= ext_field * np.sum(lattice)
     return total_energy
 
-# Metropolis-Hastings update step
-def metropolis_update(lattice, temp, J, ext_field):
-    size = lattice.shape[0]
-    x, y = np.random.randint(0, size, 2)
-    spin = lattice[x, y]
-    neighbors = (
-        lattice[(x + 1) % size, y]
-        + lattice[(x - 1) % size, y]
-        + lattice[x, (y + 1) % size]
-        + lattice[x, (y - 1) % size]
-    )
-    energy_change = 2 * J * spin * neighbors + 2 * ext_field * spin
-    if energy_change <= 0 or np.random.rand() < np.exp(-energy_change / (boltzmann_const * temp)):
-        lattice[x, y] *= -1
-        return energy_change, -2 * spin
-    return 0, 0
-
 # Calculate total magnetization
 def calc_magnetization(lattice):
     return np.sum(lattice)
@@ -68,47 +66,99 @@ def calc_magnetization(lattice):
 # External field values for testing
 field_values = [0.0, 0.1, -0.1]
 
-# Simulation results
-results = {}
-
-for field in field_values:
-    magnetization_data = []
-    energy_data = []
+# A checkerboard sweep stands in for grid_size**2 single-spin steps
+if sweep_mode == "checkerboard":
+    update, steps_per_update = checkerboard_sweep, grid_size ** 2
+else:
+    update, steps_per_update = metropolis_update, 1
+updates_per_temp = steps_per_temp // steps_per_update
+
+# Checkpoint layout; "step" is the next update to run at (field_idx, temp_idx)
+# and "rows" the number of results already in the store
+checkpoint = Checkpoint(checkpoint_file, dict(
+    RNG_FIELDS,
+    lattice=(SPIN_DTYPE, (grid_size, grid_size)),
+    field_idx=(np.int64, ()),
+    temp_idx=(np.int64, ()),
+    step=(np.int64, ()),
+    energy=(np.float64, ()),
+    magnetization=(np.float64, ()),
+    accumulator=(np.float64, (ThermoAccumulator().state_size,)),
+    detector=(np.float64, (EquilibrationDetector.STATE_SIZE,)),
+    rows=(np.int64, ()),
+))
+state = checkpoint.load() if args.resume else None
+
+# Simulation results: one row per (field, temperature), appended as each finishes
+if state is not None:
+    store = ResultsStore(results_path)
+    store.truncate(int(state["rows"]))
+    print(f"Resuming at field {int(state['field_idx'])}, temperature {int(state['temp_idx'])}, step {int(state['step'])}")
+else:
+    store = ResultsStore.create(results_path, dict(POINT_COLUMNS, **{key: "<f8" for key in SUMMARY_KEYS}),
+                                metadata={"N": grid_size, "J": interaction_strength, "Tc": critical_temp,
+                                          "units": "per_spin", "steps_per_temp": steps_per_temp, "sweep_mode": sweep_mode})
+last_checkpoint = time.time()
+
+for field_idx, field in enumerate(field_values):
+    if state is not None and field_idx < state["field_idx"]:
+        continue
 
     # Initialize lattice
-    lattice = init_lattice(grid_size, random_spins=(field < 0))
-    energy = compute_energy(lattice, interaction_strength, field)
-    magnetization = calc_magnetization(lattice)
+    rng = RandomStream(seed, point=(field,))
+    if state is not None:
+        lattice = state["lattice"].copy()
+        energy = float(state["energy"])
+        magnetization = float(state["magnetization"])
+    else:
+        lattice = init_lattice(grid_size, random_spins=(field < 0), rng=rng)
+        energy = compute_energy(lattice, interaction_strength, field)
+        magnetization = calc_magnetization(lattice)
 
     print(f"\nSimulating for field H = {field:.2f}")
     start = time.time()
 
     for idx, temp in enumerate(temp_steps):
-        total_energy = 0
-        total_magnetization = 0
-
-        for _ in range(steps_per_temp):
-            delta_energy, delta_magnetization = metropolis_update(lattice, temp, interaction_strength, field)
+        measurements = ThermoAccumulator()
+        burn_in = EquilibrationDetector(min_equilibration // steps_per_update,
+                                        max_equilibration // steps_per_update)
+        first_step = 0
+        if state is not None:
+            if idx < state["temp_idx"]:
+                continue
+            measurements.set_state(state["accumulator"])
+            burn_in.set_state(state["detector"])
+            first_step = int(state["step"])
+            set_rng_state(rng, state)
+            state = None
+
+        for step in range(first_step, updates_per_temp):
+            delta_energy, delta_magnetization = update(lattice, temp, interaction_strength, field,
+                                                       boltzmann_const, rng)
             energy += delta_energy
             magnetization += delta_magnetization
-            total_energy += energy
-            total_magnetization += magnetization
-
-        avg_energy = total_energy / steps_per_temp / (grid_size ** 2)
-        avg_magnetization = total_magnetization / steps_per_temp / (grid_size ** 2)
-        energy_data.append(avg_energy)
-        magnetization_data.append(avg_magnetization)
+            if burn_in.equilibrated:
+                measurements.add(energy, magnetization)
+            else:
+                burn_in.add(energy, abs(magnetization))
+
+            if step % 1000 == 999 and time.time() - last_checkpoint > checkpoint_interval:
+                checkpoint.save(lattice=lattice, field_idx=field_idx, temp_idx=idx, step=step + 1,
+                                energy=energy, magnetization=magnetization,
+                                accumulator=measurements.get_state(), detector=burn_in.get_state(),
+                                rows=len(store),
+                                **get_rng_state(rng))
+                last_checkpoint = time.time()
+
+        # Per-spin means with binning errors, C and chi
+        store.append(field=field, omega=0.0, T=temp, replica=0,
+                     **per_site(measurements.summary(1.0 / (boltzmann_const * temp), grid_size ** 2),
+                                grid_size ** 2))
 
         # Progress feedback
         elapsed = time.time() - start
         est_total_time = elapsed / (idx + 1) * temp_steps_count
         print(f"\rTemp: 0 to 5 | {((idx + 1) / temp_steps_count) * 100:.1f}% Complete | Time: {est_total_time:.1f}s", end="")
 
-    results[field] = {"temp": temp_steps, "magnetization": magnetization_data, "energy": energy_data}
-
-# Save results to a file
-output_file = "ising_results.pkl"
-with open(output_file, "wb") as f:
-    pickle.dump(results, f)
-
-print(f"\nSimulation results saved to {output_file}")
+checkpoint.remove()
+print(f"\nSimulation results saved to {results_path}")
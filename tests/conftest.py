@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures: the repository root on ``sys.path`` (as the scripts do)
+and exact canonical averages of a small lattice by enumeration.
+"""
+
+# conftest.py
+import itertools
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+
+@pytest.fixture(scope="session")
+def all_states():
+    """
+    states(N, J, H) -> (E, M) of every one of the 2**(N*N) states of an
+    N x N periodic lattice (N <= 4), E including the -H M term.
+    """
+    spins = {}
+
+    def states(N, J, H):
+        if N not in spins:
+            configurations = np.array(list(itertools.product((-1, 1), repeat=N * N)), dtype=np.int8)
+            spins[N] = configurations.reshape(-1, N, N)
+        lattices = spins[N].astype(np.int64)
+        bonds = (lattices * (np.roll(lattices, 1, axis=1) + np.roll(lattices, 1, axis=2))).sum(axis=(1, 2))
+        M = lattices.sum(axis=(1, 2))
+        return -J * bonds - H * M, M
+
+    return states
+
+
+@pytest.fixture(scope="session")
+def exact_averages(all_states):
+    """
+    exact(N, J, H, T) -> dict of the canonical energy, abs_magnetization
+    (lattice totals), specific_heat and susceptibility per site of an N x N
+    periodic lattice, by enumerating all 2**(N*N) states (N <= 4).
+    """
+    def exact(N, J, H, T):
+        E, M = all_states(N, J, H)
+        weights = np.exp(-(E - E.min()) / T)
+        weights /= weights.sum()
+        energy = weights @ E
+        abs_magnetization = weights @ np.abs(M)
+        return {"energy": energy, "abs_magnetization": abs_magnetization,
+                "specific_heat": (weights @ E ** 2 - energy ** 2) / T ** 2 / (N * N),
+                "susceptibility": (weights @ M ** 2 - abs_magnetization ** 2) / T / (N * N)}
+
+    return exact
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Bit-packed lattice against the int8 kernels."""
+
+# test_bitpacked.py
+import numpy as np
+
+from ising import bitpacked, kernels
+from ising.lattice import init_lattice
+from ising.philox import RandomStream, new_stream
+from ising.stats import ThermoAccumulator
+
+N = 64
+J = 1.0
+H = 0.2
+
+
+def test_observables_match_int8_lattice():
+    lattice = init_lattice(N, random_spins=True, rng=RandomStream(0))
+    words = bitpacked.pack(lattice)
+    assert np.array_equal(bitpacked.unpack(words), lattice)
+    assert bitpacked.calculate_total_energy(words, J, H) == kernels.calculate_total_energy(lattice, J, H)
+    assert bitpacked.calculate_magnetization(words) == kernels.calculate_magnetization(lattice)
+
+
+def test_sweep_returns_observable_changes():
+    words = bitpacked.pack(init_lattice(N, random_spins=True, rng=RandomStream(1)))
+    stream = new_stream(1)
+    for T in (1.5, 2.3, 4.0):
+        E = bitpacked.calculate_total_energy(words, J, H)
+        M = bitpacked.unpack(words).sum()
+        before = words.copy()
+        dE, dM, accepted, attempts = bitpacked.metropolis_step(words, 1 / T, J, H, stream)
+        assert np.isclose(bitpacked.calculate_total_energy(words, J, H), E + dE)
+        assert bitpacked.unpack(words).sum() == M + dM
+        assert accepted == np.sum(bitpacked.unpack(before) != bitpacked.unpack(words))
+        assert attempts == N * N
+
+
+def mean_energy(step, lattice, T, sweeps=2000, burn_in=200):
+    """Mean and binning error of E over ``sweeps`` after ``burn_in``, from the sweep's dE."""
+    stream = new_stream(7, (T,))
+    packed = lattice.dtype == np.uint64
+    E = (bitpacked if packed else kernels).calculate_total_energy(lattice, J, H)
+    measurements = ThermoAccumulator()
+    for sweep in range(burn_in + sweeps):
+        E += step(lattice, 1 / T, J, H, stream)[0]
+        if sweep >= burn_in:
+            measurements.add(E, 0.0)
+    summary = measurements.summary(1 / T, N * N)
+    return summary["energy"], summary["energy_err"]
+
+
+def test_equilibrium_energy_matches_int8_kernel():
+    for T in (1.8, 3.0):
+        packed, packed_err = mean_energy(bitpacked.metropolis_step, bitpacked.new_lattice(N), T)
+        plain, plain_err = mean_energy(kernels.metropolis_step, np.ones((N, N), dtype=np.int8), T)
+        assert abs(packed - plain) < 5 * np.hypot(packed_err, plain_err)
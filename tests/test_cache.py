@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Result cache: keys follow exactly the inputs that determine a point."""
+
+# test_cache.py
+import os
+
+import numpy as np
+
+from ising.cache import ResultCache, cache_key
+from ising.sweep import energy_point, run_grid
+
+PARAMS = dict(N=6, J=1.0, H_amp=0.1, thermalization=30, measure_steps=100)
+calls = []
+
+
+def counted_point(omega, T, stream, **params):
+    calls.append(float(T))
+    return energy_point(omega, T, stream, **params)
+
+
+def grid(cache, T_range, seed=3, **params):
+    calls.clear()
+    result = run_grid(counted_point, [0.0], np.array(T_range), 2, workers=1, seed=seed,
+                      cache=cache, **dict(PARAMS, **params))
+    return result, sorted(set(calls))
+
+
+def test_cache_key_is_exact_and_order_free():
+    key = cache_key(point="energy_point", T=2.0, stream=(1, 2), N=8)
+    assert key == cache_key(N=np.int64(8), stream=[1, 2], T=np.float64(2.0), point="energy_point")
+    assert key != cache_key(point="energy_point", T=2.0 + 1e-12, stream=(1, 2), N=8)
+    assert key != cache_key(point="energy_point", T=2.0, stream=(1, 3), N=8)
+    assert key != cache_key(point="energy_point", T=2.0, stream=(1, 2), N=8, J=1.0)
+
+
+def test_grid_runs_only_new_points(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    first, ran = grid(cache, [2.0, 3.0])
+    assert ran == [2.0, 3.0]
+    again, ran = grid(cache, [2.0, 3.0])
+    assert ran == []
+    assert np.array_equal(again["energy"], first["energy"])
+    extended, ran = grid(cache, [2.0, 2.5, 3.0])
+    assert ran == [2.5]
+    assert np.array_equal(extended["energy"][:, [0, 2]], first["energy"])
+    # Any parameter, and the seed, is part of the key
+    assert grid(cache, [2.0], measure_steps=120)[1] == [2.0]
+    assert grid(cache, [2.0], seed=4)[1] == [2.0]
+    # Without a seed nothing is reused
+    assert grid(cache, [2.0], seed=None)[1] == [2.0]
+    assert grid(cache, [2.0], seed=None)[1] == [2.0]
+
+
+def test_warm_started_points_depend_on_the_chain_before_them(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    first, ran = grid(cache, [2.0, 3.0], warm_start="ascending")
+    assert ran == [2.0, 3.0]
+    assert grid(cache, [2.0, 3.0], warm_start="ascending")[1] == []
+    # A chain with a new point at its end reruns from the start (the lattice
+    # is not cached) and reproduces the points it shares
+    extended, ran = grid(cache, [2.0, 3.0, 3.5], warm_start="ascending")
+    assert ran == [2.0, 3.0, 3.5]
+    assert np.array_equal(extended["energy"][:, :2], first["energy"])
+    assert grid(cache, [2.0, 3.0], warm_start="ascending")[1] == []
+    # A new point in front changes the start of every point after it
+    assert grid(cache, [1.5, 2.0, 3.0], warm_start="ascending")[1] == [1.5, 2.0, 3.0]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=1000)
+    summary = {"energy": 1.0, "energy_err": 0.1}
+    for k in range(40):
+        cache.put(cache_key(k=k), summary)
+    names = os.listdir(str(tmp_path))
+    assert sum(os.path.getsize(os.path.join(str(tmp_path), name)) for name in names) <= 1000
+    assert cache.get(cache_key(k=39)) == summary
+    assert cache.get(cache_key(k=0)) is None
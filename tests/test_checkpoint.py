@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Checkpoint/resume: a resumed run continues the interrupted chain exactly."""
+
+# test_checkpoint.py
+import numpy as np
+import pytest
+
+from ising.checkpoint import RNG_FIELDS, Checkpoint, get_rng_state, set_rng_state
+from ising.equilibration import EquilibrationDetector
+from ising.kernels import calculate_total_energy
+from ising.lattice import SPIN_DTYPE, init_lattice
+from ising.metropolis import metropolis_update
+from ising.philox import RandomStream
+from ising.stats import ThermoAccumulator
+
+N = 6
+T = 2.5
+J = 1.0
+H = 0.1
+STEPS = 4000
+
+
+def layout():
+    return dict(RNG_FIELDS, lattice=(SPIN_DTYPE, (N, N)), step=(np.int64, ()),
+                energy=(np.float64, ()), magnetization=(np.float64, ()),
+                accumulator=(np.float64, (ThermoAccumulator().state_size,)),
+                detector=(np.float64, (EquilibrationDetector.STATE_SIZE,)))
+
+
+def run(checkpoint=None, stop=None):
+    """Single-spin chain as the heating scan runs it; resumes from ``checkpoint`` if it holds a slot."""
+    rng = RandomStream(11, point=(H,))
+    lattice = init_lattice(N, random_spins=True, rng=rng)
+    energy = calculate_total_energy(lattice, J, H)
+    magnetization = float(lattice.sum())
+    measurements = ThermoAccumulator()
+    burn_in = EquilibrationDetector(200, 1000)
+    first = 0
+    state = checkpoint.load() if checkpoint is not None else None
+    if state is not None:
+        lattice = state["lattice"].copy()
+        energy, magnetization = float(state["energy"]), float(state["magnetization"])
+        measurements.set_state(state["accumulator"])
+        burn_in.set_state(state["detector"])
+        set_rng_state(rng, state)
+        first = int(state["step"])
+    for step in range(first, STEPS):
+        if step == stop:
+            checkpoint.save(lattice=lattice, step=step, energy=energy,
+                            magnetization=magnetization, accumulator=measurements.get_state(),
+                            detector=burn_in.get_state(), **get_rng_state(rng))
+            return None
+        dE, dM = metropolis_update(lattice, T, J, H, rng=rng)
+        energy += dE
+        magnetization += dM
+        if burn_in.equilibrated:
+            measurements.add(energy, magnetization)
+        else:
+            burn_in.add(energy, abs(magnetization))
+    return lattice, measurements.summary(1 / T, N * N)
+
+
+def test_resume_continues_the_chain(tmp_path):
+    path = str(tmp_path / "run.npy")
+    lattice, summary = run()
+    for stop in (150, 2500):
+        assert run(Checkpoint(path, layout()), stop=stop) is None
+        # A new process reopens the file
+        resumed_lattice, resumed = run(Checkpoint(path, layout()))
+        assert np.array_equal(resumed_lattice, lattice)
+        assert resumed == summary
+
+
+def test_interrupted_save_falls_back_to_the_previous_slot(tmp_path):
+    path = str(tmp_path / "run.npy")
+    checkpoint = Checkpoint(path, {"step": (np.int64, ())})
+    assert checkpoint.load() is None
+    checkpoint.save(step=1)
+    checkpoint.save(step=2)
+    assert checkpoint.load()["step"] == 2
+    # A save preempted after clearing its slot's sequence number
+    record = np.lib.format.open_memmap(path, mode="r+")
+    record["sequence"][np.argmax(record["sequence"])] = 0
+    record.flush()
+    assert Checkpoint(path, {"step": (np.int64, ())}).load()["step"] == 1
+
+
+def test_layout_must_match(tmp_path):
+    path = str(tmp_path / "run.npy")
+    Checkpoint(path, {"step": (np.int64, ())}).save(step=1)
+    with pytest.raises(ValueError):
+        Checkpoint(path, {"step": (np.int32, ())}).load()
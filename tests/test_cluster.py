@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Wolff moves against exact enumeration of a 4 x 4 lattice."""
+
+# test_cluster.py
+import numpy as np
+import pytest
+
+from ising.driver import drive
+from ising.kernels import calculate_total_energy
+from ising.philox import new_stream
+from ising.stats import StreamingObservable
+from ising.sweep import energy_point
+
+N = 4
+
+
+def sample_energy(T, J, H, steps, seed=0):
+    """Mean and binning error of E after ``steps`` Wolff calls (10% burn-in dropped)."""
+    lattice = np.ones((N, N), dtype=np.int8)
+    fields = np.full(steps, H)
+    energies = np.empty(steps)
+    magnetizations = np.empty(steps, dtype=np.int64)
+    drive(lattice, 1 / T, J, fields, H, calculate_total_energy(lattice, J, H), N * N,
+          energies, magnetizations, new_stream(seed), True, 0, 0)
+    energy = StreamingObservable()
+    energy.extend(energies[steps // 10:])
+    return energy.mean, energy.error
+
+
+@pytest.mark.parametrize("T, H", [(2.0, 0.0), (2.0, 0.1), (2.5, 0.3)])
+def test_wolff_samples_the_canonical_energy(exact_averages, T, H):
+    mean, error = sample_energy(T, 1.0, H, 400000)
+    assert abs(mean - exact_averages(N, 1.0, H, T)["energy"]) < 5 * error + 1e-3 * N * N
+
+
+def test_driven_points_keep_metropolis_sweeps():
+    # One Wolff cluster per field step would make the drive period meaningless
+    params = dict(N=6, J=1.0, H_amp=0.1, thermalization=50, measure_steps=300)
+    stream = new_stream(2, (0.1, 2.3))
+    driven = energy_point(0.1, 2.3, stream, cluster_range=(2.0, 2.5), **params)
+    assert driven == energy_point(0.1, 2.3, stream, **params)
+    static = energy_point(0.0, 2.3, stream, cluster_range=(2.0, 2.5), **params)
+    assert static != energy_point(0.0, 2.3, stream, **params)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Compiled drivers: acceptance counted by the kernels themselves."""
+
+# test_driver.py
+import numpy as np
+import pytest
+
+from ising.driver import drive, drive_checkerboard, drive_padded, drive_replicas
+from ising.halo import SCHEDULES, TILE, calculate_total_energy_padded, pad
+from ising.philox import new_stream, new_streams
+
+N = 8
+SWEEPS = 20
+
+
+def run(driver, spins, beta, *options, H=0.1):
+    """(accepted, attempts) of SWEEPS sweeps, every one sampled."""
+    fields = np.full(SWEEPS, H)
+    energies = np.empty(SWEEPS)
+    magnetizations = np.empty(SWEEPS, dtype=np.int64)
+    M = int(np.sum(spins[..., 1:-1, 1:-1])) if spins.shape[-1] == N + 2 else int(np.sum(spins))
+    return driver(spins, beta, 1.0, fields, H, 0.0, M, energies, magnetizations, *options, 0, 1)[-2:]
+
+
+@pytest.mark.parametrize("schedule", ["random", "sequential", "tiled"])
+def test_every_attempt_counts_at_infinite_temperature(schedule):
+    # Every proposal is accepted at beta = 0; random sites revisited within
+    # a sweep used to count as unflipped
+    padded = pad(np.ones((N, N), dtype=np.int8))
+    accepted, attempts = run(drive_padded, padded, 0.0, new_stream(0), SCHEDULES[schedule], TILE)
+    assert attempts == SWEEPS * N * N
+    assert accepted == attempts
+
+
+def test_checkerboard_and_plain_counts_at_infinite_temperature():
+    accepted, attempts = run(drive_checkerboard, pad(np.ones((N, N), dtype=np.int8)), 0.0,
+                             new_stream(0), TILE)
+    assert accepted == attempts == SWEEPS * N * N
+    accepted, attempts = run(drive, np.ones((N, N), dtype=np.int8), 0.0, new_stream(0), False)
+    assert accepted == attempts == SWEEPS * N * N
+
+
+def test_replica_counts_add_up_to_the_single_runs():
+    streams = new_streams(3, (0.0, 2.5), range(4))
+    stack = pad(np.ones((4, N, N), dtype=np.int8))
+    fields = np.full(SWEEPS, 0.1)
+    energies = np.empty((4, SWEEPS))
+    magnetizations = np.empty((4, SWEEPS), dtype=np.int64)
+    E = np.array([calculate_total_energy_padded(p, 1.0, 0.1) for p in stack])
+    M = np.full(4, N * N, dtype=np.int64)
+    accepted, attempts = drive_replicas(stack, 0.4, 1.0, fields, 0.1, E, M, energies,
+                                        magnetizations, streams.copy(), 0, TILE, 0, 1)
+    single = [run(drive_padded, pad(np.ones((N, N), dtype=np.int8)), 0.4, stream.copy(), 0, TILE)
+              for stream in streams]
+    assert accepted == sum(a for a, _ in single)
+    assert attempts == sum(t for _, t in single)
+    assert 0 < accepted < attempts
+
+
+def test_wolff_counts_cluster_sites():
+    # With H = 0 every grown cluster is flipped
+    accepted, attempts = run(drive, np.ones((N, N), dtype=np.int8), 0.4, new_stream(0), True,
+                             H=0.0)
+    assert accepted == attempts > 0
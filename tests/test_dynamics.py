@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Per-period response of a known sinusoidal magnetization."""
+
+# test_dynamics.py
+import numpy as np
+
+from ising.dynamics import PeriodAccumulator
+
+PERIOD = 400
+PERIODS = 12
+N_SITES = 64
+H_AMP = 0.5
+Q0, AMPLITUDE, LAG = 0.3, 0.4, 0.6
+
+
+def response(noise=0.0, seed=0):
+    """(t, H, M): m(t) = Q0 + AMPLITUDE sin(wt - LAG) under H = H_AMP sin(wt), as lattice totals."""
+    t = np.arange(PERIODS * PERIOD)
+    phase = 2 * np.pi * t / PERIOD
+    m = Q0 + AMPLITUDE * np.sin(phase - LAG) + np.random.default_rng(seed).normal(0.0, noise, len(t))
+    return t, H_AMP * np.sin(phase), m * N_SITES
+
+
+def test_q_and_loop_area_of_a_lagging_sinusoid():
+    accumulator = PeriodAccumulator(PERIOD, N_SITES)
+    for t, H, M in zip(*response()):
+        accumulator.add(t, H, M)
+    summary = accumulator.summary()
+    # The first period starts from no previous sample and the last never closes
+    assert summary["periods"] == PERIODS - 2
+    assert np.isclose(summary["Q"], Q0)
+    assert np.isclose(summary["m_in_phase"], AMPLITUDE * np.cos(LAG))
+    assert np.isclose(summary["m_out_of_phase"], AMPLITUDE * np.sin(LAG))
+    # -closed integral of m dH = pi H_amp A sin(lag), up to O(1/period)
+    assert np.isclose(summary["loop_area"], np.pi * H_AMP * AMPLITUDE * np.sin(LAG), rtol=2e-2)
+    assert summary["Q_err"] < 1e-12
+
+
+def test_noisy_response_errors_cover_the_truth():
+    t, H, M = response(noise=0.2, seed=3)
+    streamed = PeriodAccumulator(PERIOD, N_SITES)
+    for args in zip(t, H, M):
+        streamed.add(*args)
+    batched = PeriodAccumulator(PERIOD, N_SITES)
+    batched.extend(t[0], H[:1000], M[:1000])
+    batched.extend(t[1000], H[1000:], M[1000:])
+    summary = batched.summary()
+    for name in ("Q", "loop_area"):
+        assert np.isclose(summary[name], streamed.summary()[name])
+    assert 0 < summary["Q_err"] < 0.01
+    assert abs(summary["Q"] - Q0) < 5 * summary["Q_err"]
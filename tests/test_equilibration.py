@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Equilibration cutoff on synthetic relaxing, stationary and drifting series."""
+
+# test_equilibration.py
+import numpy as np
+import pytest
+
+from ising.equilibration import EquilibrationDetector
+
+TAU = 1000
+STEPS = 20000
+
+
+def relaxing_series(seed):
+    """E and |M| relaxing exponentially (time constant TAU) onto stationary noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(STEPS)
+    E = -2.0 + 1.5 * np.exp(-t / TAU) + rng.normal(0.0, 0.1, STEPS)
+    abs_M = 0.9 - 0.8 * np.exp(-t / TAU) + rng.normal(0.0, 0.05, STEPS)
+    return E, abs_M
+
+
+def cutoff(E, abs_M, min_sweeps=200, max_sweeps=STEPS):
+    """Samples fed to a detector (window 100) up to and including the one it stops at."""
+    detector = EquilibrationDetector(min_sweeps, max_sweeps, window=100)
+    for E_k, abs_M_k in zip(E, abs_M):
+        if detector.add(E_k, abs_M_k):
+            break
+    return detector.sweeps
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_cutoff_follows_the_relaxation(seed):
+    # One TAU in, the windowed means still drift by several noise widths
+    # per window; after four the drift is far below the noise
+    sweeps = cutoff(*relaxing_series(seed))
+    assert TAU < sweeps < 4 * TAU
+
+
+def test_extend_stops_where_add_does():
+    E, abs_M = relaxing_series(0)
+    detector = EquilibrationDetector(200, STEPS, window=100)
+    assert detector.extend(E, abs_M) == cutoff(E, abs_M)
+    assert detector.equilibrated
+
+
+def test_stationary_series_stops_at_the_minimum():
+    rng = np.random.default_rng(1)
+    E, abs_M = rng.normal(-2.0, 0.1, STEPS), rng.normal(0.9, 0.05, STEPS)
+    # The first window comparison allowed is the one closing at min_sweeps;
+    # a stationary chain passes it or one of the next few
+    assert 500 <= cutoff(E, abs_M, min_sweeps=500) <= 1000
+
+
+def test_steady_drift_is_cut_at_the_maximum():
+    rng = np.random.default_rng(2)
+    t = np.arange(STEPS)
+    E = -2.0 + 1e-3 * t + rng.normal(0.0, 0.1, STEPS)
+    assert cutoff(E, np.full(STEPS, 0.5), max_sweeps=5000) == 5000
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Multithreaded checkerboard sweeps: thread-count independence and equilibrium."""
+
+# test_halo.py
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from ising.halo import calculate_total_energy_padded, metropolis_step_checkerboard, pad
+from ising.kernels import calculate_total_energy, metropolis_step
+from ising.philox import new_stream
+from ising.stats import ThermoAccumulator
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+SCRIPT = """
+import numpy as np
+from ising.halo import interior, metropolis_step_checkerboard, pad
+from ising.philox import new_stream
+padded = pad(np.ones((32, 32), dtype=np.int8))
+stream = new_stream(5)
+totals = np.zeros(4)
+for k in range(30):
+    totals += metropolis_step_checkerboard(padded, 1 / (1.5 + 0.05 * k), 1.0, 0.1, stream, 4)
+print(interior(padded).tobytes().hex(), repr(float(totals[0])), *totals[1:].astype(int), *stream)
+"""
+
+
+def checkerboard_run(threads):
+    """SCRIPT's output: 8 row blocks per colour on ``threads`` numba threads."""
+    env = dict(os.environ, NUMBA_NUM_THREADS=str(threads))
+    result = subprocess.run([sys.executable, "-c", SCRIPT], capture_output=True, text=True,
+                            cwd=os.path.abspath(ROOT), env=env, check=True)
+    return result.stdout.split()
+
+
+def test_threaded_sweeps_match_one_thread():
+    serial = checkerboard_run(1)
+    threaded = checkerboard_run(4)
+    # Lattice, dM, accepted, attempts and the stream agree exactly; dE up to
+    # the order the threads' partial sums are added in
+    assert threaded[0] == serial[0]
+    assert threaded[2:] == serial[2:]
+    assert np.isclose(float(threaded[1]), float(serial[1]))
+
+
+def mean_energy(step, lattice, energy, T, sweeps=4000, burn_in=400):
+    """Mean and binning error of E from the sweep's dE."""
+    stream = new_stream(9, (T,))
+    E = energy(lattice, 1.0, 0.0)
+    measurements = ThermoAccumulator()
+    for sweep in range(burn_in + sweeps):
+        E += step(lattice, 1 / T, 1.0, 0.0, stream)[0]
+        if sweep >= burn_in:
+            measurements.add(E, 0.0)
+    summary = measurements.summary(1 / T, 16 * 16)
+    return summary["energy"], summary["energy_err"]
+
+
+def test_checkerboard_samples_the_serial_equilibrium():
+    for T in (1.8, 3.0):
+        padded = pad(np.ones((16, 16), dtype=np.int8))
+        board, board_err = mean_energy(lambda *args: metropolis_step_checkerboard(*args, 4), padded,
+                                       calculate_total_energy_padded, T)
+        serial, serial_err = mean_energy(metropolis_step, np.ones((16, 16), dtype=np.int8),
+                                         calculate_total_energy, T)
+        assert abs(board - serial) < 5 * np.hypot(board_err, serial_err)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Instrumentation: counters, merging, and no numba for the pure-Python scripts."""
+
+# test_instrument.py
+import os
+import subprocess
+import sys
+
+from ising.instrument import Instrumentation
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+
+def test_script_imports_leave_numba_unloaded():
+    # What the pure-Python scripts import, plus a RandomStream draw
+    script = ("import sys\n"
+              "from ising.checkerboard import checkerboard_sweep\n"
+              "from ising.checkpoint import Checkpoint\n"
+              "from ising.dynamics import PeriodAccumulator\n"
+              "from ising.equilibration import EquilibrationDetector\n"
+              "from ising.instrument import Instrumentation, Progress\n"
+              "from ising.lattice import init_lattice\n"
+              "from ising.metropolis import metropolis_update\n"
+              "from ising.philox import RandomStream\n"
+              "from ising.results import ResultsStore\n"
+              "from ising.stats import ThermoAccumulator\n"
+              "rng = RandomStream(0)\n"
+              "lattice = init_lattice(8, random_spins=True, rng=rng)\n"
+              "checkerboard_sweep(lattice, 2.0, 1.0, 0.0, 1.0, rng)\n"
+              "metropolis_update(lattice, 2.0, 1.0, 0.0, 1.0, rng)\n"
+              "print('numba' in sys.modules)")
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                            cwd=os.path.abspath(ROOT), check=True)
+    assert result.stdout.strip() == "False"
+
+
+def test_merge_adds_counts_and_times():
+    first, second = Instrumentation(), Instrumentation()
+    first.count(100, 40)
+    second.count(50, 10)
+    second.add_time("measurement", 2.0)
+    first.merge(second.summary())
+    assert (first.attempts, first.accepted) == (150, 50)
+    assert first.acceptance_rate == 50 / 150
+    assert first.summary()["phases"]["measurement"]["seconds"] == 2.0
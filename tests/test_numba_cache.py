@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""Cached kernels are recompiled after an edit to a module they inline from."""
+
+# test_numba_cache.py
+import os
+import shutil
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+SCRIPT = """
+import numpy as np
+from ising.kernels import metropolis_step
+from ising.philox import new_stream
+metropolis_step(np.ones((8, 8), np.int8), 0.5, 1.0, 0.0, new_stream(0))
+print(sum(metropolis_step.stats.cache_hits.values()))
+"""
+
+
+def test_editing_philox_invalidates_cached_callers(tmp_path):
+    shutil.copytree(os.path.join(ROOT, "ising"), tmp_path / "ising",
+                    ignore=shutil.ignore_patterns("__pycache__"))
+    env = dict(os.environ, NUMBA_CACHE_DIR=str(tmp_path / "cache"))
+
+    def cache_hits():
+        result = subprocess.run([sys.executable, "-c", SCRIPT], capture_output=True, text=True,
+                                cwd=tmp_path, env=env, check=True)
+        return int(result.stdout)
+
+    assert cache_hits() == 0
+    assert cache_hits() == 1
+    with open(tmp_path / "ising" / "philox.py", "a") as f:
+        f.write("\n# edited\n")
+    assert cache_hits() == 0
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Histogram reweighting against exact enumeration of a 4 x 4 lattice."""
+
+# test_reweighting.py
+import numpy as np
+import pytest
+
+from ising.reweighting import FIELDS, EnergyHistogram, reweight, reweighted_averages
+
+N = 4
+J = 1.0
+H = 0.1
+# E = -J * bonds - H * M lies on multiples of 0.2, so every bin holds one energy
+WIDTH = 0.1
+
+
+def expected_histogram(E, M, T, samples=1e6, width=WIDTH):
+    """The ``to_dict`` histogram of a run at T in the limit of ``samples`` exact draws."""
+    weights = np.exp(-(E - E.min()) / T)
+    weights *= samples / weights.sum()
+    bins = np.rint(E / width).astype(np.int64)
+    deviation = E - bins * width
+    index = bins - bins.min()
+    values = (np.ones(len(E)), deviation, deviation ** 2, np.abs(M), M * M)
+    return dict(width=width, offset=int(bins.min()),
+                **{name: np.bincount(index, weights=weights * value).tolist()
+                   for name, value in zip(FIELDS, values)})
+
+
+def assert_matches(curves, exact, T_values):
+    for k, T in enumerate(T_values):
+        reference = exact(N, J, H, T)
+        for name, value in reference.items():
+            assert curves[name][k] == pytest.approx(value, rel=1e-6, abs=1e-9), (name, T)
+
+
+def test_single_histogram_of_all_states_is_exact(all_states, exact_averages):
+    # Every state once is an infinite-temperature run with no noise
+    E, M = all_states(N, J, H)
+    histogram = EnergyHistogram(WIDTH)
+    histogram.extend(E, M)
+    T_values = np.array([1.5, 2.269, 4.0])
+    assert_matches(reweighted_averages([histogram], [0.0], 1 / T_values, N * N), exact_averages,
+                   T_values)
+
+
+def test_multiple_histograms_span_the_runs(all_states, exact_averages):
+    E, M = all_states(N, J, H)
+    T_runs = [1.8, 2.4, 3.2]
+    histograms = [[expected_histogram(E, M, T)] * 2 for T in T_runs]
+    T_values = np.linspace(1.8, 3.2, 8)
+    curves = reweight(histograms, T_runs, T_values, N * N)
+    assert_matches(curves, exact_averages, T_values)
+    # Identical replicas: no jackknife spread
+    assert np.allclose(curves["energy_err"], 0.0, atol=1e-8)
+
+
+def test_histograms_merge_and_round_trip():
+    rng = np.random.default_rng(0)
+    E = rng.normal(-20.0, 4.0, 1000)
+    M = rng.integers(-16, 17, 1000)
+    whole = EnergyHistogram(1.0)
+    whole.extend(E, M)
+    first, second = EnergyHistogram(1.0), EnergyHistogram(1.0)
+    first.extend(E[:300], M[:300])
+    second.extend(E[300:], M[300:])
+    first.add(second)
+    assert first.count == whole.count == 1000
+    assert np.allclose(EnergyHistogram.from_dict(first.to_dict()).sums, whole.sums)
+    with pytest.raises(ValueError):
+        whole.add(EnergyHistogram(2.0))
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Work queue claims: only the owner of a lock releases or refreshes it."""
+
+# test_shards.py
+import os
+import time
+
+import pytest
+
+from ising.shards import DEFAULTS, WorkQueue
+
+
+@pytest.fixture
+def queues(tmp_path):
+    first = WorkQueue.create(str(tmp_path), dict(DEFAULTS, temperatures=[2.0, 3.0], seed=1))
+    return first, WorkQueue(str(tmp_path)), WorkQueue(str(tmp_path))
+
+
+def _age(queue, shard_id, seconds):
+    lock = queue._file("claims", shard_id)
+    then = time.time() - seconds
+    os.utime(lock, (then, then))
+
+
+def test_claim_is_exclusive_and_release_checks_the_owner(queues):
+    a, b, _ = queues
+    shard_id = a.shard_ids()[0]
+    assert a.claim(shard_id)
+    assert not b.claim(shard_id)
+    assert not b.release(shard_id)
+    assert a.owns(shard_id) and not b._touch(shard_id)
+    assert a._touch(shard_id)
+    assert a.release(shard_id)
+    assert a._claim_of(shard_id) is None
+
+
+def test_stale_lock_moves_to_a_new_owner(queues):
+    a, b, _ = queues
+    shard_id = a.shard_ids()[0]
+    assert a.claim(shard_id)
+    _age(a, shard_id, 2 * a.stale_after)
+    assert b.claim(shard_id)
+    assert b.owns(shard_id)
+    # The displaced worker neither drops nor refreshes the new claim
+    mtime = b._claim_of(shard_id)[1]
+    assert not a.release(shard_id)
+    assert not a._touch(shard_id)
+    assert b._claim_of(shard_id) == (b.token, mtime)
+
+
+def test_requeue_spares_a_lock_claimed_since_it_was_judged(queues):
+    a, b, c = queues
+    shard_id = a.shard_ids()[0]
+    assert a.claim(shard_id)
+    _age(a, shard_id, 2 * a.stale_after)
+    seen = b._claim_of(shard_id)
+    # c requeues and claims first; b's late requeue must leave c's lock
+    assert c.claim(shard_id)
+    assert not b._requeue(shard_id, seen)
+    assert c.owns(shard_id)
+    assert sorted(os.listdir(os.path.join(a.path, "claims"))) == [f"{shard_id}.lock"]
+
+
+def test_requeue_spares_a_refreshed_lock(queues):
+    a, b, _ = queues
+    shard_id = a.shard_ids()[0]
+    assert a.claim(shard_id)
+    _age(a, shard_id, 2 * a.stale_after)
+    seen = b._claim_of(shard_id)
+    assert a._touch(shard_id)
+    assert not b._requeue(shard_id, seen)
+    assert a.owns(shard_id)
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""Streaming statistics helpers."""
+
+# test_stats.py
+import numpy as np
+
+from ising.stats import ThermoAccumulator, per_site
+
+
+def test_per_site_divides_moments_and_keeps_responses():
+    rng = np.random.default_rng(0)
+    measurements = ThermoAccumulator()
+    for E, M in zip(rng.normal(-300.0, 5.0, 4096), rng.normal(80.0, 3.0, 4096)):
+        measurements.add(E, M)
+    totals = measurements.summary(0.5, 400)
+    spins = per_site(totals, 400)
+    assert np.isclose(spins["energy"], totals["energy"] / 400)
+    assert np.isclose(spins["magnetization_err"], totals["magnetization_err"] / 400)
+    assert np.isclose(spins["energy_sq"], totals["energy_sq"] / 400 ** 2)
+    for key in ("energy_tau", "specific_heat", "susceptibility_err"):
+        assert spins[key] == totals[key]
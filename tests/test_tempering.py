@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Replica exchange: swap acceptance and the order of the returned summaries."""
+
+# test_tempering.py
+import numpy as np
+
+from ising.field import sinusoidal_field
+from ising.tempering import replica_exchange
+
+N = 4
+J = 1.0
+H = 0.1
+STATIC = sinusoidal_field(H, 0.0)
+
+
+def test_equal_temperatures_always_swap():
+    # delta = 0 for every pair, so every attempt is accepted
+    _, rates = replica_exchange(np.full(4, 0.5), N, J, STATIC, 10, 100, exchange_every=3, seed=0)
+    assert np.array_equal(rates, np.ones(3))
+
+
+def test_distant_temperatures_rarely_swap():
+    # A frozen and a hot 8 x 8 lattice differ by ~100 in energy: exp(-10 * 100) never passes
+    _, rates = replica_exchange([10.0, 0.0], 8, J, STATIC, 50, 200, exchange_every=1, seed=0)
+    assert rates[0] < 0.05
+
+
+def test_summaries_follow_betas_and_sample_each_temperature(exact_averages):
+    T = np.array([3.0, 1.5, 2.269])  # any order
+    summaries, rates = replica_exchange(1 / T, N, J, STATIC, 500, 40000, exchange_every=2, seed=1)
+    assert np.all((rates > 0) & (rates < 1))
+    for T_k, summary in zip(T, summaries):
+        exact = exact_averages(N, J, H, T_k)["energy"]
+        assert abs(summary["energy"] - exact) < 5 * summary["energy_err"] + 1e-3 * N * N